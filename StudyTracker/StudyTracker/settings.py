@@ -12,10 +12,14 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Load .env before any os.getenv below (manage.py, ASGI and run_bot.py all import settings)
+load_dotenv(BASE_DIR / '.env')
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -122,3 +126,97 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Schedule sync and caching
+
+# Where bot schedule commands read from: "db" (ParsedLesson) or "api"
+SCHEDULE_READ_MODE = os.getenv('SCHEDULE_READ_MODE', 'db')
+
+# Seconds after a month sync during which the bot trusts ParsedLesson rows
+SCHEDULE_DB_FRESHNESS = int(os.getenv('SCHEDULE_DB_FRESHNESS', 3600))
+
+# In-memory per-user month cache in front of the Top Academy API
+SCHEDULE_CACHE_TTL = int(os.getenv('SCHEDULE_CACHE_TTL', 300))
+SCHEDULE_CACHE_STALE_TTL = int(os.getenv('SCHEDULE_CACHE_STALE_TTL', 1800))
+SCHEDULE_CACHE_SIZE = int(os.getenv('SCHEDULE_CACHE_SIZE', 1000))
+
+# Teacher/subject/room name -> id cache
+DIMENSION_CACHE_SIZE = int(os.getenv('DIMENSION_CACHE_SIZE', 5000))
+
+# Request budget toward the Top Academy API (requests/sec, burst).
+# With API_RATE_SHARED the budget is shared by all processes through the database;
+# otherwise every process (bot, scheduler, update workers) gets the full budget.
+# SQLite serializes the bucket updates; a truly shared limit under load needs PostgreSQL/MySQL.
+API_RATE_LIMIT = float(os.getenv('API_RATE_LIMIT', 5))
+API_RATE_BURST = int(os.getenv('API_RATE_BURST', 10))
+API_RATE_SHARED = os.getenv('API_RATE_SHARED', 'true').lower() in ('1', 'true', 'yes')
+
+# Shared keep-alive HTTP client for the Top Academy API
+API_POOL_SIZE = int(os.getenv('API_POOL_SIZE', 20))
+API_CONNECT_TIMEOUT = float(os.getenv('API_CONNECT_TIMEOUT', 3.05))
+API_READ_TIMEOUT = float(os.getenv('API_READ_TIMEOUT', 10))
+
+# After this day of the month, syncs also fetch the next month
+SCHEDULE_PREFETCH_NEXT_MONTH = os.getenv('SCHEDULE_PREFETCH_NEXT_MONTH', '1') == '1'
+SCHEDULE_PREFETCH_DAY = int(os.getenv('SCHEDULE_PREFETCH_DAY', 20))
+
+# Long-lived Chromium pool for Playwright logins
+BROWSER_POOL_SIZE = int(os.getenv('BROWSER_POOL_SIZE', 2))
+BROWSER_MAX_USES = int(os.getenv('BROWSER_MAX_USES', 50))
+BROWSER_LOGIN_TIMEOUT = float(os.getenv('BROWSER_LOGIN_TIMEOUT', 120))
+
+# Login strategies (tracker/auth/strategies.py); the chain reorders them by
+# observed success rate and latency and demotes ones that keep failing
+AUTH_STRATEGIES = os.getenv('AUTH_STRATEGIES', 'http,playwright,selenium,selenium_simple').split(',')
+AUTH_MAX_STRATEGIES_PER_LOGIN = int(os.getenv('AUTH_MAX_STRATEGIES_PER_LOGIN', 2))
+AUTH_STRATEGY_FAILURE_THRESHOLD = int(os.getenv('AUTH_STRATEGY_FAILURE_THRESHOLD', 3))
+AUTH_STRATEGY_COOLDOWN = int(os.getenv('AUTH_STRATEGY_COOLDOWN', 600))
+
+# Background token refresher (manage.py refresh_tokens)
+TOKEN_REFRESH_LEAD = int(os.getenv('TOKEN_REFRESH_LEAD', 30))  # minutes before expiry
+TOKEN_REFRESH_WORKERS = int(os.getenv('TOKEN_REFRESH_WORKERS', 2))
+# Failed background logins back off exponentially (seconds) and stop after
+# TOKEN_REFRESH_MAX_ATTEMPTS failures in a row until the user runs /login again
+TOKEN_REFRESH_BACKOFF = int(os.getenv('TOKEN_REFRESH_BACKOFF', 300))
+TOKEN_REFRESH_BACKOFF_MAX = int(os.getenv('TOKEN_REFRESH_BACKOFF_MAX', 6 * 3600))
+TOKEN_REFRESH_MAX_ATTEMPTS = int(os.getenv('TOKEN_REFRESH_MAX_ATTEMPTS', 5))
+
+# Token lifetime assumed when a token carries no exp claim (seconds)
+TOKEN_DEFAULT_LIFETIME = int(os.getenv('TOKEN_DEFAULT_LIFETIME', 4 * 3600))
+
+# Retries for transient API failures (5xx, 429, timeouts): count and base backoff, seconds
+API_RETRIES = int(os.getenv('API_RETRIES', 3))
+API_BACKOFF_BASE = float(os.getenv('API_BACKOFF_BASE', 0.5))
+
+# Fernet keys for stored logins/passwords. ENCRYPTION_KEYS is a comma-separated
+# list: the first key encrypts, the rest only decrypt (see rotate_encryption_keys)
+ENCRYPTION_KEY = os.getenv('ENCRYPTION_KEY', '')
+ENCRYPTION_KEYS = [key for key in os.getenv('ENCRYPTION_KEYS', '').split(',') if key]
+
+# Telegram webhook mode (run_bot.py --webhook + manage.py process_updates)
+TELEGRAM_WEBHOOK_URL = os.getenv('TELEGRAM_WEBHOOK_URL', '')
+TELEGRAM_WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET', '')
+
+# Bot update dispatcher: worker threads and metrics log interval (seconds)
+BOT_WORKERS = int(os.getenv('BOT_WORKERS', 8))
+BOT_STATS_INTERVAL = int(os.getenv('BOT_STATS_INTERVAL', 60))
+
+# Background job threads for slow bot operations (login, /sync)
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 4))
+
+# In-process cache of per-user token managers (LRU size and lifetime, seconds)
+MANAGER_CACHE_SIZE = int(os.getenv('MANAGER_CACHE_SIZE', 1000))
+MANAGER_CACHE_TTL = int(os.getenv('MANAGER_CACHE_TTL', 3600))
+
+# Minimum similarity (0..1) for fuzzy matching of free-text bot commands
+ROUTER_FUZZY_CUTOFF = float(os.getenv('ROUTER_FUZZY_CUTOFF', 0.8))
+
+# Seconds a token refresh may hold its per-user lease before another process may take over
+TOKEN_REFRESH_LEASE = int(os.getenv('TOKEN_REFRESH_LEASE', 600))
+
+# Seconds a cached teacher/subject/room name -> id entry stays valid in each process
+DIMENSION_CACHE_TTL = int(os.getenv('DIMENSION_CACHE_TTL', 300))
+
+# Seconds an unanswered dialog step (e.g. the password prompt of /login) stays in the database
+NEXT_STEP_TTL = int(os.getenv('NEXT_STEP_TTL', 900))
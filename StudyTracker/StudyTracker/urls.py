@@ -10,4 +10,7 @@ urlpatterns = [
     path('schedule/sync/', views.sync_schedule_view, name='sync_schedule'),
     path('schedule/settings/', views.schedule_settings_view, name='schedule_settings'),
     path('api/schedule/today/', views.api_schedule_today, name='api_schedule_today'),
+    
+    # Webhook Telegram (режим run_bot.py --webhook)
+    path('telegram/webhook/', views.telegram_webhook, name='telegram_webhook'),
 ]
@@ -2,8 +2,10 @@ import os
 import sys
 import django
 import telebot
+from django.conf import settings
 from dotenv import load_dotenv
 import logging
+from datetime import datetime, timedelta
 
 # Настройка логирования
 logging.basicConfig(
@@ -16,13 +18,13 @@ logger = logging.getLogger(__name__)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(BASE_DIR)
 
-# 2. Настраиваем Django
+# 2. Загружаем .env (до настроек Django: они читают ключи из окружения)
+load_dotenv(os.path.join(BASE_DIR, '.env'))
+
+# 3. Настраиваем Django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'StudyTracker.settings')
 django.setup()
 
-# 3. Загружаем .env
-load_dotenv(os.path.join(BASE_DIR, '.env'))
-
 # 4. Получаем токен бота
 BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 if not BOT_TOKEN:
@@ -33,24 +35,67 @@ if not BOT_TOKEN:
 print(f"✅ Токен бота получен: {BOT_TOKEN[:10]}...")
 
 # 5. Импортируем модели и менеджер
+from tracker import keyring
 from tracker.models import TelegramUser
-from tracker.token_manager import UserTokenManager
-
-# 6. Создаем бота
-bot = telebot.TeleBot(BOT_TOKEN)
-
-# Глобальный словарь менеджеров
-user_managers = {}
-
+from tracker.token_manager import manager_cache
+from tracker.dimension_cache import dimension_cache_stats, warm_dimension_caches
+from tracker.auth.browser_pool import browser_pool_stats
+from tracker.auth.strategies import get_auth_chain
+from tracker.schedule_cache import schedule_cache
+from tracker.schedule_parser import ScheduleParserBot
+from tracker.schedule_service import ScheduleService
+from tracker.schedule_ingest import merge_payloads
+from tracker.api_client import months_in_range
+from tracker.chat_dispatcher import install as install_dispatcher
+from tracker.jobs import get_job_queue
+from tracker.router import CommandRouter
+from tracker.next_step import DatabaseHandlerBackend
+
+# 6. Создаем бота: обработчики выполняет диспетчер — параллельно
+#    для разных чатов и по порядку внутри одного чата
+next_steps = DatabaseHandlerBackend()
+bot = telebot.TeleBot(BOT_TOKEN, threaded=False, next_step_backend=next_steps)
+dispatcher = install_dispatcher(bot)
+
+# Команды, кнопки и фразы — одним поиском в таблице (tracker/router.py)
+router = CommandRouter().install(bot)
+
+# Откуда команды расписания берут данные: "db" (ParsedLesson) или "api"
+SCHEDULE_READ_MODE = getattr(settings, 'SCHEDULE_READ_MODE', 'db')
+
+# Форматирование расписания не требует токена
+formatter = ScheduleParserBot(None)
+
+# Менеджеры токенов — из общего LRU+TTL кэша (tracker/token_manager.py)
 def get_user_manager(telegram_user):
     """Получить менеджер для пользователя"""
-    if telegram_user.id not in user_managers:
-        user_managers[telegram_user.id] = UserTokenManager(telegram_user)
-    return user_managers[telegram_user.id]
+    return manager_cache.get(telegram_user)
+
+def run_job(chat_id, text, name, func, format_result, key=None):
+    """
+    Выполнить долгую операцию в фоне
+    
+    Сразу отправляет text, затем правит это же сообщение: прогресс
+    (report из func) и итог format_result(результат).
+    """
+    status_message = bot.send_message(chat_id, text)
+    
+    def edit(new_text):
+        bot.edit_message_text(new_text, chat_id, status_message.message_id)
+    
+    def on_done(job):
+        if job.error is None:
+            edit(format_result(job.result))
+        else:
+            edit(f"❌ Ошибка: {job.error}")
+    
+    job, started = get_job_queue().submit(name, func, key=key, on_progress=edit, on_done=on_done)
+    if not started:
+        edit("⏳ Эта операция уже выполняется, дождитесь результата")
 
 # ================== КОМАНДЫ БОТА ==================
 
-@bot.message_handler(commands=['start', 'старт'])
+@router.action('start')
 def start(message):
     """Регистрация пользователя"""
     logger.info(f"/start от @{message.from_user.username}")
@@ -88,7 +133,7 @@ def start(message):
     
     bot.reply_to(message, reply)
 
-@bot.message_handler(commands=['help', 'помощь'])
+@router.action('help')
 def help_cmd(message):
     """Справка по командам"""
     help_text = """
@@ -104,6 +149,7 @@ def help_cmd(message):
 /today - Расписание на сегодня
 /tomorrow - Расписание на завтра  
 /next - Следующее занятие
+/sync - Обновить расписание (/sync 3 — на 3 месяца)
 
 ℹ️ Информация:
 /help - Эта справка
@@ -113,7 +159,7 @@ def help_cmd(message):
 """
     bot.reply_to(message, help_text)
 
-@bot.message_handler(commands=['about', 'обо'])
+@router.action('about')
 def about(message):
     """Информация о боте"""
     about_text = """
@@ -136,7 +182,7 @@ def about(message):
 """
     bot.reply_to(message, about_text)
 
-@bot.message_handler(commands=['login', 'войти'])
+@router.action('login')
 def login_command(message):
     """Начать процесс входа"""
     try:
@@ -156,6 +202,7 @@ def login_command(message):
     bot.reply_to(message, login_instructions)
     bot.register_next_step_handler(message, process_login_step1)
 
+@next_steps.step
 def process_login_step1(message):
     """Обработка логина"""
     login = message.text.strip()
@@ -165,11 +212,18 @@ def process_login_step1(message):
         return
     
     bot.send_message(message.chat.id, f"✅ Логин: {login}\n\nТеперь введите ваш ПАРОЛЬ:")
-    bot.register_next_step_handler(message, lambda m: process_login_step2(m, login))
+    # Шаг хранится в БД — логин передаём только зашифрованным
+    bot.register_next_step_handler(message, process_login_step2, keyring.encrypt(login))
 
-def process_login_step2(message, login):
+@next_steps.step
+def process_login_step2(message, encrypted_login):
     """Обработка пароля"""
     password = message.text.strip()
+    login = keyring.decrypt(encrypted_login)
+    
+    if not login:
+        bot.reply_to(message, "❌ Не удалось прочитать логин. /login")
+        return
     
     if not password:
         bot.reply_to(message, "❌ Пароль не может быть пустым. /login")
@@ -182,12 +236,11 @@ def process_login_step2(message, login):
         success, msg = manager.set_credentials(login, password)
         
         if success:
-            bot.send_message(message.chat.id, "🔄 Проверяю данные...")
-            
-            token, error = manager.get_token()
-            
-            if token:
-                response = f"""
+            # Вход через браузер может идти долго — выполняем в фоне
+            def login_result(result):
+                token, error = result
+                if token:
+                    return """
 ✅ ВХОД УСПЕШЕН!
 
 Ваши данные сохранены.
@@ -196,21 +249,25 @@ def process_login_step2(message, login):
 • /today - расписание на сегодня
 • /tomorrow - расписание на завтра
 • /next - следующее занятие
+• /sync - обновить расписание
 
 Удалить данные: /logout
 """
-                bot.send_message(message.chat.id, response)
-            else:
-                bot.send_message(message.chat.id, 
-                    f"❌ Ошибка: {error}\n\n"
-                    f"Проверьте логин/пароль и попробуйте: /login")
+                return (f"❌ Ошибка: {error}\n\n"
+                        f"Проверьте логин/пароль и попробуйте: /login")
+            
+            run_job(
+                message.chat.id, "🔄 Проверяю данные...",
+                f"login:{user.id}", lambda report: manager.get_token(), login_result,
+                key=('login', user.id),
+            )
         else:
             bot.send_message(message.chat.id, f"❌ Ошибка: {msg}")
             
     except Exception as e:
         bot.reply_to(message, f"❌ Ошибка: {str(e)}")
 
-@bot.message_handler(commands=['status', 'статус'])
+@router.action('status')
 def status_command(message):
     """Показать статус пользователя"""
     try:
@@ -239,12 +296,11 @@ def status_command(message):
     except TelegramUser.DoesNotExist:
         bot.reply_to(message, "❌ Сначала /start")
 
-@bot.message_handler(commands=['logout', 'выйти'])
+@router.action('logout')
 def logout_command(message):
     """Удалить данные пользователя"""
     try:
-        user = TelegramUser.objects.get(telegram_id=message.from_user.id)
-        manager = get_user_manager(user)
+        TelegramUser.objects.get(telegram_id=message.from_user.id)
         
         markup = telebot.types.ReplyKeyboardMarkup(resize_keyboard=True)
         btn_yes = telebot.types.KeyboardButton('✅ Да')
@@ -257,21 +313,24 @@ def logout_command(message):
             reply_markup=markup
         )
         
-        bot.register_next_step_handler(message, confirm_logout, manager)
+        bot.register_next_step_handler(message, confirm_logout)
         
     except TelegramUser.DoesNotExist:
         bot.reply_to(message, "❌ Сначала /start")
 
-def confirm_logout(message, manager):
+@next_steps.step
+def confirm_logout(message):
     """Подтверждение удаления"""
     choice = message.text.lower()
     
     markup = telebot.types.ReplyKeyboardRemove()
     
     if choice in ['да', 'yes', '✅ да']:
+        manager = get_user_manager(TelegramUser.objects.get(telegram_id=message.from_user.id))
         success = manager.clear_credentials()
         
         if success:
+            schedule_cache.invalidate(manager.user.id)
             bot.send_message(message.chat.id,
                 "✅ ДАННЫЕ УДАЛЕНЫ\n\n"
                 "Все ваши данные удалены.\n"
@@ -289,22 +348,103 @@ def confirm_logout(message, manager):
             reply_markup=markup
         )
 
-@bot.message_handler(commands=['today', 'сегодня'])
+# Ошибка load_schedule: вход обновляется в фоне, о результате сообщит run_job
+LOGIN_REFRESHING = "Вход обновляется"
+
+def refresh_login(user, manager, chat_id=None):
+    """
+    Обновить токен в фоне (вход через браузер может идти минуты)
+    
+    С chat_id пользователь видит статус и итог входа, без — обновление тихое.
+    """
+    def refresh(report):
+        return manager.get_token()
+    
+    def refresh_result(result):
+        token, error = result
+        if token:
+            return "✅ Вход обновлён, повторите команду"
+        return f"❌ Ошибка: {error}\n\nПроверьте логин/пароль и попробуйте: /login"
+    
+    if chat_id is None:
+        get_job_queue().submit(f"login:{user.id}", refresh, key=('login', user.id))
+    else:
+        run_job(chat_id, "🔄 Обновляю вход на сайте...", f"login:{user.id}",
+                refresh, refresh_result, key=('login', user.id))
+
+def load_schedule(user, manager, days=1, chat_id=None):
+    """
+    Расписание для команд бота (сегодня и days дней вперёд)
+    
+    В режиме "db" читаем ParsedLesson, а к API идём только за месяцами
+    периода, синхронизированными раньше SCHEDULE_DB_FRESHNESS (на стыке
+    месяцев — за обоими). Если API недоступен, отдаём уроки из БД.
+    Просроченный токен обновляется в фоне: пока идёт вход, отвечаем
+    из БД, а если там пусто — статусом входа (ошибка LOGIN_REFRESHING).
+    
+    Returns:
+        tuple: (уроки в формате API или None, ошибка токена или None)
+    """
+    service = ScheduleService(user)
+    today = datetime.now().date()
+    end_date = today + timedelta(days=days)
+    months = months_in_range(today, end_date)
+    use_db = SCHEDULE_READ_MODE == 'db'
+    
+    stale_months = [month for month in months if not (use_db and service.is_month_fresh(month))]
+    if not stale_months:
+        return service.get_schedule_data(today, end_date), None
+    
+    # В БД уже есть хоть что-то за период — будет запасной вариант
+    has_stored = use_db and service.has_synced_months(months)
+    
+    credentials = manager.credentials
+    if credentials and credentials.has_credentials() and not credentials.is_token_valid():
+        # Не держим поток диспетчера на входе через браузер
+        refresh_login(user, manager, chat_id=None if has_stored else chat_id)
+        if has_stored:
+            logger.info(f"Токен {user.username} обновляется в фоне, отдаём расписание из БД")
+            return service.get_schedule_data(today, end_date), None
+        return None, LOGIN_REFRESHING
+    
+    token, error = manager.get_token()
+    
+    if not token:
+        if has_stored:
+            logger.warning(f"Нет токена для {user.username} ({error}), отдаём расписание из БД")
+            return service.get_schedule_data(today, end_date), None
+        return None, error or 'Ошибка получения токена'
+    
+    parser = ScheduleParserBot(token, user_id=user.id, token_manager=manager)
+    # Мимо кэша: mark_synced ставит synced_at=сейчас, данные должны быть свежими
+    fetched = {month: parser.fetch_schedule(month, use_cache=False) for month in stale_months}
+    loaded = {month: data for month, data in fetched.items() if data is not None}
+    
+    if not use_db:
+        return (merge_payloads(loaded.values()) if len(loaded) == len(fetched) else None), None
+    
+    if loaded:
+        service.save_months_to_db(loaded)
+    
+    if not loaded and not has_stored:
+        return None, None
+    
+    return service.get_schedule_data(today, end_date), None
+
+@router.action('today')
 def schedule_today(message):
     """Расписание на сегодня"""
     try:
         user = TelegramUser.objects.get(telegram_id=message.from_user.id)
         manager = get_user_manager(user)
         
-        token, error = manager.get_token()
+        schedule_data, error = load_schedule(user, manager, chat_id=message.chat.id)
         
-        if not token:
-            bot.reply_to(message, f"❌ {error or 'Ошибка получения токена'}")
+        if error == LOGIN_REFRESHING:
+            return
+        if error:
+            bot.reply_to(message, f"❌ {error}")
             return
-        
-        from tracker.schedule_parser import ScheduleParserBot
-        parser = ScheduleParserBot(token)
-        schedule_data = parser.fetch_schedule()
         
         if schedule_data is None:
             bot.reply_to(message, 
@@ -314,31 +454,29 @@ def schedule_today(message):
                 "2. /login - обновить данные")
             return
         
-        formatted = parser.format_schedule_for_today(schedule_data)
+        formatted = formatter.format_schedule_for_today(schedule_data)
         bot.send_message(message.chat.id, formatted)
         
     except TelegramUser.DoesNotExist:
         bot.reply_to(message, "❌ Сначала /start")
 
-@bot.message_handler(commands=['tomorrow', 'завтра'])
+@router.action('tomorrow')
 def schedule_tomorrow(message):
     """Расписание на завтра"""
     try:
         user = TelegramUser.objects.get(telegram_id=message.from_user.id)
         manager = get_user_manager(user)
         
-        token, error = manager.get_token()
+        schedule_data, error = load_schedule(user, manager, chat_id=message.chat.id)
         
-        if not token:
+        if error == LOGIN_REFRESHING:
+            return
+        if error:
             bot.reply_to(message, "❌ Сначала выполните /login")
             return
         
-        from tracker.schedule_parser import ScheduleParserBot
-        parser = ScheduleParserBot(token)
-        schedule_data = parser.fetch_schedule()
-        
-        if schedule_data:
-            formatted = parser.format_schedule_for_tomorrow(schedule_data)
+        if schedule_data is not None:
+            formatted = formatter.format_schedule_for_tomorrow(schedule_data)
             bot.send_message(message.chat.id, formatted)
         else:
             bot.reply_to(message, "❌ Не удалось получить расписание")
@@ -346,25 +484,23 @@ def schedule_tomorrow(message):
     except TelegramUser.DoesNotExist:
         bot.reply_to(message, "❌ Сначала /start")
 
-@bot.message_handler(commands=['next', 'следующий'])
+@router.action('next')
 def next_lesson(message):
     """Следующий урок"""
     try:
         user = TelegramUser.objects.get(telegram_id=message.from_user.id)
         manager = get_user_manager(user)
         
-        token, error = manager.get_token()
+        schedule_data, error = load_schedule(user, manager, chat_id=message.chat.id)
         
-        if not token:
+        if error == LOGIN_REFRESHING:
+            return
+        if error:
             bot.reply_to(message, "❌ Сначала /login")
             return
         
-        from tracker.schedule_parser import ScheduleParserBot
-        parser = ScheduleParserBot(token)
-        schedule_data = parser.fetch_schedule()
-        
-        if schedule_data:
-            formatted = parser.format_next_lesson(schedule_data)
+        if schedule_data is not None:
+            formatted = formatter.format_next_lesson(schedule_data)
             bot.send_message(message.chat.id, formatted)
         else:
             bot.reply_to(message, "❌ Не удалось получить расписание")
@@ -372,24 +508,70 @@ def next_lesson(message):
     except TelegramUser.DoesNotExist:
         bot.reply_to(message, "❌ Сначала /start")
 
+@router.action('sync')
+def sync_command(message):
+    """Синхронизировать расписание с сайтом (в фоне)"""
+    try:
+        user = TelegramUser.objects.get(telegram_id=message.from_user.id)
+        manager = get_user_manager(user)
+        
+        # /sync N — текущий месяц и N-1 следующих (не больше 6)
+        parts = message.text.split()
+        months = min(6, max(1, int(parts[1]))) if len(parts) > 1 and parts[1].isdigit() else 1
+        
+        def sync(report):
+            report("🔑 Проверяю вход...")
+            token, error = manager.get_token()
+            if not token:
+                return {'success': False, 'error': error or 'Ошибка получения токена'}
+            
+            report(f"📥 Загружаю расписание ({months} мес.)...")
+            start_date = end_date = None
+            if months > 1:
+                start_date = datetime.now().date().replace(day=1)
+                end_date = start_date
+                for _ in range(months - 1):
+                    end_date = (end_date + timedelta(days=32)).replace(day=1)
+            
+            result = ScheduleService(user).sync_schedule(
+                force=True, start_date=start_date, end_date=end_date
+            )
+            schedule_cache.invalidate(user.id)
+            return result
+        
+        def sync_result(result):
+            if not result.get('success'):
+                return f"❌ {result.get('error')}"
+            
+            lines = [
+                "✅ РАСПИСАНИЕ ОБНОВЛЕНО",
+                "",
+                f"📅 Месяцы: {', '.join(result.get('months', []))}",
+                f"➕ Новых занятий: {result.get('created', 0)}",
+                f"✏️ Изменено: {result.get('updated', 0)}",
+                f"🚫 Отменено: {result.get('cancelled', 0)}",
+            ]
+            if result.get('skipped_months'):
+                lines.append(f"💤 Без изменений: {', '.join(result['skipped_months'])}")
+            return "\n".join(lines)
+        
+        run_job(
+            message.chat.id, "⏳ Синхронизация поставлена в очередь...",
+            f"sync:{user.id}", sync, sync_result,
+            key=('sync', user.id),
+        )
+        
+    except TelegramUser.DoesNotExist:
+        bot.reply_to(message, "❌ Сначала /start")
+
 # ============ ОБРАБОТКА ТЕКСТА ============
 
-@bot.message_handler(func=lambda message: True)
+@router.fallback
 def handle_all_messages(message):
-    """Обработка всех текстовых сообщений"""
+    """Сообщения, которых нет в таблице маршрутов (tracker/router.py)"""
     user_text = message.text.lower().strip()
     
-    if user_text in ['сегодня', 'расписание', 'пары сегодня']:
-        schedule_today(message)
-    elif user_text in ['завтра', 'расписание на завтра']:
-        schedule_tomorrow(message)
-    elif user_text in ['следующий урок', 'следующая пара']:
-        next_lesson(message)
-    elif user_text in ['помощь', 'команды']:
-        help_cmd(message)
-    elif user_text in ['статус', 'мой статус']:
-        status_command(message)
-    elif 'привет' in user_text:
+    if 'привет' in user_text:
         bot.reply_to(message, f"👋 Привет, {message.from_user.first_name}! Напиши 'сегодня' для расписания")
     else:
         bot.reply_to(message, 
@@ -400,12 +582,27 @@ def handle_all_messages(message):
 
 # ================== ЗАПУСК ==================
 
+def start_stats_reporter():
+    """Метрики диспетчера и подсистем процесса — в лог раз в BOT_STATS_INTERVAL"""
+    dispatcher.start_reporter(sources={
+        'Маршруты': router.stats,
+        'Стратегии входа': lambda: get_auth_chain().stats(),
+        'Пул браузеров': browser_pool_stats,
+        'Справочники': dimension_cache_stats,
+        'Кэш расписания': schedule_cache.stats,
+        'Менеджеры токенов': manager_cache.stats,
+    })
+
 if __name__ == "__main__":
     logger.info("🚀 Запуск бота...")
     print("=" * 50)
     print("🤖 БОТ РАСПИСАНИЯ С ЛОГИНОМ/ПАРОЛЕМ")
     print("=" * 50)
     print("✅ Django настроен")
+    warm_dimension_caches()
+    print("✅ Кэш справочников прогрет")
+    start_stats_reporter()
+    print(f"✅ Обработчиков: {dispatcher.workers}")
     print(f"✅ Токен бота: {BOT_TOKEN[:15]}...")
     print("✅ Бот запущен")
     print("=" * 50)
@@ -413,7 +610,22 @@ if __name__ == "__main__":
     print("=" * 50)
     
     try:
-        bot.polling(none_stop=True, interval=0, timeout=30)
+        if '--webhook' in sys.argv:
+            # Updates принимает Django (StudyTracker/asgi.py, /telegram/webhook/),
+            # обрабатывают воркеры: python manage.py process_updates
+            webhook_url = getattr(settings, 'TELEGRAM_WEBHOOK_URL', '')
+            webhook_secret = getattr(settings, 'TELEGRAM_WEBHOOK_SECRET', '')
+            if not webhook_url or not webhook_secret:
+                print("❌ Для webhook нужны TELEGRAM_WEBHOOK_URL и TELEGRAM_WEBHOOK_SECRET")
+                exit(1)
+            
+            bot.remove_webhook()
+            bot.set_webhook(url=webhook_url, secret_token=webhook_secret)
+            print(f"✅ Webhook установлен: {webhook_url}")
+            print("   Запустите ASGI-сервер и python manage.py process_updates")
+        else:
+            bot.remove_webhook()
+            bot.polling(none_stop=True, interval=0, timeout=30)
     except Exception as e:
         logger.error(f"Ошибка: {e}")
         print(f"❌ Ошибка: {e}")
\ No newline at end of file
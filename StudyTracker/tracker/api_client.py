@@ -0,0 +1,259 @@
+# tracker/api_client.py
+import asyncio
+import logging
+import random
+import threading
+import time
+from datetime import timedelta
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.utils import timezone
+from .rate_limit import get_host_bucket
+
+logger = logging.getLogger(__name__)
+
+API_HOST = "magni.top-academy.ru"
+MONTH_URL = f"https://{API_HOST}/api/v2/schedule/operations/get-month"
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Accept': 'application/json, text/plain, */*',
+    'Accept-Language': 'ru,en;q=0.9',
+    'Accept-Encoding': 'gzip, deflate',
+    'Origin': 'https://journal.tipp-academy.ru',
+    'Referer': 'https://journal.tipp-academy.ru/',
+}
+
+
+class ApiError(Exception):
+    """Ошибка ответа API"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class AuthError(ApiError):
+    """Токен отклонён (401/403): поможет только новый токен"""
+
+
+class TransientError(ApiError):
+    """Временная ошибка (5xx, 429, таймаут, обрыв соединения): можно повторить"""
+
+
+def single_refresh(refresh):
+    """
+    Обернуть обновление токена так, чтобы оно выполнялось один раз
+
+    Параллельные запросы одной синхронизации получают один и тот же новый токен.
+    """
+    lock = threading.Lock()
+    state = {}
+
+    def wrapper():
+        with lock:
+            if 'token' not in state:
+                state['token'] = refresh()
+            return state['token']
+
+    return wrapper
+
+
+class TopAcademyClient:
+    """
+    Общий HTTP-клиент API Top Academy
+
+    Одна requests.Session на процесс: соединения (и TLS) переиспользуются
+    между запросами и пользователями, ответы gzip распаковываются requests.
+    """
+
+    def __init__(self, pool_size=None, connect_timeout=None, read_timeout=None):
+        pool_size = pool_size or getattr(settings, 'API_POOL_SIZE', 20)
+        self.timeout = (
+            connect_timeout or getattr(settings, 'API_CONNECT_TIMEOUT', 3.05),
+            read_timeout or getattr(settings, 'API_READ_TIMEOUT', 10),
+        )
+
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount('https://', adapter)
+
+    def get_month(self, auth_token, month_date):
+        """
+        Запрос get-month (с общим лимитом частоты)
+
+        Returns:
+            requests.Response
+
+        Raises:
+            requests.RequestException: Сетевая ошибка или таймаут
+        """
+        get_host_bucket(API_HOST).acquire()
+        return self.session.get(
+            MONTH_URL,
+            params={'date_filter': month_date.strftime('%Y-%m-%d')},
+            headers={'Authorization': f'Bearer {auth_token}'},
+            timeout=self.timeout,
+        )
+
+    def get_month_data(self, auth_token, month_date):
+        """
+        Расписание месяца с разбором ошибок по типам
+
+        Returns:
+            list: Уроки в формате JSON
+
+        Raises:
+            AuthError, TransientError, ApiError
+        """
+        try:
+            response = self.get_month(auth_token, month_date)
+        except (requests.Timeout, requests.ConnectionError) as e:
+            raise TransientError(f"{type(e).__name__}: {e}") from e
+        except requests.RequestException as e:
+            raise ApiError(str(e)) from e
+
+        status = response.status_code
+        if status == 200:
+            try:
+                return response.json()
+            except ValueError as e:
+                raise ApiError("Некорректный JSON в ответе", status) from e
+
+        message = f"API ошибка {status}: {response.text[:200]}"
+        if status in (401, 403):
+            raise AuthError(message, status)
+        if status == 429 or status >= 500:
+            raise TransientError(message, status)
+        raise ApiError(message, status)
+
+    def fetch_month_retrying(self, auth_token, month_date, refresh_token=None):
+        """
+        Расписание месяца с повторами
+
+        Временные ошибки повторяются до API_RETRIES раз с экспоненциальной
+        задержкой и случайным разбросом (full jitter). На 401/403 токен
+        обновляется через refresh_token() один раз, и запрос повторяется.
+
+        Args:
+            auth_token (str): Токен
+            month_date (datetime.date): Месяц
+            refresh_token (callable): Вернуть новый токен или None
+
+        Returns:
+            list: Уроки в формате JSON
+
+        Raises:
+            AuthError, TransientError, ApiError: Если повторы не помогли
+        """
+        retries = getattr(settings, 'API_RETRIES', 3)
+        backoff = getattr(settings, 'API_BACKOFF_BASE', 0.5)
+        attempt = 0
+        refreshed = False
+
+        while True:
+            try:
+                return self.get_month_data(auth_token, month_date)
+
+            except AuthError:
+                if refreshed or refresh_token is None:
+                    raise
+                refreshed = True
+                logger.info("🔑 Токен отклонён API, обновляем и повторяем запрос")
+                auth_token = refresh_token()
+                if not auth_token:
+                    raise
+
+            except TransientError as e:
+                if attempt >= retries:
+                    raise
+                delay = random.uniform(0, backoff * 2 ** attempt)
+                attempt += 1
+                logger.warning(f"⏳ {e}; повтор {attempt}/{retries} через {delay:.1f} с")
+                time.sleep(delay)
+
+    def fetch_month(self, auth_token, month_date, refresh_token=None):
+        """
+        Получить расписание месяца
+
+        Returns:
+            list: Уроки в формате JSON или None при ошибке
+        """
+        try:
+            return self.fetch_month_retrying(auth_token, month_date, refresh_token)
+        except ApiError as e:
+            logger.error(f"Ошибка запроса к API: {e}")
+            return None
+
+    async def afetch_month(self, auth_token, month_date, refresh_token=None):
+        """Асинхронная версия fetch_month (тот же пул соединений)"""
+        return await asyncio.to_thread(self.fetch_month, auth_token, month_date, refresh_token)
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Общий клиент процесса"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = TopAcademyClient()
+        return _client
+
+
+def months_in_range(start_date, end_date):
+    """Первые числа всех месяцев, задетых периодом [start_date, end_date]"""
+    months = []
+    month = start_date.replace(day=1)
+    while month <= end_date:
+        months.append(month)
+        month = (month + timedelta(days=32)).replace(day=1)
+    return months
+
+
+def months_to_fetch(start_date=None, end_date=None):
+    """
+    Месяцы для синхронизации
+
+    Без периода — текущий месяц, а после SCHEDULE_PREFETCH_DAY числа
+    ещё и следующий (если включён SCHEDULE_PREFETCH_NEXT_MONTH).
+    """
+    if start_date or end_date:
+        start_date = start_date or timezone.now().date()
+        return months_in_range(start_date, end_date or start_date)
+
+    today = timezone.now().date()
+    months = [today.replace(day=1)]
+
+    if (getattr(settings, 'SCHEDULE_PREFETCH_NEXT_MONTH', True)
+            and today.day >= getattr(settings, 'SCHEDULE_PREFETCH_DAY', 20)):
+        months.append((months[0] + timedelta(days=32)).replace(day=1))
+
+    return months
+
+
+def fetch_concurrently(fetch, months):
+    """
+    Запросить несколько месяцев параллельно
+
+    Args:
+        fetch (callable): fetch(month_date) -> list или None
+        months (list): Месяцы
+
+    Returns:
+        dict: {месяц: результат fetch}
+    """
+    if len(months) == 1:
+        return {months[0]: fetch(months[0])}
+
+    async def gather():
+        return await asyncio.gather(*(asyncio.to_thread(fetch, month) for month in months))
+
+    return dict(zip(months, asyncio.run(gather())))
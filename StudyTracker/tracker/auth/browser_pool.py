@@ -0,0 +1,188 @@
+# tracker/auth/browser_pool.py
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from django.conf import settings
+from ..utils import percentile
+
+logger = logging.getLogger(__name__)
+
+
+class BrowserPool:
+    """
+    Пул долгоживущих Chromium для входа через Playwright
+
+    Sync API Playwright привязан к потоку, поэтому каждый воркер держит
+    свой sync_playwright() и браузер, а задачи получает из общей очереди.
+    Каждый вход выполняется в новом изолированном BrowserContext.
+    Одновременных контекстов не больше числа воркеров; браузер
+    перезапускается после max_uses входов.
+    """
+
+    def __init__(self, size=None, max_uses=None, headless=True):
+        self.size = size or getattr(settings, 'BROWSER_POOL_SIZE', 2)
+        self.max_uses = max_uses or getattr(settings, 'BROWSER_MAX_USES', 50)
+        self.headless = headless
+        self._jobs = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self._busy = 0
+
+        # Метрики (последние 500 значений)
+        self.queue_waits = deque(maxlen=500)
+        self.login_durations = deque(maxlen=500)
+        self.launches = 0
+        self.completed = 0
+        self.failed = 0
+
+    def _start_workers(self):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Пул браузеров остановлен")
+            while len(self._workers) < self.size:
+                worker = threading.Thread(
+                    target=self._worker_loop,
+                    name=f"browser-pool-{len(self._workers)}",
+                    daemon=True,
+                )
+                self._workers.append(worker)
+                worker.start()
+
+    def _launch(self, playwright):
+        browser = playwright.chromium.launch(headless=self.headless)
+        with self._lock:
+            self.launches += 1
+        logger.info(f"🌐 Запущен Chromium ({threading.current_thread().name})")
+        return browser
+
+    def _worker_loop(self):
+        from playwright.sync_api import sync_playwright
+
+        with sync_playwright() as playwright:
+            browser = None
+            uses = 0
+
+            while True:
+                item = self._jobs.get()
+                if item is None:
+                    break
+
+                job, context_options, future, queued_at = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+
+                started = time.monotonic()
+                with self._lock:
+                    self._busy += 1
+                    self.queue_waits.append(started - queued_at)
+
+                try:
+                    # 1. Перезапуск браузера после max_uses входов (или если он упал)
+                    if browser is not None and (uses >= self.max_uses or not browser.is_connected()):
+                        browser.close()
+                        browser = None
+                    if browser is None:
+                        browser = self._launch(playwright)
+                        uses = 0
+
+                    # 2. Вход в отдельном контексте: cookies и storage не пересекаются
+                    uses += 1
+                    context = browser.new_context(**context_options)
+                    try:
+                        result = job(context)
+                    finally:
+                        context.close()
+
+                    future.set_result(result)
+                    with self._lock:
+                        self.completed += 1
+
+                except Exception as e:
+                    future.set_exception(e)
+                    with self._lock:
+                        self.failed += 1
+
+                finally:
+                    with self._lock:
+                        self._busy -= 1
+                        self.login_durations.append(time.monotonic() - started)
+
+            if browser is not None:
+                browser.close()
+
+    def run(self, job, timeout=None, context_options=None):
+        """
+        Выполнить job(context) в браузере пула
+
+        Args:
+            job (callable): Получает новый BrowserContext, возвращает результат
+            timeout (float): Сколько ждать очередь и выполнение, секунд
+            context_options (dict): Параметры new_context (например, storage_state)
+
+        Returns:
+            Результат job
+
+        Raises:
+            concurrent.futures.TimeoutError: Не уложились в timeout
+        """
+        self._start_workers()
+        future = Future()
+        self._jobs.put((job, context_options or {}, future, time.monotonic()))
+        try:
+            return future.result(timeout or getattr(settings, 'BROWSER_LOGIN_TIMEOUT', 120))
+        except TimeoutError:
+            # Задача ещё в очереди — снимаем её, чтобы воркер не тратил на неё браузер
+            future.cancel()
+            raise
+
+    def stats(self):
+        """Метрики пула"""
+        with self._lock:
+            waits = list(self.queue_waits)
+            durations = list(self.login_durations)
+            return {
+                'workers': len(self._workers),
+                'busy': self._busy,
+                'queued': self._jobs.qsize(),
+                'launches': self.launches,
+                'completed': self.completed,
+                'failed': self.failed,
+                'queue_wait_p50': percentile(waits, 50),
+                'queue_wait_p95': percentile(waits, 95),
+                'login_p50': percentile(durations, 50),
+                'login_p95': percentile(durations, 95),
+            }
+
+    def close(self):
+        """Остановить воркеры и закрыть браузеры"""
+        with self._lock:
+            self._closed = True
+            workers = list(self._workers)
+        for _ in workers:
+            self._jobs.put(None)
+        for worker in workers:
+            worker.join(timeout=10)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool():
+    """Общий пул браузеров процесса"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+        return _pool
+
+
+def browser_pool_stats():
+    """Метрики общего пула или None, если пул ещё не создан"""
+    with _pool_lock:
+        pool = _pool
+    return pool.stats() if pool else None
@@ -0,0 +1,158 @@
+# tracker/auth/http_auth.py
+import html
+import logging
+import re
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from ..api_client import DEFAULT_HEADERS
+
+logger = logging.getLogger(__name__)
+
+JWT_RE = re.compile(r'eyJ[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+')
+CSRF_INPUT_RE = re.compile(r'<input[^>]*name=["\']_csrf[^"\']*["\'][^>]*value=["\']([^"\']+)["\']', re.I)
+CSRF_META_RE = re.compile(r'<meta[^>]*name=["\']csrf-token["\'][^>]*content=["\']([^"\']+)["\']', re.I)
+CSRF_PARAM_RE = re.compile(r'<meta[^>]*name=["\']csrf-param["\'][^>]*content=["\']([^"\']+)["\']', re.I)
+CAPTCHA_RE = re.compile(r'g-recaptcha|recaptcha/api|hcaptcha|LoginForm\[(?:verifyCode|captcha)\]', re.I)
+FORM_ERROR_RE = re.compile(r'class=["\'][^"\']*help-block-error[^"\']*["\'][^>]*>([^<]+)<', re.I)
+INVALID_CREDENTIALS_RE = re.compile(r'invalid|incorrect|wrong|неверн|неправильн', re.I)
+
+# Общий пул соединений; cookies у каждого входа свои (отдельная Session)
+_adapter = None
+_adapter_lock = threading.Lock()
+
+
+def _get_adapter():
+    global _adapter
+    with _adapter_lock:
+        if _adapter is None:
+            _adapter = HTTPAdapter(pool_maxsize=getattr(settings, 'API_POOL_SIZE', 20))
+        return _adapter
+
+
+class HttpAuth:
+    """
+    Получает Bearer токен без браузера: повторяет обмен формы входа по HTTP
+
+    Если сайт показывает капчу или токен не найден, возвращает ошибку —
+    тогда вызывающий код переходит на браузерную авторизацию.
+    """
+
+    def __init__(self, login, password, timeout=None):
+        self.login = login
+        self.password = password
+        self.timeout = timeout or getattr(settings, 'API_READ_TIMEOUT', 10)
+        self.login_url = "https://journal.top-academy.ru/ru/auth/login/index"
+        self.captcha_required = False
+        self.credentials_rejected = False  # сайт отклонил логин/пароль
+
+    def _new_session(self):
+        session = requests.Session()
+        session.headers.update(DEFAULT_HEADERS)
+        session.headers['Accept'] = 'text/html,application/xhtml+xml,application/json;q=0.9,*/*;q=0.8'
+        session.mount('https://', _get_adapter())
+        return session
+
+    @staticmethod
+    def _find_csrf(page):
+        """Имя и значение CSRF-поля формы (Yii: _csrf или _csrf-frontend)"""
+        param = CSRF_PARAM_RE.search(page)
+        token = CSRF_INPUT_RE.search(page) or CSRF_META_RE.search(page)
+        if not token:
+            return None, None
+        return (param.group(1) if param else '_csrf'), html.unescape(token.group(1))
+
+    @staticmethod
+    def _find_token(response, session):
+        """JWT из JSON-ответа, тела страницы или cookies"""
+        try:
+            data = response.json()
+            for key in ('access_token', 'auth_token', 'token'):
+                if isinstance(data, dict) and JWT_RE.fullmatch(str(data.get(key, ''))):
+                    return data[key]
+        except ValueError:
+            pass
+
+        match = JWT_RE.search(response.text)
+        if match:
+            return match.group(0)
+
+        for cookie in session.cookies:
+            if any(keyword in cookie.name.lower() for keyword in ('token', 'auth')):
+                match = JWT_RE.search(requests.utils.unquote(cookie.value or ''))
+                if match:
+                    return match.group(0)
+        return None
+
+    def get_auth_token(self):
+        """
+        Войти по HTTP и получить токен
+
+        Returns:
+            tuple: (token, None) или (None, текст ошибки)
+        """
+        session = self._new_session()
+        try:
+            # 1. Страница входа: CSRF и cookies сессии
+            response = session.get(self.login_url, timeout=self.timeout)
+            if response.status_code != 200:
+                return None, f"Страница входа недоступна ({response.status_code})"
+
+            if CAPTCHA_RE.search(response.text):
+                self.captcha_required = True
+                return None, "Требуется капча"
+
+            csrf_param, csrf_token = self._find_csrf(response.text)
+
+            # 2. Отправляем форму так же, как браузер
+            form = {
+                'LoginForm[login]': self.login,
+                'LoginForm[password]': self.password,
+            }
+            if csrf_token:
+                form[csrf_param] = csrf_token
+
+            response = session.post(
+                self.login_url,
+                data=form,
+                headers={'Referer': self.login_url, 'Origin': 'https://journal.top-academy.ru'},
+                timeout=self.timeout,
+            )
+
+            # 3. Ищем токен в ответе и cookies
+            token = self._find_token(response, session)
+            if token:
+                logger.info(f"✅ Токен получен по HTTP для {self.login}")
+                return token, None
+
+            if CAPTCHA_RE.search(response.text):
+                self.captcha_required = True
+                return None, "Требуется капча"
+
+            # Ошибка под полями формы, 401 или JSON с «неверными данными» — виноват пароль, а не способ входа
+            form_error = FORM_ERROR_RE.search(response.text)
+            if form_error and form_error.group(1).strip():
+                self.credentials_rejected = True
+                return None, html.unescape(form_error.group(1).strip())
+
+            if response.status_code == 401:
+                self.credentials_rejected = True
+                return None, "Неверный логин или пароль (401)"
+
+            try:
+                data = response.json()
+            except ValueError:
+                data = None
+            if isinstance(data, dict):
+                message = str(data.get('error') or data.get('message') or '')
+                if INVALID_CREDENTIALS_RE.search(message):
+                    self.credentials_rejected = True
+                    return None, message
+
+            return None, "Токен не найден в ответе"
+
+        except requests.RequestException as e:
+            return None, f"Ошибка HTTP-входа: {e}"
+
+        # session.close() не вызываем: он закрыл бы общий адаптер с пулом соединений
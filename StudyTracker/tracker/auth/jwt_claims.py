@@ -0,0 +1,33 @@
+# tracker/auth/jwt_claims.py
+import base64
+import json
+from datetime import datetime, timezone as dt_timezone
+
+
+def decode_claims(token):
+    """
+    Прочитать payload JWT без проверки подписи
+
+    Подпись проверяет сервер; нам нужны только exp/iat, чтобы знать срок токена.
+
+    Returns:
+        dict: Claims или {} если это не JWT
+    """
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+        return claims if isinstance(claims, dict) else {}
+    except (AttributeError, IndexError, ValueError):
+        return {}
+
+
+def claim_datetime(claims, name):
+    """Claim-время (секунды unix) как aware datetime или None"""
+    value = claims.get(name)
+    if not isinstance(value, (int, float)):
+        return None
+    try:
+        return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+    except (OverflowError, OSError, ValueError):
+        return None
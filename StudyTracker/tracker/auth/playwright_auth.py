@@ -1,45 +1,117 @@
 from playwright.sync_api import sync_playwright
+from .browser_pool import get_browser_pool
+from .jwt_claims import decode_claims
 import time
 import re
 
 class PlaywrightAuth:
     """Получает Bearer токен через браузер без Selenium"""
 
-    def __init__(self, login, password, headless=True):
+    def __init__(self, login, password, headless=True, use_pool=True, storage_state=None):
         self.login = login
         self.password = password
         self.headless = headless
+        self.use_pool = use_pool
+        self.storage_state = storage_state  # сохранённая сессия (cookies + localStorage)
+        self.session_reused = False
+        self.credentials_rejected = False  # форма входа показала ошибку
+        self.form_error = None
         self.login_url = "https://journal.top-academy.ru/ru/auth/login/index"
+        self.home_url = "https://journal.top-academy.ru/ru/main"
 
-    def get_auth_token(self):
+    def _login(self, context):
+        """Достать токен: сначала из сохранённой сессии, иначе через форму входа"""
+        page = context.new_page()
+
+        token = self._token_from_session(page) if self.storage_state else None
+        if not token:
+            token = self._form_login(context, page)
+
+        # Снимок сессии для следующего обновления
+        if token:
+            self.storage_state = context.storage_state()
+        return token
+
+    def _token_from_session(self, page):
+        """Одна загрузка кабинета с сохранённой сессией; None, если сессия умерла"""
         try:
-            with sync_playwright() as p:
-                browser = p.chromium.launch(headless=self.headless)
-                context = browser.new_context()
-                page = context.new_page()
+            page.goto(self.home_url)
+            page.wait_for_load_state("networkidle")
+            if "auth/login" in page.url:
+                return None
+
+            token = page.evaluate("localStorage.getItem('auth_token')")
+
+            # Старый токен из снимка (сайт его не обновил) — сессия не помогла
+            if not token or token == self._saved_token() or self._is_expired(token):
+                return None
+
+            self.session_reused = True
+            return token
+        except Exception:
+            return None
 
-                # 1. Открываем страницу входа
-                page.goto(self.login_url)
+    def _saved_token(self):
+        """auth_token из localStorage сохранённого снимка"""
+        for origin in (self.storage_state or {}).get('origins', []):
+            for item in origin.get('localStorage', []):
+                if item.get('name') == 'auth_token':
+                    return item.get('value')
+        return None
 
-                # 2. Ввод логина и пароля
-                page.fill("input[name='LoginForm[login]']", self.login)
-                page.fill("input[name='LoginForm[password]']", self.password)
+    @staticmethod
+    def _is_expired(token):
+        exp = decode_claims(token).get('exp')
+        return isinstance(exp, (int, float)) and exp <= time.time()
 
-                # 3. Нажимаем кнопку "Войти"
-                page.click("button[type='submit']")
+    def _form_login(self, context, page):
+        """Полный вход через форму"""
+        context.clear_cookies()
 
-                # ждем загрузки кабинета
-                page.wait_for_load_state("networkidle")
+        # 1. Открываем страницу входа (остатки старой сессии стираем)
+        page.goto(self.login_url)
+        page.evaluate("localStorage.clear()")
 
-                # 4. Идём в JS-переменные — токен хранится в localStorage
-                token = page.evaluate("localStorage.getItem('auth_token')")
+        # 2. Ввод логина и пароля
+        page.fill("input[name='LoginForm[login]']", self.login)
+        page.fill("input[name='LoginForm[password]']", self.password)
+
+        # 3. Нажимаем кнопку "Войти"
+        page.click("button[type='submit']")
+
+        # ждем загрузки кабинета
+        page.wait_for_load_state("networkidle")
+
+        # 4. Идём в JS-переменные — токен хранится в localStorage
+        token = page.evaluate("localStorage.getItem('auth_token')")
+
+        # Нет токена и форма показала ошибку — неверный логин или пароль
+        if not token:
+            texts = page.locator(".help-block-error, div.alert-danger").all_inner_texts()
+            self.form_error = next((text.strip() for text in texts if text.strip()), None)
+            self.credentials_rejected = bool(self.form_error)
+        return token
+
+    def get_auth_token(self):
+        try:
+            # Обычный путь — общий пул уже запущенных браузеров
+            context_options = {'storage_state': self.storage_state} if self.storage_state else {}
 
-                browser.close()
+            if self.use_pool and self.headless:
+                token = get_browser_pool().run(self._login, context_options=context_options)
+            else:
+                # Отдельный браузер (например, видимый для отладки)
+                with sync_playwright() as p:
+                    browser = p.chromium.launch(headless=self.headless)
+                    try:
+                        token = self._login(browser.new_context(**context_options))
+                    finally:
+                        browser.close()
 
-                if not token:
-                    return None, "Токен не найден (возможно, неверный логин или пароль)"
+            if not token:
+                return None, self.form_error or "Токен не найден (возможно, неверный логин или пароль)"
 
-                return token, None
+            return token, None
 
         except Exception as e:
-            return None, str(e)
+            return None, str(e) or type(e).__name__
@@ -1,4 +1,3 @@
-import time
 import logging
 import re
 from selenium import webdriver
@@ -7,7 +6,10 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
+from selenium.common.exceptions import TimeoutException
+from .webdriver_waits import (
+    captcha_shown, chromedriver_path, enable_network_log, login_settled, visible_login_error, wait_for_token,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +21,7 @@ class SimpleSeleniumAuth:
         self.password = password
         self.headless = headless
         self.driver = None
+        self.credentials_rejected = False  # форма входа показала ошибку
         
         # URL (без пробелов!)
         self.login_url = "https://journal.top-academy.ru/ru/auth/login/index"
@@ -50,8 +53,11 @@ class SimpleSeleniumAuth:
             chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
             chrome_options.add_experimental_option('useAutomationExtension', False)
             
-            # Установка драйвера
-            service = Service(ChromeDriverManager().install())
+            # Запросы страницы видны через CDP (ищем в них Bearer токен)
+            enable_network_log(chrome_options)
+            
+            # Драйвер скачивается/ищется один раз на процесс
+            service = Service(chromedriver_path())
             self.driver = webdriver.Chrome(service=service, options=chrome_options)
             
             # Маскируем WebDriver
@@ -71,7 +77,6 @@ class SimpleSeleniumAuth:
             
             # Переходим на страницу логина
             self.driver.get(self.login_url)
-            time.sleep(5)
             
             # Отладка: посмотреть HTML
             logger.info("HTML страницы:")
@@ -105,13 +110,14 @@ class SimpleSeleniumAuth:
             
             # Прокручиваем к кнопке
             self.driver.execute_script("arguments[0].scrollIntoView();", submit_button)
-            time.sleep(1)
-            
             self.driver.execute_script("arguments[0].click();", submit_button)
             logger.info("Кнопка 'Вход' нажата!")
             
-            # Ждём
-            time.sleep(5)
+            # Ждём смены URL (или ошибки/капчи на форме)
+            try:
+                WebDriverWait(self.driver, 20, poll_frequency=0.2).until(login_settled())
+            except TimeoutException:
+                pass
             
             # Проверяем успешность входа
             current_url = self.driver.current_url
@@ -123,23 +129,19 @@ class SimpleSeleniumAuth:
             else:
                 logger.error("❌ Не удалось выйти из формы входа")
                 
-                # Проверим, есть ли сообщение об ошибке
-                try:
-                    error_msg = self.driver.find_element(By.CSS_SELECTOR, "div.alert-danger, .error-message, .help-block-error, .text-danger")
-                    logger.error(f"Сообщение об ошибке: {error_msg.text}")
-                    return False, error_msg.text
-                except Exception as e:
-                    logger.error(f"Не найдено сообщение об ошибке: {e}")
-                    
-                    # Проверим, есть ли капча
-                    try:
-                        captcha = self.driver.find_element(By.CSS_SELECTOR, "div.g-recaptcha, iframe[src*='recaptcha']")
-                        logger.error("Обнаружена капча!")
-                        return False, "Обнаружена капча — автоматический вход невозможен"
-                    except:
-                        pass
-                    
-                    return False, "Не удалось выйти из формы входа"
+                # Проверим, есть ли сообщение об ошибке (только видимое и непустое)
+                error_text = visible_login_error(self.driver)
+                if error_text:
+                    self.credentials_rejected = True
+                    logger.error(f"Сообщение об ошибке: {error_text}")
+                    return False, error_text
+                
+                # Проверим, есть ли капча
+                if captcha_shown(self.driver):
+                    logger.error("Обнаружена капча!")
+                    return False, "Обнаружена капча — автоматический вход невозможен"
+                
+                return False, "Не удалось выйти из формы входа"
                     
         except Exception as e:
             logger.error(f"Ошибка при входе: {e}")
@@ -156,15 +158,16 @@ class SimpleSeleniumAuth:
             if not login_success:
                 return None, error or "Ошибка входа"
             
-            # 2. Переходим на страницу расписания
+            # 2. Переходим на страницу расписания и ждём запрос get-month
+            #    (или токен в localStorage), а не фиксированное время
             self.driver.get(self.schedule_url)
-            time.sleep(5)
+            token = wait_for_token(self.driver)
             
             # 3. Получаем cookies
             cookies = self.driver.get_cookies()
             
             # 4. Пробуем выполнить JavaScript для получения токена
-            token = self._extract_token_via_js()
+            token = token or self._extract_token_via_js()
             
             if token:
                 logger.info(f"✅ Токен получен")
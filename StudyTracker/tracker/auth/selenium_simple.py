@@ -1,4 +1,3 @@
-import time
 import logging
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -6,7 +5,8 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
+from selenium.common.exceptions import TimeoutException
+from .webdriver_waits import chromedriver_path, enable_network_log, login_settled, visible_login_error, wait_for_token
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +18,7 @@ class SimpleSeleniumAuth:
         self.password = password
         self.headless = headless
         self.driver = None
+        self.credentials_rejected = False  # форма входа показала ошибку
         
         # URL
         self.login_url = "https://journal.tipp-academy.ru/auth/login"
@@ -50,8 +51,11 @@ class SimpleSeleniumAuth:
             chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
             chrome_options.add_experimental_option('useAutomationExtension', False)
             
-            # Установка драйвера
-            service = Service(ChromeDriverManager().install())
+            # Запросы страницы видны через CDP (ищем в них Bearer токен)
+            enable_network_log(chrome_options)
+            
+            # Драйвер скачивается/ищется один раз на процесс
+            service = Service(chromedriver_path())
             self.driver = webdriver.Chrome(service=service, options=chrome_options)
             
             # Маскируем WebDriver
@@ -71,7 +75,6 @@ class SimpleSeleniumAuth:
             
             # Переходим на страницу логина
             self.driver.get(self.login_url)
-            time.sleep(3)
             
             # Ждём форму
             wait = WebDriverWait(self.driver, 20)
@@ -95,24 +98,26 @@ class SimpleSeleniumAuth:
             submit_button.click()
             logger.info("Кнопка входа нажата")
             
-            # Ждём (можно добавить проверку успешности)
-            time.sleep(5)
+            # Ждём смены URL (или ошибки/капчи на форме)
+            try:
+                WebDriverWait(self.driver, 20, poll_frequency=0.2).until(login_settled())
+            except TimeoutException:
+                pass
             
             # Проверяем успешность входа
             current_url = self.driver.current_url
             if "auth/login" not in current_url:
                 logger.info(f"✅ Успешный вход! URL: {current_url}")
-                return True
+                return True, None
             else:
-                # Проверяем ошибки
-                try:
-                    error_div = self.driver.find_element(By.CSS_SELECTOR, ".help-block-error")
-                    error_text = error_div.text
+                # Проверяем ошибки (пустые блоки ошибок Yii не в счёт)
+                error_text = visible_login_error(self.driver)
+                if error_text:
+                    self.credentials_rejected = True
                     logger.error(f"❌ Ошибка входа: {error_text}")
                     return False, error_text
-                except:
-                    logger.error("❌ Неизвестная ошибка входа")
-                    return False, "Неизвестная ошибка"
+                logger.error("❌ Неизвестная ошибка входа")
+                return False, "Неизвестная ошибка"
                     
         except Exception as e:
             logger.error(f"Ошибка при входе: {e}")
@@ -130,19 +135,20 @@ class SimpleSeleniumAuth:
         
         try:
             # 1. Логинимся
-            login_result = self.perform_login()
-            if not login_result:
-                return None, "Ошибка входа"
+            login_success, error = self.perform_login()
+            if not login_success:
+                return None, error or "Ошибка входа"
             
-            # 2. Переходим на страницу расписания
+            # 2. Переходим на страницу расписания и ждём запрос get-month
+            #    (или токен в localStorage), а не фиксированное время
             self.driver.get(self.schedule_url)
-            time.sleep(5)  # Ждём загрузки JavaScript
+            token = wait_for_token(self.driver)
             
             # 3. Получаем cookies (альтернативный способ)
             cookies = self.driver.get_cookies()
             
             # 4. Пробуем выполнить JavaScript для получения токена
-            token = self._extract_token_via_js()
+            token = token or self._extract_token_via_js()
             
             if token:
                 logger.info(f"✅ Токен получен для {self.login}")
@@ -0,0 +1,237 @@
+# tracker/auth/strategies.py
+import logging
+import threading
+import time
+from collections import Counter, deque
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class AuthStrategy:
+    """Способ получить токен (обёртка над одним из классов авторизации)"""
+
+    name = ''
+    priority = 0  # порядок, пока нет статистики
+
+    def build(self, credentials):
+        """Создать объект авторизации с методом get_auth_token() -> (token, error)"""
+        raise NotImplementedError
+
+    def after_success(self, auth, credentials):
+        """Сохранить побочные результаты входа (например, сессию браузера)"""
+
+
+class HttpStrategy(AuthStrategy):
+    name = 'http'
+    priority = 0
+
+    def build(self, credentials):
+        from .http_auth import HttpAuth
+        return HttpAuth(credentials.login, credentials.password)
+
+
+class PlaywrightStrategy(AuthStrategy):
+    name = 'playwright'
+    priority = 1
+
+    def build(self, credentials):
+        from .playwright_auth import PlaywrightAuth
+        return PlaywrightAuth(
+            login=credentials.login,
+            password=credentials.password,
+            headless=True,
+            storage_state=credentials.browser_state,
+        )
+
+    def after_success(self, auth, credentials):
+        if auth.session_reused:
+            logger.info("♻️ Токен получен из сохранённой сессии браузера")
+        credentials.browser_state = auth.storage_state
+
+
+class SeleniumStrategy(AuthStrategy):
+    name = 'selenium'
+    priority = 2
+
+    def build(self, credentials):
+        from .selenium_auth import SimpleSeleniumAuth
+        return SimpleSeleniumAuth(credentials.login, credentials.password, headless=True)
+
+
+class SeleniumSimpleStrategy(AuthStrategy):
+    name = 'selenium_simple'
+    priority = 3
+
+    def build(self, credentials):
+        from .selenium_simple import SimpleSeleniumAuth
+        return SimpleSeleniumAuth(credentials.login, credentials.password, headless=True)
+
+
+STRATEGIES = {
+    strategy.name: strategy
+    for strategy in (HttpStrategy, PlaywrightStrategy, SeleniumStrategy, SeleniumSimpleStrategy)
+}
+
+
+class StrategyStats:
+    """Статистика одной стратегии"""
+
+    def __init__(self):
+        self.attempts = 0
+        self.successes = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.last_attempt = 0.0
+        self.outcomes = deque(maxlen=20)  # последние попытки: True/False
+        self.durations = deque(maxlen=50)  # успешные входы, секунд
+        self.failure_reasons = Counter()
+        self.rejected_credentials = 0  # неверный логин/пароль — не ошибка стратегии
+
+    @property
+    def success_rate(self):
+        # По последним попыткам; сглаживание (+1/+2): новая стратегия начинает с 0.5
+        return (sum(self.outcomes) + 1) / (len(self.outcomes) + 2)
+
+    @property
+    def median_duration(self):
+        if not self.durations:
+            return 0.0
+        values = sorted(self.durations)
+        return values[len(values) // 2]
+
+
+class AuthStrategyChain:
+    """
+    Цепочка стратегий входа
+
+    Стратегии пробуются по убыванию доли успешных входов, при равенстве —
+    по медиане времени входа. После failure_threshold неудач подряд стратегия
+    уходит на cooldown секунд в конец очереди (например, когда после
+    обновления сайта сломались селекторы). Стратегию, которую не пробовали
+    дольше cooldown, один раз ставим первой — вдруг она снова работает.
+    Если сайт отклонил логин или пароль, цепочка останавливается, а
+    неудача не засчитывается стратегии.
+    """
+
+    def __init__(self, names=None, failure_threshold=None, cooldown=None, max_attempts=None):
+        names = names or getattr(settings, 'AUTH_STRATEGIES', list(STRATEGIES))
+        self.strategies = [STRATEGIES[name]() for name in names if name in STRATEGIES]
+        self.failure_threshold = failure_threshold or getattr(settings, 'AUTH_STRATEGY_FAILURE_THRESHOLD', 3)
+        self.cooldown = cooldown or getattr(settings, 'AUTH_STRATEGY_COOLDOWN', 600)
+        self.max_attempts = max_attempts or getattr(settings, 'AUTH_MAX_STRATEGIES_PER_LOGIN', 2)
+        self._stats = {strategy.name: StrategyStats() for strategy in self.strategies}
+        self._lock = threading.Lock()
+
+    def ordered(self):
+        """Стратегии в порядке попыток (на cooldown — в конце)"""
+        now = time.monotonic()
+        with self._lock:
+            def key(strategy):
+                stats = self._stats[strategy.name]
+                probe = stats.attempts > 0 and now - stats.last_attempt > self.cooldown
+                return (
+                    stats.cooldown_until > now,
+                    not probe,
+                    -round(stats.success_rate, 2),
+                    stats.median_duration,
+                    strategy.priority,
+                )
+            return sorted(self.strategies, key=key)
+
+    def record(self, name, success, duration, reason=None, rejected=False):
+        """Записать результат попытки (rejected — сайт отклонил логин/пароль)"""
+        with self._lock:
+            stats = self._stats[name]
+            if rejected:
+                # Опечатка пользователя не должна понижать стратегию для всех
+                stats.rejected_credentials += 1
+                return
+
+            stats.attempts += 1
+            stats.last_attempt = time.monotonic()
+            stats.outcomes.append(success)
+
+            if success:
+                stats.successes += 1
+                stats.consecutive_failures = 0
+                stats.durations.append(duration)
+                return
+
+            stats.consecutive_failures += 1
+            stats.failure_reasons[(reason or 'unknown')[:100]] += 1
+            if stats.consecutive_failures >= self.failure_threshold:
+                stats.cooldown_until = time.monotonic() + self.cooldown
+                logger.warning(
+                    f"⬇️ Стратегия {name}: {stats.consecutive_failures} неудач подряд, "
+                    f"понижена на {self.cooldown} с"
+                )
+
+    def get_auth_token(self, credentials):
+        """
+        Получить токен, пробуя стратегии по очереди
+
+        Args:
+            credentials (UserCredentials): Данные входа
+
+        Returns:
+            tuple: (token, error)
+        """
+        errors = []
+
+        for strategy in self.ordered()[:self.max_attempts]:
+            started = time.monotonic()
+            try:
+                auth = strategy.build(credentials)
+                token, error = auth.get_auth_token()
+            except Exception as e:
+                auth, token, error = None, None, f"{type(e).__name__}: {e}"
+
+            duration = time.monotonic() - started
+            rejected = not token and getattr(auth, 'credentials_rejected', False)
+            self.record(strategy.name, bool(token), duration, error, rejected=rejected)
+
+            if token:
+                strategy.after_success(auth, credentials)
+                logger.info(f"✅ Вход через {strategy.name} за {duration:.1f} с")
+                return token, None
+
+            if rejected:
+                # Другие стратегии с тем же паролем тоже не войдут — не запускаем браузер зря
+                logger.warning(f"Вход через {strategy.name}: сайт отклонил логин или пароль ({error})")
+                return None, f"Неверный логин или пароль: {error}"
+
+            logger.warning(f"Вход через {strategy.name} не удался ({error}) за {duration:.1f} с")
+            errors.append(f"{strategy.name}: {error}")
+
+        return None, "; ".join(errors) or "Нет доступных способов входа"
+
+    def stats(self):
+        """Статистика стратегий"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                name: {
+                    'attempts': stats.attempts,
+                    'successes': stats.successes,
+                    'success_rate': round(stats.success_rate, 2),
+                    'median_duration': round(stats.median_duration, 2),
+                    'cooldown_left': max(0, round(stats.cooldown_until - now)),
+                    'failure_reasons': dict(stats.failure_reasons.most_common(5)),
+                    'rejected_credentials': stats.rejected_credentials,
+                }
+                for name, stats in self._stats.items()
+            }
+
+
+_chain = None
+_chain_lock = threading.Lock()
+
+
+def get_auth_chain():
+    """Общая цепочка стратегий процесса"""
+    global _chain
+    with _chain_lock:
+        if _chain is None:
+            _chain = AuthStrategyChain()
+        return _chain
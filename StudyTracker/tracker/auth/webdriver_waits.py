@@ -0,0 +1,144 @@
+# tracker/auth/webdriver_waits.py
+import json
+import logging
+import re
+import threading
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+
+logger = logging.getLogger(__name__)
+
+JWT_RE = re.compile(r'eyJ[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+')
+
+# Запросы API, в заголовке которых фронтенд отправляет Bearer токен
+API_REQUEST_PATTERNS = ['get-month', 'api/v2/']
+
+LOGIN_ERROR_SELECTOR = "div.alert-danger, .error-message, .help-block-error, .text-danger"
+CAPTCHA_SELECTOR = "div.g-recaptcha, iframe[src*='recaptcha']"
+
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+
+def chromedriver_path():
+    """Путь к chromedriver: ChromeDriverManager().install() один раз на процесс"""
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is None:
+            from webdriver_manager.chrome import ChromeDriverManager
+            _driver_path = ChromeDriverManager().install()
+        return _driver_path
+
+
+def enable_network_log(chrome_options):
+    """Включить performance-лог Chrome (события CDP Network.*)"""
+    chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+
+def _displayed(elements):
+    """Элементы, которые видны (устаревшие элементы DOM пропускаем)"""
+    visible = []
+    for element in elements:
+        try:
+            if element.is_displayed():
+                visible.append(element)
+        except WebDriverException:
+            continue
+    return visible
+
+
+def visible_login_error(driver):
+    """
+    Текст ошибки на форме входа (или None)
+
+    Yii заранее рендерит пустые .help-block-error под полями, поэтому
+    считаются только видимые элементы с непустым текстом.
+    """
+    for element in _displayed(driver.find_elements(By.CSS_SELECTOR, LOGIN_ERROR_SELECTOR)):
+        try:
+            text = element.text.strip()
+        except WebDriverException:
+            continue
+        if text:
+            return text
+    return None
+
+
+def captcha_shown(driver):
+    """Показана ли капча"""
+    return bool(_displayed(driver.find_elements(By.CSS_SELECTOR, CAPTCHA_SELECTOR)))
+
+
+def login_settled(login_url_fragment='auth/login'):
+    """Условие: ушли со страницы входа либо показана ошибка или капча"""
+    def condition(driver):
+        if login_url_fragment not in driver.current_url:
+            return True
+        return bool(visible_login_error(driver)) or captcha_shown(driver)
+    return condition
+
+
+def token_from_storage(driver):
+    """JWT из localStorage / sessionStorage (или None)"""
+    values = driver.execute_script("""
+        var values = [];
+        [localStorage, sessionStorage].forEach(function (storage) {
+            for (var i = 0; i < storage.length; i++) {
+                values.push(storage.getItem(storage.key(i)) || '');
+            }
+        });
+        return values;
+    """)
+    for value in values or []:
+        match = JWT_RE.search(value)
+        if match:
+            return match.group(0)
+    return None
+
+
+def token_from_network(driver, patterns=API_REQUEST_PATTERNS):
+    """Bearer токен из запросов к API, замеченных в performance-логе (или None)"""
+    try:
+        entries = driver.get_log('performance')
+    except WebDriverException:
+        return None
+
+    for entry in entries:
+        try:
+            message = json.loads(entry['message'])['message']
+        except (KeyError, ValueError):
+            continue
+        if message.get('method') not in ('Network.requestWillBeSent', 'Network.requestWillBeSentExtraInfo'):
+            continue
+
+        params = message.get('params', {})
+        request = params.get('request', {})
+        url = request.get('url', '')
+        headers = request.get('headers') or params.get('headers') or {}
+        if request and not any(pattern in url for pattern in patterns):
+            continue
+
+        for name, value in headers.items():
+            if name.lower() == 'authorization' and 'Bearer ' in value:
+                match = JWT_RE.search(value)
+                if match:
+                    return match.group(0)
+    return None
+
+
+def wait_for_token(driver, timeout=20):
+    """
+    Дождаться токена: из запроса к API (CDP) или из localStorage
+
+    Returns:
+        str: Токен или None, если не дождались
+    """
+    def condition(d):
+        return token_from_network(d) or token_from_storage(d)
+
+    try:
+        return WebDriverWait(driver, timeout, poll_frequency=0.2).until(condition)
+    except TimeoutException:
+        logger.warning(f"Токен не появился за {timeout} с")
+        return None
@@ -2,6 +2,7 @@ import telebot
 from django.conf import settings
 from .models import TelegramUser, UserScheduleToken
 from .schedule_parser import ScheduleParserBot
+from .router import CommandRouter
 from dotenv import load_dotenv
 import os
 import sys
@@ -54,6 +55,7 @@ except ImportError as e:
     sys.exit(1)
 
 bot = telebot.TeleBot(TOKEN)
+router = CommandRouter().install(bot)
 print("=" * 50)
 print("🤖 БОТ ЗАПУЩЕН И ГОТОВ К РАБОТЕ!")
 print("=" * 50)
@@ -64,7 +66,7 @@ def get_weekday_name(weekday_index):
     return days[weekday_index] if 0 <= weekday_index < 7 else "Неизвестный день"
 
 # Обработчики сообщений
-@bot.message_handler(commands=['start', 'help'])
+@router.action('start')
 def start(message):
     try:
         user, created = TelegramUser.objects.get_or_create(
@@ -101,7 +103,7 @@ def start(message):
     except Exception as e:
         bot.send_message(message.chat.id, f"❌ Ошибка: {str(e)}")
 
-@bot.message_handler(func=lambda m: m.text == "📅 Сегодня")
+@router.action('today')
 def today(message):
     try:
         user = TelegramUser.objects.get(telegram_id=message.from_user.id)
@@ -134,7 +136,7 @@ def today(message):
     except Exception as e:
         bot.send_message(message.chat.id, f"❌ Ошибка: {str(e)}")
 
-@bot.message_handler(func=lambda m: m.text == "➕ Добавить пару")
+@router.action('add_lesson')
 def add_lesson_start(message):
     msg = bot.send_message(
         message.chat.id,
@@ -206,7 +208,7 @@ def process_add_lesson(message):
     except Exception as e:
         bot.send_message(message.chat.id, f"❌ Ошибка: {str(e)}")
 
-@bot.message_handler(func=lambda m: m.text == "📚 Задания")
+@router.action('homework')
 def show_homework(message):
     try:
         user = TelegramUser.objects.get(telegram_id=message.from_user.id)
@@ -269,7 +271,7 @@ def show_homework(message):
     except Exception as e:
         bot.send_message(message.chat.id, f"❌ Ошибка: {str(e)}")
 
-@bot.message_handler(func=lambda m: m.text == "➕ Добавить домашку")
+@router.action('add_homework')
 def add_homework_start(message):
     msg = bot.send_message(
         message.chat.id,
@@ -342,7 +344,8 @@ def process_add_homework(message):
     except Exception as e:
         bot.send_message(message.chat.id, f"❌ Ошибка: {str(e)}")
 
-@bot.message_handler(func=lambda m: m.text in ["⚙️ Настройки", "❓ Помощь"])
+@router.action('settings')
+@router.action('help')
 def help_settings(message):
     if message.text == "⚙️ Настройки":
         bot.send_message(
@@ -398,7 +401,7 @@ if __name__ == "__main__":
         traceback.print_exc()
 
 
-@bot.message_handler(commands=['set_token'])
+@router.action('set_token')
 def set_token(message):
     """Установить токен для парсинга"""
     user, created = TelegramUser.objects.get_or_create(
@@ -411,7 +414,9 @@ def set_token(message):
     )
     
     # Получаем токен из сообщения
-    token_text = message.text.replace('/set_token', '').strip()
+    # Кнопка «🔑 Установить токен» приходит сюда же — для неё показываем инструкцию
+    parts = message.text.split(maxsplit=1)
+    token_text = parts[1].strip() if parts[0].startswith('/set_token') and len(parts) > 1 else ''
     
     if not token_text:
         bot.reply_to(message, 
@@ -432,7 +437,7 @@ def set_token(message):
     
     bot.reply_to(message, "✅ Токен успешно сохранен!\nТеперь можете использовать команды расписания.")
 
-@bot.message_handler(commands=['schedule_today'])
+@router.action('schedule_today')
 def schedule_today(message):
     """Расписание на сегодня"""
     try:
@@ -470,7 +475,8 @@ def schedule_today(message):
     formatted = parser.format_schedule_for_today(schedule_data)
     bot.send_message(message.chat.id, formatted, parse_mode='Markdown')
 
-@bot.message_handler(commands=['schedule_tomorrow'])
+@router.action('schedule_tomorrow')
+@router.action('tomorrow')
 def schedule_tomorrow(message):
     """Расписание на завтра"""
     user = TelegramUser.objects.get(telegram_id=message.from_user.id)
@@ -493,7 +499,7 @@ def schedule_tomorrow(message):
     else:
         bot.reply_to(message, "❌ Не удалось получить расписание")
 
-@bot.message_handler(commands=['schedule_week'])
+@router.action('week')
 def schedule_week(message):
     """Расписание на неделю"""
     user = TelegramUser.objects.get(telegram_id=message.from_user.id)
@@ -516,7 +522,8 @@ def schedule_week(message):
     else:
         bot.reply_to(message, "❌ Не удалось получить расписание")
 
-@bot.message_handler(commands=['next_lesson'])
+@router.action('next_lesson')
+@router.action('next')
 def next_lesson(message):
     """Следующий урок"""
     user = TelegramUser.objects.get(telegram_id=message.from_user.id)
@@ -539,7 +546,7 @@ def next_lesson(message):
     else:
         bot.reply_to(message, "❌ Не удалось получить расписание")
 
-@bot.message_handler(commands=['schedule_help'])
+@router.action('schedule_help')
 def schedule_help(message):
     """Помощь по командам расписания"""
     help_text = """
@@ -564,7 +571,7 @@ def schedule_help(message):
     bot.send_message(message.chat.id, help_text, parse_mode='Markdown')
 
 # Меню с кнопками
-@bot.message_handler(commands=['schedule_menu'])
+@router.action('schedule_menu')
 def schedule_menu(message):
     """Меню расписания с кнопками"""
     markup = telebot.types.ReplyKeyboardMarkup(resize_keyboard=True, row_width=2)
@@ -584,24 +591,3 @@ def schedule_menu(message):
         reply_markup=markup,
         parse_mode='Markdown'
     )
-
-# Обработка кнопок
-@bot.message_handler(func=lambda message: True)
-def handle_all_messages(message):
-    """Обработка текстовых команд (кнопок)"""
-    user_text = message.text.lower()
-    
-    user = TelegramUser.objects.get(telegram_id=message.from_user.id)
-    
-    if user_text == '📅 сегодня':
-        schedule_today(message)
-    elif user_text == '⏭️ завтра':
-        schedule_tomorrow(message)
-    elif user_text == '📆 неделя':
-        schedule_week(message)
-    elif user_text == '⏰ следующий урок':
-        next_lesson(message)
-    elif user_text == '🔑 установить токен':
-        bot.reply_to(message, "Отправьте команду /set_token ваш_токен")
-    elif user_text == '❓ помощь':
-        schedule_help(message)
\ No newline at end of file
@@ -0,0 +1,201 @@
+# tracker/chat_dispatcher.py
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections
+from .utils import percentile
+
+logger = logging.getLogger(__name__)
+
+
+def chat_key(update):
+    """Ключ очереди update: id чата (иначе пользователя, иначе сам update)"""
+    for field in ('message', 'edited_message', 'channel_post', 'edited_channel_post'):
+        message = getattr(update, field, None)
+        if message is not None:
+            return message.chat.id
+
+    callback = getattr(update, 'callback_query', None)
+    if callback is not None:
+        if callback.message is not None:
+            return callback.message.chat.id
+        return callback.from_user.id
+
+    for field in ('inline_query', 'chosen_inline_result', 'shipping_query', 'pre_checkout_query'):
+        event = getattr(update, field, None)
+        if event is not None:
+            return event.from_user.id
+
+    return ('update', update.update_id)
+
+
+class ChatDispatcher:
+    """
+    Параллельная обработка updates с сохранением порядка внутри чата
+
+    Updates разных чатов выполняются на пуле из workers потоков; updates
+    одного чата — строго по очереди (иначе ломаются цепочки
+    register_next_step_handler, например вход: логин → пароль).
+    """
+
+    def __init__(self, handler, workers=None):
+        self.handler = handler  # handler([update]) — исходный bot.process_new_updates
+        self.workers = workers or getattr(settings, 'BOT_WORKERS', 8)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='chat')
+        self._queues = {}  # чат -> deque[(update, future, queued_at)]
+        self._lock = threading.Lock()
+        self._busy = 0
+
+        # Метрики (последние 1000 значений)
+        self.latencies = deque(maxlen=1000)
+        self.queue_waits = deque(maxlen=1000)
+        self.processed = 0
+        self.failed = 0
+        self.max_depth = 0
+
+    def dispatch(self, updates):
+        """
+        Разложить updates по очередям чатов
+
+        Returns:
+            list: Future для каждого update
+        """
+        futures = []
+        to_start = []
+
+        with self._lock:
+            for update in updates:
+                future = Future()
+                futures.append(future)
+                key = chat_key(update)
+
+                queue = self._queues.get(key)
+                if queue is None:
+                    # Чат не обрабатывается — запускаем его очередь на пуле
+                    queue = self._queues[key] = deque()
+                    to_start.append(key)
+                queue.append((update, future, time.monotonic()))
+
+            self.max_depth = max(self.max_depth, self._depth())
+
+        for key in to_start:
+            self._executor.submit(self._drain, key)
+
+        return futures
+
+    def _depth(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _drain(self, key):
+        """Обработать очередь чата до конца (один поток на чат)"""
+        with self._lock:
+            self._busy += 1
+
+        try:
+            while True:
+                with self._lock:
+                    queue = self._queues[key]
+                    if not queue:
+                        del self._queues[key]
+                        return
+                    update, future, queued_at = queue.popleft()
+
+                if not future.set_running_or_notify_cancel():
+                    continue
+
+                started = time.monotonic()
+                try:
+                    self.handler([update])
+                    future.set_result(None)
+                    ok = True
+                except Exception as e:
+                    logger.error(f"❌ Ошибка обработки update {update.update_id}: {e}")
+                    future.set_exception(e)
+                    ok = False
+                finally:
+                    close_old_connections()
+
+                with self._lock:
+                    self.queue_waits.append(started - queued_at)
+                    self.latencies.append(time.monotonic() - started)
+                    if ok:
+                        self.processed += 1
+                    else:
+                        self.failed += 1
+        finally:
+            with self._lock:
+                self._busy -= 1
+
+    def stats(self):
+        """Метрики: глубина очередей, загрузка пула, время обработчиков"""
+        with self._lock:
+            latencies = list(self.latencies)
+            waits = list(self.queue_waits)
+            return {
+                'queue_depth': self._depth(),
+                'max_queue_depth': self.max_depth,
+                'active_chats': len(self._queues),
+                'busy_workers': self._busy,
+                'workers': self.workers,
+                'saturation': round(self._busy / self.workers, 2),
+                'processed': self.processed,
+                'failed': self.failed,
+                'handler_p50': percentile(latencies, 50),
+                'handler_p95': percentile(latencies, 95),
+                'queue_wait_p95': percentile(waits, 95),
+            }
+
+    def start_reporter(self, interval=None, sources=None):
+        """
+        Писать метрики в лог раз в interval секунд
+
+        sources — дополнительные метрики процесса: название -> функция,
+        возвращающая словарь (или None, если подсистема не запускалась).
+        """
+        interval = interval or getattr(settings, 'BOT_STATS_INTERVAL', 60)
+        sources = sources or {}
+
+        def report():
+            while True:
+                time.sleep(interval)
+                stats = self.stats()
+                logger.info(
+                    f"📊 Очередь {stats['queue_depth']} (макс. {stats['max_queue_depth']}), "
+                    f"занято {stats['busy_workers']}/{stats['workers']}, "
+                    f"обработчик p50 {stats['handler_p50'] * 1000:.0f} мс / "
+                    f"p95 {stats['handler_p95'] * 1000:.0f} мс, ошибок {stats['failed']}"
+                )
+                for name, source in sources.items():
+                    try:
+                        source_stats = source()
+                    except Exception as e:
+                        logger.error(f"Ошибка метрик {name}: {e}")
+                        continue
+                    if source_stats is not None:
+                        logger.info(f"📊 {name}: {source_stats}")
+
+        threading.Thread(target=report, name='chat-dispatcher-stats', daemon=True).start()
+
+
+def install(bot, workers=None):
+    """
+    Подключить диспетчер к TeleBot (создавать с threaded=False)
+
+    bot.process_new_updates заменяется: polling и webhook-воркеры
+    отдают updates в диспетчер и не ждут обработчики.
+    """
+    dispatcher = ChatDispatcher(bot.process_new_updates, workers)
+
+    def process_new_updates(updates):
+        # offset для getUpdates сдвигаем сразу, иначе polling получит те же updates снова
+        for update in updates:
+            if update.update_id > bot.last_update_id:
+                bot.last_update_id = update.update_id
+        return dispatcher.dispatch(updates)
+
+    bot.process_new_updates = process_new_updates
+    bot.dispatcher = dispatcher
+    return dispatcher
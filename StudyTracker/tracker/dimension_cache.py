@@ -0,0 +1,136 @@
+# tracker/dimension_cache.py
+import logging
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.db import transaction
+from .models import ParsedTeacher, ParsedSubject, ParsedRoom
+
+logger = logging.getLogger(__name__)
+
+
+class DimensionCache:
+    """
+    Кэш справочника имя → id (общий для всех пользователей процесса)
+
+    Сигналы сбрасывают кэш только в процессе, где запись изменили
+    (обычно в админке), поэтому запись живёт не дольше ttl секунд:
+    бот и воркеры синхронизации увидят удаление из справочника сами.
+    """
+
+    def __init__(self, model, max_size=None, ttl=None):
+        self.model = model
+        self.max_size = max_size or getattr(settings, 'DIMENSION_CACHE_SIZE', 5000)
+        self.ttl = ttl or getattr(settings, 'DIMENSION_CACHE_TTL', 300)
+        self._ids = OrderedDict()  # имя -> (id, когда закэширован)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _put(self, ids):
+        """Положить пары имя → id (вытесняя самые старые записи)"""
+        now = time.monotonic()
+        with self._lock:
+            for name, pk in ids.items():
+                self._ids[name] = (pk, now)
+                self._ids.move_to_end(name)
+            while len(self._ids) > self.max_size:
+                self._ids.popitem(last=False)
+
+    def warm(self):
+        """Прогреть кэш из БД"""
+        rows = self.model.objects.order_by('id').values_list('name', 'id')[:self.max_size]
+        self._put(dict(rows))
+        return len(self._ids)
+
+    def resolve(self, names):
+        """
+        Получить id по именам; в БД идём только за именами, которых нет в кэше
+
+        Args:
+            names (iterable): Имена
+
+        Returns:
+            dict: {имя: id}
+        """
+        ids = {}
+        missing = set()
+        now = time.monotonic()
+
+        with self._lock:
+            for name in set(names):
+                entry = self._ids.get(name)
+                if entry and now - entry[1] < self.ttl:
+                    self._ids.move_to_end(name)
+                    ids[name] = entry[0]
+                    self.hits += 1
+                else:
+                    missing.add(name)
+                    self.misses += 1
+
+        if not missing:
+            return ids
+
+        # Одним запросом читаем существующие, недостающие создаём пачкой
+        found = dict(self.model.objects.filter(name__in=missing).values_list('name', 'id'))
+        self._put(found)
+        ids.update(found)
+
+        new_names = missing - found.keys()
+        if new_names:
+            self.model.objects.bulk_create(
+                [self.model(name=name) for name in new_names], ignore_conflicts=True
+            )
+            created = dict(self.model.objects.filter(name__in=new_names).values_list('name', 'id'))
+            ids.update(created)
+            # Новые записи кэшируем только после коммита, иначе откат оставит битые id
+            transaction.on_commit(lambda: self._put(created))
+
+        return ids
+
+    def invalidate(self, pk=None):
+        """Сбросить запись по id (или весь кэш)"""
+        with self._lock:
+            if pk is None:
+                self._ids.clear()
+                return
+            for name in [name for name, (cached_pk, _) in self._ids.items() if cached_pk == pk]:
+                del self._ids[name]
+
+    def stats(self):
+        """Статистика кэша"""
+        with self._lock:
+            return {'size': len(self._ids), 'hits': self.hits, 'misses': self.misses}
+
+
+teacher_cache = DimensionCache(ParsedTeacher)
+subject_cache = DimensionCache(ParsedSubject)
+room_cache = DimensionCache(ParsedRoom)
+
+CACHES_BY_MODEL = {
+    ParsedTeacher: teacher_cache,
+    ParsedSubject: subject_cache,
+    ParsedRoom: room_cache,
+}
+
+
+def invalidate_dimension_caches():
+    """Сбросить кэши всех справочников"""
+    for cache in CACHES_BY_MODEL.values():
+        cache.invalidate()
+
+
+def warm_dimension_caches():
+    """Прогреть кэши справочников при старте процесса"""
+    for model, cache in CACHES_BY_MODEL.items():
+        try:
+            count = cache.warm()
+            logger.info(f"Кэш {model.__name__}: {count} записей")
+        except Exception as e:
+            logger.error(f"Ошибка прогрева кэша {model.__name__}: {e}")
+
+
+def dimension_cache_stats():
+    """Статистика кэшей справочников по моделям"""
+    return {model.__name__: cache.stats() for model, cache in CACHES_BY_MODEL.items()}
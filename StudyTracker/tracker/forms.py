@@ -1,21 +1,17 @@
 # tracker/forms.py
 from django import forms
-from .models import UserAuthToken
+from .models import UserCredentials
 
 class TokenForm(forms.ModelForm):
     class Meta:
-        model = UserAuthToken
-        fields = ['auth_token', 'top_login', 'auto_sync', 'sync_frequency']
+        model = UserCredentials
+        fields = ['auth_token', 'auto_sync', 'sync_frequency']
         widgets = {
             'auth_token': forms.Textarea(attrs={
                 'rows': 3,
                 'placeholder': 'Вставьте токен из Authorization header...',
                 'class': 'form-control'
             }),
-            'top_login': forms.TextInput(attrs={
-                'placeholder': 'Логин от Top Academy',
-                'class': 'form-control'
-            }),
             'sync_frequency': forms.NumberInput(attrs={
                 'class': 'form-control',
                 'min': 1,
@@ -24,7 +20,6 @@ class TokenForm(forms.ModelForm):
         }
         labels = {
             'auth_token': 'Токен авторизации',
-            'top_login': 'Логин (опционально)',
             'auto_sync': 'Автоматическая синхронизация',
             'sync_frequency': 'Частота синхронизации (часов)',
         }
\ No newline at end of file
@@ -0,0 +1,133 @@
+# tracker/jobs.py
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """Фоновая задача"""
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, job_id, name, key=None):
+        self.id = job_id
+        self.name = name
+        self.key = key
+        self.status = self.PENDING
+        self.result = None
+        self.error = None
+        self.created_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+
+
+class JobQueue:
+    """
+    Очередь долгих операций (вход, синхронизация) в потоках процесса
+
+    Обработчик бота ставит задачу и сразу отвечает; задача сообщает
+    прогресс через report(text) и итог через on_done(job).
+    Задача с тем же key, пока она не завершилась, второй раз не ставится.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or getattr(settings, 'JOB_WORKERS', 4)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+        self._ids = itertools.count(1)
+        self._active = {}  # key -> Job
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+
+    def submit(self, name, func, key=None, on_progress=None, on_done=None):
+        """
+        Поставить задачу
+
+        Args:
+            name (str): Название (для логов)
+            func (callable): func(report) -> результат; report(text) — прогресс
+            key: Ключ дедупликации (например, ('sync', user_id))
+            on_progress (callable): on_progress(text)
+            on_done (callable): on_done(job) после завершения (успех или ошибка)
+
+        Returns:
+            tuple: (Job, True) или (уже идущая Job, False)
+        """
+        with self._lock:
+            if key is not None and key in self._active:
+                return self._active[key], False
+            job = Job(next(self._ids), name, key)
+            if key is not None:
+                self._active[key] = job
+
+        self._executor.submit(self._run, job, func, on_progress, on_done)
+        return job, True
+
+    def _run(self, job, func, on_progress, on_done):
+        job.status = Job.RUNNING
+        job.started_at = time.monotonic()
+
+        def report(text):
+            if on_progress:
+                try:
+                    on_progress(text)
+                except Exception as e:
+                    logger.warning(f"Прогресс задачи {job.name}: {e}")
+
+        try:
+            job.result = func(report)
+            job.status = Job.DONE
+        except Exception as e:
+            logger.error(f"❌ Задача {job.name}: {e}")
+            job.error = e
+            job.status = Job.FAILED
+        finally:
+            job.finished_at = time.monotonic()
+            close_old_connections()
+            with self._lock:
+                if job.key is not None:
+                    self._active.pop(job.key, None)
+                if job.status == Job.DONE:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+        logger.info(f"Задача {job.name}: {job.status} за {job.finished_at - job.started_at:.1f} с")
+
+        if on_done:
+            try:
+                on_done(job)
+            except Exception as e:
+                logger.error(f"Итог задачи {job.name}: {e}")
+
+    def stats(self):
+        """Статистика очереди"""
+        with self._lock:
+            return {
+                'active': len(self._active),
+                'completed': self.completed,
+                'failed': self.failed,
+                'workers': self.workers,
+            }
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Общая очередь задач процесса"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
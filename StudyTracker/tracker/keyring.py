@@ -0,0 +1,72 @@
+# tracker/keyring.py
+import threading
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+_keyring = None
+_keyring_lock = threading.Lock()
+
+
+def configured_keys():
+    """
+    Ключи шифрования из настроек
+
+    ENCRYPTION_KEYS — список, первый ключ основной (им шифруем),
+    остальные только для расшифровки старых данных. ENCRYPTION_KEY —
+    одиночный ключ для простой установки.
+    """
+    keys = list(getattr(settings, 'ENCRYPTION_KEYS', None) or [])
+    single = getattr(settings, 'ENCRYPTION_KEY', None)
+    if single and single not in keys:
+        keys.append(single)
+    return keys
+
+
+def get_keyring():
+    """MultiFernet процесса (создаётся один раз)"""
+    global _keyring
+    with _keyring_lock:
+        if _keyring is None:
+            keys = configured_keys()
+            if not keys:
+                raise ImproperlyConfigured(
+                    "Не задан ENCRYPTION_KEY (или ENCRYPTION_KEYS): "
+                    "без постоянного ключа сохранённые логины нельзя расшифровать"
+                )
+            try:
+                _keyring = MultiFernet([Fernet(key) for key in keys])
+            except ValueError as e:
+                raise ImproperlyConfigured(f"Некорректный ключ шифрования: {e}")
+        return _keyring
+
+
+def reset_keyring():
+    """Сбросить кэш (после смены ключей в настройках)"""
+    global _keyring
+    with _keyring_lock:
+        _keyring = None
+
+
+def encrypt(value):
+    """Зашифровать строку основным ключом"""
+    if not value:
+        return ""
+    return get_keyring().encrypt(value.encode()).decode()
+
+
+def decrypt(token):
+    """Расшифровать строку любым из ключей ('' если не получилось)"""
+    if not token:
+        return ""
+    try:
+        return get_keyring().decrypt(token.encode()).decode()
+    except InvalidToken:
+        return ""
+
+
+def rotate(token):
+    """Перешифровать строку основным ключом"""
+    if not token:
+        return token
+    return get_keyring().rotate(token.encode()).decode()
@@ -0,0 +1,117 @@
+# tracker/management/commands/process_updates.py
+import logging
+import threading
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from tracker.update_queue import claim_updates, finish_update, heartbeat, release_stale
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Воркер webhook-режима: обрабатывает updates Telegram из очереди в БД"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help="Сколько потоков-обработчиков запустить")
+        parser.add_argument('--batch', type=int, default=10,
+                            help="Сколько updates забирать за раз")
+        parser.add_argument('--stale', type=int, default=300,
+                            help="Через сколько секунд вернуть в очередь update упавшего воркера")
+        parser.add_argument('--once', action='store_true',
+                            help="Обработать очередь и выйти")
+
+    def handle(self, *args, **options):
+        # Те же обработчики, что и в режиме polling
+        from run_bot import bot, start_stats_reporter
+        from telebot.types import Update
+
+        self.bot = bot
+        self.Update = Update
+        self.options = options
+        self.stop = threading.Event()
+        self.claims = set()  # токены захватов, которые сейчас обрабатываются
+        self.claims_lock = threading.Lock()
+
+        release_stale(options['stale'])
+        if not options['once']:
+            start_stats_reporter()
+        self.stdout.write(f"📥 Воркер updates запущен (потоков: {options['workers']})")
+
+        threads = [
+            threading.Thread(target=self.worker_loop, name=f"updates-{i}", daemon=True)
+            for i in range(options['workers'])
+        ]
+        for thread in threads:
+            thread.start()
+        threading.Thread(target=self.heartbeat_loop, name="updates-heartbeat", daemon=True).start()
+
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            self.stop.set()
+
+        self.stdout.write("✅ Воркер updates остановлен")
+
+    def worker_loop(self):
+        idle_since = None
+
+        while not self.stop.is_set():
+            try:
+                updates = claim_updates(self.options['batch'])
+            except Exception as e:
+                logger.error(f"Ошибка чтения очереди: {e}")
+                updates = []
+            finally:
+                close_old_connections()
+
+            if not updates:
+                if self.options['once']:
+                    return
+                idle_since = idle_since or time.monotonic()
+                if time.monotonic() - idle_since > self.options['stale']:
+                    release_stale(self.options['stale'])
+                    idle_since = None
+                time.sleep(0.5)
+                continue
+
+            idle_since = None
+            token = updates[0].claimed_by
+            with self.claims_lock:
+                self.claims.add(token)
+            try:
+                for update in updates:
+                    self.process(update)
+            finally:
+                with self.claims_lock:
+                    self.claims.discard(token)
+
+    def heartbeat_loop(self):
+        """Продлевать захваты живых потоков, чтобы release_stale их не трогал"""
+        interval = max(self.options['stale'] / 3, 1)
+        while not self.stop.wait(interval):
+            with self.claims_lock:
+                tokens = list(self.claims)
+            try:
+                heartbeat(tokens)
+            except Exception as e:
+                logger.error(f"Ошибка heartbeat очереди: {e}")
+            finally:
+                close_old_connections()
+
+    def process(self, update):
+        """Прогнать update через обработчики бота"""
+        try:
+            # Диспетчер бота сохраняет порядок внутри чата; ждём, чтобы статус
+            # отражал реальный итог обработчика
+            for future in self.bot.process_new_updates([self.Update.de_json(update.payload)]) or []:
+                future.result()
+            finish_update(update)
+        except Exception as e:
+            logger.error(f"❌ Update {update.update_id}: {e}")
+            finish_update(update, error=e)
+        finally:
+            close_old_connections()
@@ -0,0 +1,125 @@
+# tracker/management/commands/refresh_tokens.py
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+from tracker.models import UserCredentials
+from tracker.sync_jobs import refresh_user_token
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Заранее обновлять токены, которые скоро истекут (вне запросов пользователей)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lead', type=int, default=None,
+                            help="За сколько минут до истечения обновлять (по умолчанию TOKEN_REFRESH_LEAD)")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Сколько входов выполнять одновременно (по умолчанию TOKEN_REFRESH_WORKERS)")
+        parser.add_argument('--interval', type=int, default=60,
+                            help="Как часто проверять токены, секунд")
+        parser.add_argument('--once', action='store_true',
+                            help="Обновить всех, кому пора, и выйти")
+
+    def handle(self, *args, **options):
+        lead_minutes = options['lead'] or getattr(settings, 'TOKEN_REFRESH_LEAD', 30)
+        self.lead = timedelta(minutes=lead_minutes)
+        self.workers = options['workers'] or getattr(settings, 'TOKEN_REFRESH_WORKERS', 2)
+        self.max_attempts = getattr(settings, 'TOKEN_REFRESH_MAX_ATTEMPTS', 5)
+        self.in_flight = set()
+        self.lock = threading.Lock()
+
+        self.stdout.write(
+            f"🔑 Обновление токенов: за {lead_minutes} мин до истечения, воркеров: {self.workers}"
+        )
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                for credentials in self.due_credentials():
+                    with self.lock:
+                        if len(self.in_flight) >= self.workers:
+                            break
+                        self.in_flight.add(credentials.user_id)
+                    future = executor.submit(refresh_user_token, credentials.user)
+                    future.add_done_callback(
+                        lambda f, credentials=credentials: self.on_done(credentials, f)
+                    )
+
+                if options['once']:
+                    with self.lock:
+                        idle = not self.in_flight
+                    if idle and not self.due_credentials():
+                        break
+                    time.sleep(1)
+                    continue
+
+                time.sleep(options['interval'])
+
+        self.stdout.write("✅ Обновление токенов остановлено")
+
+    def refresh_at(self, credentials):
+        """
+        Когда обновлять токен
+
+        Окно lead не больше четверти наблюдаемого времени жизни токенов
+        аккаунта (короткоживущие токены не обновляются сразу после выдачи).
+        Окно делится пополам: каждый пользователь получает постоянный
+        сдвиг в первой половине, поэтому токены, выданные одновременно,
+        обновляются вразброс, но все — не позже чем за lead/2 до истечения.
+        """
+        lead = self.lead.total_seconds()
+        if credentials.token_lifetime:
+            lead = min(lead, credentials.token_lifetime / 4)
+        spread = random.Random(credentials.user_id).uniform(0, lead / 2)
+        return credentials.token_expires - timedelta(seconds=lead - spread)
+
+    def due_credentials(self):
+        """
+        Пользователи, чей токен пора обновить (по индексу token_expires)
+
+        После неудачного входа пользователь ждёт next_refresh_at
+        (экспоненциальная пауза), а после TOKEN_REFRESH_MAX_ATTEMPTS
+        неудач подряд — нового /login: вероятно, сменился пароль.
+        """
+        now = timezone.now()
+        candidates = UserCredentials.objects.filter(
+            Q(next_refresh_at__isnull=True) | Q(next_refresh_at__lte=now),
+            is_active=True,
+            token_expires__isnull=False,
+            token_expires__lte=now + self.lead,
+            login_attempts__lt=self.max_attempts,
+        ).exclude(
+            encrypted_login='',
+        ).exclude(
+            encrypted_password='',
+        ).select_related('user').order_by('token_expires')
+
+        with self.lock:
+            skip = set(self.in_flight)
+
+        due = [
+            credentials for credentials in candidates
+            if credentials.user_id not in skip and self.refresh_at(credentials) <= now
+        ]
+        close_old_connections()
+        return due
+
+    def on_done(self, credentials, future):
+        """Итог обновления токена"""
+        result = future.result()
+
+        with self.lock:
+            self.in_flight.discard(credentials.user_id)
+
+        if result['success']:
+            logger.info(f"🔑 {credentials.user}: токен обновлён заранее")
+        else:
+            logger.error(f"❌ {credentials.user}: {result.get('error')}")
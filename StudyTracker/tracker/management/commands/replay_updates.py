@@ -0,0 +1,66 @@
+# tracker/management/commands/replay_updates.py
+import json
+import time
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Отправить записанные updates Telegram на webhook (локальная замена Telegram)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path',
+                            help="Файл с updates: JSON-массив или по одному JSON на строку")
+        parser.add_argument('--url', default='http://127.0.0.1:8000/telegram/webhook/',
+                            help="Адрес webhook")
+        parser.add_argument('--secret', default=None,
+                            help="Секрет (по умолчанию TELEGRAM_WEBHOOK_SECRET)")
+        parser.add_argument('--delay', type=float, default=0,
+                            help="Пауза между updates, секунд")
+
+    def handle(self, *args, **options):
+        updates = self.load(options['path'])
+        secret = options['secret'] or getattr(settings, 'TELEGRAM_WEBHOOK_SECRET', '')
+        if not secret:
+            raise CommandError("Не задан секрет webhook (TELEGRAM_WEBHOOK_SECRET или --secret)")
+
+        session = requests.Session()
+        session.headers['X-Telegram-Bot-Api-Secret-Token'] = secret
+
+        started = time.monotonic()
+        failed = 0
+
+        for update in updates:
+            try:
+                response = session.post(options['url'], json=update, timeout=10)
+                if response.status_code != 200:
+                    failed += 1
+                    self.stderr.write(f"❌ Update {update.get('update_id')}: HTTP {response.status_code}")
+            except requests.RequestException as e:
+                failed += 1
+                self.stderr.write(f"❌ Update {update.get('update_id')}: {e}")
+
+            if options['delay']:
+                time.sleep(options['delay'])
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f"✅ Отправлено {len(updates) - failed} из {len(updates)} за {elapsed:.2f} с "
+            f"({len(updates) / elapsed if elapsed else 0:.0f} updates/с)"
+        )
+
+    def load(self, path):
+        """Прочитать updates из файла"""
+        try:
+            with open(path, encoding='utf-8') as f:
+                text = f.read().strip()
+        except OSError as e:
+            raise CommandError(f"Не удалось прочитать {path}: {e}")
+
+        try:
+            if text.startswith('['):
+                return json.loads(text)
+            return [json.loads(line) for line in text.splitlines() if line.strip()]
+        except ValueError as e:
+            raise CommandError(f"Некорректный JSON в {path}: {e}")
@@ -0,0 +1,59 @@
+# tracker/management/commands/rotate_encryption_keys.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from tracker import keyring
+from tracker.models import UserCredentials
+
+# Шифрованные поля UserCredentials
+ENCRYPTED_FIELDS = ['encrypted_login', 'encrypted_password', 'encrypted_browser_state']
+
+
+class Command(BaseCommand):
+    help = (
+        "Перешифровать сохранённые данные входа основным ключом. "
+        "Новый ключ ставится первым в ENCRYPTION_KEYS, старые остаются после него."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Сколько записей обновлять за один запрос")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Только посчитать, ничего не записывать")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        keyring.reset_keyring()
+        self.stdout.write(f"🔐 Ключей в наборе: {len(keyring.configured_keys())}")
+
+        rotated = 0
+        failed = 0
+        batch = []
+
+        queryset = UserCredentials.objects.only('id', *ENCRYPTED_FIELDS).order_by('id')
+
+        with transaction.atomic():
+            for credentials in queryset.iterator(chunk_size=batch_size):
+                try:
+                    for field in ENCRYPTED_FIELDS:
+                        setattr(credentials, field, keyring.rotate(getattr(credentials, field)))
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"❌ Запись {credentials.id}: не расшифровывается ни одним ключом ({type(e).__name__})")
+                    continue
+
+                batch.append(credentials)
+                if len(batch) >= batch_size:
+                    rotated += self.flush(batch, options['dry_run'])
+
+            rotated += self.flush(batch, options['dry_run'])
+
+        action = "Будет перешифровано" if options['dry_run'] else "Перешифровано"
+        self.stdout.write(f"✅ {action}: {rotated}, ошибок: {failed}")
+
+    def flush(self, batch, dry_run):
+        """Записать пачку одним bulk_update"""
+        count = len(batch)
+        if batch and not dry_run:
+            UserCredentials.objects.bulk_update(batch, ENCRYPTED_FIELDS)
+        batch.clear()
+        return count
@@ -0,0 +1,114 @@
+# tracker/management/commands/run_sync_scheduler.py
+import heapq
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.db.models import Q
+from tracker.models import UserCredentials
+from tracker.sync_jobs import sync_user
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Фоновая синхронизация расписаний по UserCredentials.auto_sync / sync_frequency"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help="Сколько синхронизаций выполнять одновременно")
+        parser.add_argument('--jitter', type=int, default=600,
+                            help="Разброс времени запуска, секунд")
+        parser.add_argument('--reload', type=int, default=60,
+                            help="Как часто перечитывать пользователей из БД, секунд")
+        parser.add_argument('--once', action='store_true',
+                            help="Синхронизировать всех просроченных и выйти")
+
+    def handle(self, *args, **options):
+        self.workers = options['workers']
+        self.jitter = options['jitter']
+        self.in_flight = set()
+        self.lock = threading.Lock()
+
+        self.stdout.write(f"🔄 Планировщик синхронизации запущен (воркеров: {self.workers})")
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            queue = []
+            next_reload = 0
+
+            while True:
+                now = time.time()
+
+                if now >= next_reload:
+                    queue = self.build_queue()
+                    next_reload = now + options['reload']
+
+                # Запускаем всех, чей срок подошёл, но не больше числа воркеров
+                while queue and queue[0][0] <= now and self.has_free_worker():
+                    _, _, credentials = heapq.heappop(queue)
+                    with self.lock:
+                        self.in_flight.add(credentials.user_id)
+                    future = executor.submit(sync_user, credentials.user)
+                    future.add_done_callback(
+                        lambda f, credentials=credentials: self.on_done(credentials, f)
+                    )
+
+                if options['once'] and not (queue and queue[0][0] <= time.time()):
+                    with self.lock:
+                        if not self.in_flight:
+                            break
+
+                sleep_for = 1
+                if queue:
+                    sleep_for = min(1, max(0, queue[0][0] - time.time()))
+                time.sleep(sleep_for)
+
+        self.stdout.write("✅ Планировщик остановлен")
+
+    def has_free_worker(self):
+        with self.lock:
+            return len(self.in_flight) < self.workers
+
+    def next_due(self, credentials):
+        """Когда синхронизировать пользователя (с постоянным разбросом на пользователя)"""
+        jitter = random.Random(credentials.user_id).uniform(0, self.jitter)
+        if not credentials.last_sync_at:
+            return credentials.created_at.timestamp() + jitter
+        period = max(1, credentials.sync_frequency) * 3600
+        return credentials.last_sync_at.timestamp() + period + jitter
+
+    def build_queue(self):
+        """Очередь пользователей по времени следующей синхронизации"""
+        credentials_list = UserCredentials.objects.filter(
+            auto_sync=True,
+            is_active=True,
+        ).exclude(
+            Q(auth_token='') & (Q(encrypted_login='') | Q(encrypted_password=''))
+        ).select_related('user')
+
+        with self.lock:
+            in_flight = set(self.in_flight)
+
+        queue = []
+        for credentials in credentials_list:
+            if credentials.user_id in in_flight:
+                continue
+            queue.append((self.next_due(credentials), credentials.user_id, credentials))
+
+        heapq.heapify(queue)
+        close_old_connections()
+        return queue
+
+    def on_done(self, credentials, future):
+        """Итог синхронизации пользователя"""
+        with self.lock:
+            self.in_flight.discard(credentials.user_id)
+
+        result = future.result()
+        if result['success']:
+            logger.info(f"✅ {credentials.user}: синхронизировано {result.get('total', 0)} уроков")
+        else:
+            logger.error(f"❌ {credentials.user}: {result.get('error')}")
@@ -0,0 +1,68 @@
+# tracker/management/commands/sync_all_schedules.py
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from tracker.models import TelegramUser
+from tracker.rate_limit import configure_host_bucket
+from tracker.api_client import API_HOST
+from tracker.sync_jobs import sync_user
+from tracker.utils import percentile
+
+
+class Command(BaseCommand):
+    help = "Синхронизировать расписание всех пользователей пулом потоков"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=16,
+                            help="Размер пула потоков")
+        parser.add_argument('--rate', type=float, default=None,
+                            help="Лимит запросов к API в секунду (по умолчанию API_RATE_LIMIT)")
+        parser.add_argument('--auto-only', action='store_true',
+                            help="Только пользователи с включённой автосинхронизацией")
+
+    def handle(self, *args, **options):
+        if options['rate']:
+            configure_host_bucket(API_HOST, options['rate'], getattr(settings, 'API_RATE_BURST', None))
+
+        users = TelegramUser.objects.filter(credentials__is_active=True).exclude(
+            Q(credentials__auth_token='') &
+            (Q(credentials__encrypted_login='') | Q(credentials__encrypted_password=''))
+        )
+        if options['auto_only']:
+            users = users.filter(credentials__auto_sync=True)
+        users = list(users)
+
+        self.stdout.write(f"🔄 Синхронизация {len(users)} пользователей, воркеров: {options['workers']}")
+
+        started = time.monotonic()
+        fetch_times = []
+        errors = Counter()
+        success_count = 0
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            futures = {executor.submit(sync_user, user): user for user in users}
+
+            for future in as_completed(futures):
+                result = future.result()
+                fetch_times.extend(result.get('fetch_times', []))
+
+                if result['success']:
+                    success_count += 1
+                else:
+                    errors[result.get('error_class', 'Unknown')] += 1
+                    self.stderr.write(f"❌ {futures[future]}: {result.get('error')}")
+
+        elapsed = time.monotonic() - started
+
+        self.stdout.write("=" * 50)
+        self.stdout.write(f"Пользователей: {len(users)} (успешно: {success_count}, ошибок: {sum(errors.values())})")
+        self.stdout.write(f"Время: {elapsed:.1f} с, {len(users) / elapsed if elapsed else 0:.2f} польз./с")
+        self.stdout.write(
+            f"Запрос к API: p50 {percentile(fetch_times, 50) * 1000:.0f} мс, "
+            f"p95 {percentile(fetch_times, 95) * 1000:.0f} мс"
+        )
+        for error_class, count in errors.most_common():
+            self.stdout.write(f"  {error_class}: {count}")
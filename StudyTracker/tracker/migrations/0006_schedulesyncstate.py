@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0005_alter_telegramuser_first_name_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleSyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='Месяц')),
+                ('synced_at', models.DateTimeField(verbose_name='Последняя успешная синхронизация')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sync_states', to='tracker.telegramuser')),
+            ],
+            options={
+                'verbose_name': 'Синхронизация месяца',
+                'verbose_name_plural': 'Синхронизации месяцев',
+                'unique_together': {('user', 'month')},
+            },
+        ),
+    ]
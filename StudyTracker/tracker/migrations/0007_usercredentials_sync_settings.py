@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0006_schedulesyncstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usercredentials',
+            name='auto_sync',
+            field=models.BooleanField(default=True, verbose_name='Автосинхронизация'),
+        ),
+        migrations.AddField(
+            model_name='usercredentials',
+            name='last_sync_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Последняя синхронизация'),
+        ),
+        migrations.AddField(
+            model_name='usercredentials',
+            name='last_sync_error',
+            field=models.TextField(blank=True, verbose_name='Последняя ошибка'),
+        ),
+        migrations.AddField(
+            model_name='usercredentials',
+            name='last_sync_success',
+            field=models.BooleanField(default=False, verbose_name='Последняя синхр. успешна'),
+        ),
+        migrations.AddField(
+            model_name='usercredentials',
+            name='sync_frequency',
+            field=models.IntegerField(default=24, verbose_name='Частота синхронизации (часов)'),
+        ),
+    ]
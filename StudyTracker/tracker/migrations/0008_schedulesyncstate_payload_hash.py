@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0007_usercredentials_sync_settings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='schedulesyncstate',
+            name='payload_hash',
+            field=models.CharField(blank=True, max_length=64, verbose_name='Отпечаток ответа API'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0008_schedulesyncstate_payload_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='usercredentials',
+            name='token_expires',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Истекает'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0009_usercredentials_token_expires_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usercredentials',
+            name='token_issued_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Токен выдан'),
+        ),
+        migrations.AddField(
+            model_name='usercredentials',
+            name='token_lifetime',
+            field=models.IntegerField(blank=True, null=True, verbose_name='Время жизни токена (сек)'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0010_usercredentials_token_lifetime'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usercredentials',
+            name='encrypted_browser_state',
+            field=models.TextField(blank=True, verbose_name='Сессия браузера (шифр)'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0011_usercredentials_browser_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TelegramUpdate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('update_id', models.BigIntegerField(unique=True, verbose_name='ID update')),
+                ('payload', models.JSONField(verbose_name='Update (JSON)')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает'), ('processing', 'Обрабатывается'), ('done', 'Обработан'), ('failed', 'Ошибка')], default='pending', max_length=20, verbose_name='Статус')),
+                ('claimed_by', models.CharField(blank=True, max_length=64, verbose_name='Воркер')),
+                ('claimed_at', models.DateTimeField(blank=True, null=True, verbose_name='Взят в работу')),
+                ('attempts', models.IntegerField(default=0, verbose_name='Попыток')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='Обработан')),
+            ],
+            options={
+                'verbose_name': 'Update Telegram',
+                'verbose_name_plural': 'Updates Telegram',
+                'indexes': [models.Index(fields=['status', 'update_id'], name='tracker_tel_status_e76950_idx')],
+            },
+        ),
+    ]
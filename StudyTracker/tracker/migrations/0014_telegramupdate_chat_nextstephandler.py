@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0013_usercredentials_refresh_started_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NextStepHandler',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chat_id', models.BigIntegerField(unique=True, verbose_name='Чат')),
+                ('handlers', models.BinaryField(verbose_name='Обработчики (pickle)')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Следующий шаг диалога',
+                'verbose_name_plural': 'Следующие шаги диалогов',
+            },
+        ),
+        migrations.AddField(
+            model_name='telegramupdate',
+            name='chat_id',
+            field=models.BigIntegerField(blank=True, db_index=True, null=True, verbose_name='Чат'),
+        ),
+    ]
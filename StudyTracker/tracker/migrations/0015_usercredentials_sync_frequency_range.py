@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:47
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0014_telegramupdate_chat_nextstephandler'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='usercredentials',
+            name='sync_frequency',
+            field=models.IntegerField(default=24, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(168)], verbose_name='Частота синхронизации (часов)'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0015_usercredentials_sync_frequency_range'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApiRateBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True, verbose_name='Ключ (хост)')),
+                ('tokens', models.FloatField(verbose_name='Токенов')),
+                ('updated', models.FloatField(verbose_name='Обновлено (unix time)')),
+            ],
+            options={
+                'verbose_name': 'Лимит запросов к API',
+                'verbose_name_plural': 'Лимиты запросов к API',
+            },
+        ),
+    ]
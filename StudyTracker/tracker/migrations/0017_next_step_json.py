@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0016_apiratebucket'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='nextstephandler',
+            name='handlers',
+        ),
+        migrations.AddField(
+            model_name='nextstephandler',
+            name='steps',
+            field=models.JSONField(default=list, verbose_name='Шаги (имя и аргументы)'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0017_next_step_json'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usercredentials',
+            name='next_refresh_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Следующая попытка фонового входа'),
+        ),
+    ]
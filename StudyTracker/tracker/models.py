@@ -1,17 +1,12 @@
 from django.db import models
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.utils import timezone
 import base64
-from cryptography.fernet import Fernet
+import json
 from django.conf import settings
-import os
-
-# Генерируем ключ шифрования
-def get_encryption_key():
-    key = getattr(settings, 'ENCRYPTION_KEY', None)
-    if not key:
-        key = Fernet.generate_key()
-        os.environ['ENCRYPTION_KEY'] = key.decode()
-    return key
+from datetime import timedelta
+from . import keyring
+from .auth.jwt_claims import decode_claims, claim_datetime
 
 class TelegramUser(models.Model):
     telegram_id = models.BigIntegerField(unique=True)
@@ -89,15 +84,30 @@ class UserCredentials(models.Model):
     # Шифрованные данные
     encrypted_login = models.TextField("Логин (шифр)", blank=True)
     encrypted_password = models.TextField("Пароль (шифр)", blank=True)
+    encrypted_browser_state = models.TextField("Сессия браузера (шифр)", blank=True)
     
     # Токен и его срок
     auth_token = models.TextField("Токен авторизации", blank=True)
-    token_expires = models.DateTimeField("Истекает", null=True, blank=True)
+    token_expires = models.DateTimeField("Истекает", null=True, blank=True, db_index=True)
+    token_issued_at = models.DateTimeField("Токен выдан", null=True, blank=True)
+    token_lifetime = models.IntegerField("Время жизни токена (сек)", null=True, blank=True)
+    refresh_started_at = models.DateTimeField("Вход начат", null=True, blank=True)
     
     # Статус
     is_active = models.BooleanField("Активен", default=True)
     last_login = models.DateTimeField("Последний вход", null=True, blank=True)
     login_attempts = models.IntegerField("Попыток входа", default=0)
+    next_refresh_at = models.DateTimeField("Следующая попытка фонового входа", null=True, blank=True)
+    
+    # Синхронизация расписания
+    auto_sync = models.BooleanField("Автосинхронизация", default=True)
+    sync_frequency = models.IntegerField(
+        "Частота синхронизации (часов)", default=24,
+        validators=[MinValueValidator(1), MaxValueValidator(168)]
+    )
+    last_sync_at = models.DateTimeField("Последняя синхронизация", null=True, blank=True)
+    last_sync_success = models.BooleanField("Последняя синхр. успешна", default=False)
+    last_sync_error = models.TextField("Последняя ошибка", blank=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -110,23 +120,24 @@ class UserCredentials(models.Model):
         return f"Данные для {self.user}"
     
     def encrypt_data(self, data):
-        """Зашифровать данные"""
-        if not data:
-            return ""
-        fernet = Fernet(get_encryption_key())
-        encrypted = fernet.encrypt(data.encode())
-        return encrypted.decode()
+        """Зашифровать данные (открытое значение запоминаем в экземпляре)"""
+        encrypted = keyring.encrypt(data)
+        if encrypted:
+            self._decrypted_cache()[encrypted] = data
+        return encrypted
     
     def decrypt_data(self, encrypted_data):
-        """Расшифровать данные"""
+        """Расшифровать данные (один раз на шифротекст для экземпляра)"""
         if not encrypted_data:
             return ""
-        try:
-            fernet = Fernet(get_encryption_key())
-            decrypted = fernet.decrypt(encrypted_data.encode())
-            return decrypted.decode()
-        except:
-            return ""
+        cache = self._decrypted_cache()
+        if encrypted_data not in cache:
+            cache[encrypted_data] = keyring.decrypt(encrypted_data)
+        return cache[encrypted_data]
+    
+    def _decrypted_cache(self):
+        """Расшифрованные значения экземпляра по шифротексту"""
+        return self.__dict__.setdefault('_decrypted', {})
     
     @property
     def login(self):
@@ -148,10 +159,65 @@ class UserCredentials(models.Model):
         """Установить пароль (зашифрованный)"""
         self.encrypted_password = self.encrypt_data(value)
     
+    @property
+    def browser_state(self):
+        """Сохранённый storage_state Playwright (cookies + localStorage) или None"""
+        raw = self.decrypt_data(self.encrypted_browser_state)
+        if not raw:
+            return None
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+    
+    @browser_state.setter
+    def browser_state(self, value):
+        """Сохранить storage_state Playwright (зашифрованным)"""
+        self.encrypted_browser_state = self.encrypt_data(json.dumps(value)) if value else ""
+    
     def has_credentials(self):
         """Есть ли данные для входа?"""
         return bool(self.encrypted_login and self.encrypted_password)
     
+    def set_token(self, token, now=None):
+        """
+        Запомнить новый токен и его настоящий срок
+
+        Срок берётся из claim exp JWT, даже если он уже в прошлом.
+        Время жизни запоминается только когда есть и exp, и iat. Без exp
+        срок считается по прошлому наблюдаемому времени жизни токенов
+        этого аккаунта (или TOKEN_DEFAULT_LIFETIME).
+        """
+        now = now or timezone.now()
+        claims = decode_claims(token)
+        expires = claim_datetime(claims, 'exp')
+        issued = claim_datetime(claims, 'iat')
+
+        if expires and issued and expires > issued:
+            self.token_lifetime = int((expires - issued).total_seconds())
+        if not expires:
+            lifetime = self.token_lifetime or getattr(settings, 'TOKEN_DEFAULT_LIFETIME', 4 * 3600)
+            expires = now + timedelta(seconds=lifetime)
+        issued = issued or now
+
+        self.auth_token = token
+        self.token_issued_at = issued
+        self.token_expires = expires
+    
+    def record_failed_login(self, now=None):
+        """
+        Учесть неудачный вход
+
+        Фоновое обновление (refresh_tokens) повторяет вход с экспоненциальной
+        паузой: TOKEN_REFRESH_BACKOFF, удваиваясь до TOKEN_REFRESH_BACKOFF_MAX.
+        """
+        now = now or timezone.now()
+        self.login_attempts += 1
+        base = getattr(settings, 'TOKEN_REFRESH_BACKOFF', 300)
+        ceiling = getattr(settings, 'TOKEN_REFRESH_BACKOFF_MAX', 6 * 3600)
+        delay = min(base * 2 ** min(self.login_attempts - 1, 16), ceiling)
+        self.next_refresh_at = now + timedelta(seconds=delay)
+
     def is_token_valid(self):
         """Действителен ли токен?"""
         return bool(
@@ -243,4 +309,112 @@ class ParsedLesson(models.Model):
         from datetime import datetime
         start = datetime.combine(self.date, self.started_at)
         end = datetime.combine(self.date, self.finished_at)
-        return (end - start).seconds // 60
\ No newline at end of file
+        return (end - start).seconds // 60
+
+class ScheduleSyncState(models.Model):
+    """Состояние синхронизации расписания пользователя за месяц"""
+    user = models.ForeignKey(TelegramUser, on_delete=models.CASCADE, related_name='sync_states')
+    month = models.DateField("Месяц")  # первое число месяца
+    synced_at = models.DateTimeField("Последняя успешная синхронизация")
+    payload_hash = models.CharField("Отпечаток ответа API", max_length=64, blank=True)
+    
+    class Meta:
+        verbose_name = "Синхронизация месяца"
+        verbose_name_plural = "Синхронизации месяцев"
+        unique_together = ['user', 'month']
+    
+    def __str__(self):
+        return f"{self.user}: {self.month:%Y-%m}"
+    
+    @staticmethod
+    def month_start(date):
+        """Первое число месяца"""
+        return date.replace(day=1)
+    
+    @classmethod
+    def mark_synced(cls, user, month_date, payload_hash=None):
+        """Отметить успешную синхронизацию месяца"""
+        defaults = {'synced_at': timezone.now()}
+        if payload_hash is not None:
+            defaults['payload_hash'] = payload_hash
+        
+        cls.objects.update_or_create(
+            user=user,
+            month=cls.month_start(month_date),
+            defaults=defaults
+        )
+    
+    @classmethod
+    def is_fresh(cls, user, month_date, max_age):
+        """Синхронизирован ли месяц не раньше, чем max_age назад?"""
+        return cls.objects.filter(
+            user=user,
+            month=cls.month_start(month_date),
+            synced_at__gte=timezone.now() - max_age
+        ).exists()
+
+
+class TelegramUpdate(models.Model):
+    """Входящий update Telegram (очередь для воркеров webhook-режима)"""
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    
+    update_id = models.BigIntegerField("ID update", unique=True)
+    chat_id = models.BigIntegerField("Чат", null=True, blank=True, db_index=True)
+    payload = models.JSONField("Update (JSON)")
+    status = models.CharField(
+        "Статус",
+        max_length=20,
+        choices=[
+            (STATUS_PENDING, 'Ожидает'), (STATUS_PROCESSING, 'Обрабатывается'),
+            (STATUS_DONE, 'Обработан'), (STATUS_FAILED, 'Ошибка'),
+        ],
+        default=STATUS_PENDING
+    )
+    claimed_by = models.CharField("Воркер", max_length=64, blank=True)
+    claimed_at = models.DateTimeField("Взят в работу", null=True, blank=True)
+    attempts = models.IntegerField("Попыток", default=0)
+    error = models.TextField("Ошибка", blank=True)
+    
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField("Обработан", null=True, blank=True)
+    
+    class Meta:
+        verbose_name = "Update Telegram"
+        verbose_name_plural = "Updates Telegram"
+        indexes = [
+            models.Index(fields=['status', 'update_id']),
+        ]
+    
+    def __str__(self):
+        return f"Update {self.update_id} ({self.status})"
+
+
+class NextStepHandler(models.Model):
+    """Ожидаемый следующий шаг диалога (register_next_step_handler), общий для процессов бота"""
+    chat_id = models.BigIntegerField("Чат", unique=True)
+    steps = models.JSONField("Шаги (имя и аргументы)", default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Следующий шаг диалога"
+        verbose_name_plural = "Следующие шаги диалогов"
+    
+    def __str__(self):
+        return f"Шаг диалога в чате {self.chat_id}"
+
+
+class ApiRateBucket(models.Model):
+    """Состояние общего для всех процессов ограничителя запросов к API (token bucket)"""
+    key = models.CharField("Ключ (хост)", max_length=255, unique=True)
+    tokens = models.FloatField("Токенов")
+    updated = models.FloatField("Обновлено (unix time)")
+    
+    class Meta:
+        verbose_name = "Лимит запросов к API"
+        verbose_name_plural = "Лимиты запросов к API"
+    
+    def __str__(self):
+        return f"{self.key}: {self.tokens:.1f}"
@@ -0,0 +1,85 @@
+# tracker/next_step.py
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from telebot import Handler
+from telebot.handler_backends import HandlerBackend
+from .models import NextStepHandler
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseHandlerBackend(HandlerBackend):
+    """
+    Хранилище register_next_step_handler в БД
+
+    Стандартный MemoryHandlerBackend держит шаги диалога в памяти процесса,
+    и при нескольких воркерах process_updates ответ на «Введите пароль»
+    может попасть в процесс, который о шаге не знает. В БД хранится имя
+    шага и его аргументы в JSON (не pickle): шаг должен быть объявлен
+    декоратором step, а аргументы — простые значения без секретов.
+    Брошенные диалоги старше NEXT_STEP_TTL не выполняются и удаляются.
+    """
+
+    def __init__(self, ttl=None):
+        super().__init__()
+        self.steps = {}  # имя -> функция шага
+        self.ttl = ttl or getattr(settings, 'NEXT_STEP_TTL', 900)
+
+    def step(self, func):
+        """Декоратор: разрешить функцию как шаг диалога"""
+        self.steps[func.__name__] = func
+        return func
+
+    def _cutoff(self):
+        return timezone.now() - timedelta(seconds=self.ttl)
+
+    def purge_expired(self):
+        """Удалить брошенные диалоги"""
+        deleted, _ = NextStepHandler.objects.filter(updated_at__lt=self._cutoff()).delete()
+        return deleted
+
+    def register_handler(self, handler_group_id, handler):
+        callback = handler['callback']
+        if self.steps.get(callback.__name__) is not callback:
+            raise ValueError(f"Шаг {callback.__name__} не объявлен через @step")
+        step = {
+            'callback': callback.__name__,
+            'args': list(handler['args']),
+            'kwargs': dict(handler['kwargs']),
+        }
+
+        self.purge_expired()
+        with transaction.atomic():
+            row = NextStepHandler.objects.select_for_update().filter(chat_id=handler_group_id).first()
+            steps = row.steps if row else []
+            steps.append(step)
+            NextStepHandler.objects.update_or_create(
+                chat_id=handler_group_id,
+                defaults={'steps': steps},
+            )
+
+    def clear_handlers(self, handler_group_id):
+        NextStepHandler.objects.filter(chat_id=handler_group_id).delete()
+
+    def get_handlers(self, handler_group_id):
+        # Шаг выполняется один раз: забираем и удаляем
+        with transaction.atomic():
+            row = NextStepHandler.objects.select_for_update().filter(chat_id=handler_group_id).first()
+            if row is None:
+                return None
+            row.delete()
+
+        if row.updated_at < self._cutoff():
+            return None
+
+        handlers = []
+        for step in row.steps:
+            callback = self.steps.get(step['callback'])
+            if callback is None:
+                logger.warning(f"⚠️ Неизвестный шаг диалога {step['callback']} (чат {handler_group_id})")
+                continue
+            handlers.append(Handler(callback, *step['args'], **step['kwargs']))
+        return handlers or None
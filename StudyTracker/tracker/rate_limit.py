@@ -0,0 +1,187 @@
+# tracker/rate_limit.py
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, OperationalError
+from django.db.models import F, Value
+from django.db.models.functions import Least
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Ограничитель частоты запросов (token bucket), общий для потоков процесса"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)  # токенов в секунду
+        self.capacity = float(capacity or rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout=None):
+        """
+        Дождаться токена
+
+        Returns:
+            bool: False, если не дождались за timeout секунд
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+class DatabaseTokenBucket:
+    """
+    Token bucket, общий для всех процессов (состояние — строка ApiRateBucket)
+
+    Бот, планировщик и воркеры process_updates — разные процессы; с
+    TokenBucket в памяти каждый тратил бы свой лимит, и суммарная частота
+    к API была бы кратна настройке. Токен забирается одним условным
+    UPDATE (пополнение + списание), поэтому транзакции и блокировки строк
+    не нужны. На SQLite это работает, но писатели сериализуются блокировкой
+    файла, и под нагрузкой UPDATE получает «database is locked»: по-настоящему
+    общий лимит для многих процессов требует серверной БД (PostgreSQL/MySQL).
+    OperationalError повторяется несколько раз с короткой паузой; если БД
+    так и недоступна, ограничиваем запросы локальным TokenBucket процесса.
+    """
+
+    DB_RETRIES = 3
+    DB_RETRY_DELAY = 0.05
+
+    def __init__(self, key, rate, capacity=None):
+        self.key = key
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self._local = TokenBucket(rate, capacity)
+        self._fallback = False  # сейчас работаем по лимиту процесса
+
+    def _take_with_retry(self):
+        """_try_take с короткими повторами при блокировке БД"""
+        for attempt in range(self.DB_RETRIES):
+            try:
+                return self._try_take()
+            except OperationalError:
+                if attempt == self.DB_RETRIES - 1:
+                    raise
+                time.sleep(self.DB_RETRY_DELAY * (attempt + 1))
+
+    def _level(self, now):
+        """Выражение: токены после пополнения на момент now"""
+        return Least(
+            Value(self.capacity),
+            F('tokens') + (Value(now) - F('updated')) * Value(self.rate),
+        )
+
+    def _try_take(self):
+        """
+        Забрать токен
+
+        Returns:
+            float: 0, если токен получен, иначе сколько секунд ждать
+        """
+        from .models import ApiRateBucket
+
+        now = time.time()
+        taken = ApiRateBucket.objects.filter(key=self.key).alias(level=self._level(now)).filter(
+            level__gte=1
+        ).update(tokens=self._level(now) - 1, updated=now)
+        if taken:
+            return 0
+
+        bucket = ApiRateBucket.objects.filter(key=self.key).values('tokens', 'updated').first()
+        if bucket is None:
+            try:
+                ApiRateBucket.objects.create(key=self.key, tokens=self.capacity - 1, updated=now)
+                return 0
+            except IntegrityError:
+                return 0.01  # строку создал другой процесс — пробуем снова
+
+        level = min(self.capacity, bucket['tokens'] + (now - bucket['updated']) * self.rate)
+        return max(0.01, (1 - level) / self.rate)
+
+    def acquire(self, timeout=None):
+        """
+        Дождаться токена
+
+        Returns:
+            bool: False, если не дождались за timeout секунд
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            try:
+                wait = self._take_with_retry()
+            except DatabaseError as e:
+                # Пишем в лог один раз на период недоступности, а не на каждый запрос
+                if not self._fallback:
+                    self._fallback = True
+                    logger.warning(f"⚠️ Общий лимит запросов недоступен ({e}), используем лимит процесса")
+                return self._local.acquire(timeout)
+
+            if self._fallback:
+                self._fallback = False
+                logger.info("✅ Общий лимит запросов снова доступен")
+
+            if not wait:
+                return True
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def _make_bucket(host, rate, capacity=None):
+    if getattr(settings, 'API_RATE_SHARED', True):
+        return DatabaseTokenBucket(host, rate, capacity)
+    return TokenBucket(rate, capacity)
+
+
+def get_host_bucket(host):
+    """
+    Ограничитель для хоста (настройки: API_RATE_LIMIT, API_RATE_BURST)
+
+    При API_RATE_SHARED лимит общий для всех процессов (через БД),
+    иначе — отдельный у каждого процесса.
+    """
+    with _buckets_lock:
+        if host not in _buckets:
+            _buckets[host] = _make_bucket(
+                host,
+                rate=getattr(settings, 'API_RATE_LIMIT', 5),
+                capacity=getattr(settings, 'API_RATE_BURST', 10),
+            )
+        return _buckets[host]
+
+
+def configure_host_bucket(host, rate, capacity=None):
+    """Задать лимит для хоста явно (например, из параметров команды)"""
+    with _buckets_lock:
+        _buckets[host] = _make_bucket(host, rate, capacity)
+        return _buckets[host]
@@ -0,0 +1,178 @@
+# tracker/router.py
+import difflib
+import logging
+import threading
+import time
+from collections import deque
+from django.conf import settings
+from .utils import percentile
+
+logger = logging.getLogger(__name__)
+
+
+# Общая таблица маршрутов обоих ботов (run_bot.py и tracker/bot.py):
+# действие -> команды, надписи кнопок и фразы. Каждый бот привязывает
+# к действиям свои обработчики; непривязанные действия он не видит.
+ROUTES = {
+    'start': ['/start', '/старт'],
+    'help': ['/help', '/помощь', 'помощь', 'команды', '❓ Помощь'],
+    'about': ['/about', '/обо'],
+    'login': ['/login', '/войти'],
+    'logout': ['/logout', '/выйти'],
+    'status': ['/status', '/статус', 'статус', 'мой статус'],
+    'sync': ['/sync', '/обновить'],
+    'today': ['/today', '/сегодня', 'сегодня', 'расписание', 'пары сегодня', '📅 Сегодня'],
+    'tomorrow': ['/tomorrow', '/завтра', 'завтра', 'расписание на завтра', '⏭️ Завтра'],
+    'week': ['/schedule_week', 'неделя', '📆 Неделя'],
+    'next': ['/next', '/следующий', 'следующий урок', 'следующая пара', '⏰ Следующий урок'],
+    'schedule_today': ['/schedule_today'],
+    'schedule_tomorrow': ['/schedule_tomorrow'],
+    'next_lesson': ['/next_lesson'],
+    'schedule_help': ['/schedule_help'],
+    'schedule_menu': ['/schedule_menu'],
+    'set_token': ['/set_token', '🔑 Установить токен'],
+    'homework': ['📚 Задания', 'задания'],
+    'add_lesson': ['➕ Добавить пару'],
+    'add_homework': ['➕ Добавить домашку'],
+    'settings': ['⚙️ Настройки'],
+}
+
+
+def normalize(text):
+    """
+    Ключ таблицы маршрутов для текста сообщения
+
+    Команда — первое слово без @имя_бота ('/Sync@bot 3' -> '/sync'),
+    остальной текст — в нижнем регистре с одиночными пробелами.
+    """
+    text = ' '.join((text or '').split()).lower()
+    if text.startswith('/'):
+        return text.split(' ', 1)[0].split('@', 1)[0]
+    return text
+
+
+class CommandRouter:
+    """
+    Маршрутизация текстовых сообщений одним поиском в словаре
+
+    Вместо цепочки фильтров telebot (каждый update проверяется каждым
+    func=lambda) у бота один обработчик: текст нормализуется и ищется
+    в скомпилированной таблице псевдонимов. Если точного совпадения нет,
+    фраза сравнивается с псевдонимами нечётко (difflib), иначе вызывается fallback.
+    """
+
+    def __init__(self, routes=None, fuzzy_cutoff=None):
+        self.routes = routes or ROUTES
+        self.fuzzy_cutoff = fuzzy_cutoff or getattr(settings, 'ROUTER_FUZZY_CUTOFF', 0.8)
+        self.handlers = {}  # действие -> обработчик
+        self.fallback_handler = None
+        self._table = None  # псевдоним -> действие (только привязанные)
+        self._phrases = []  # псевдонимы без '/' для нечёткого поиска
+        self._fuzzy_cache = {}
+        self._lock = threading.Lock()
+
+        # Метрики (последние 1000 значений)
+        self.route_times = deque(maxlen=1000)
+        self.exact = 0
+        self.fuzzy = 0
+        self.unmatched = 0
+
+    def action(self, name):
+        """Декоратор: привязать обработчик к действию из таблицы"""
+        if name not in self.routes:
+            raise KeyError(f"Неизвестное действие: {name}")
+
+        def decorator(handler):
+            with self._lock:
+                self.handlers[name] = handler
+                self._table = None
+            return handler
+        return decorator
+
+    def fallback(self, handler):
+        """Декоратор: обработчик нераспознанных сообщений"""
+        self.fallback_handler = handler
+        return handler
+
+    def _compile(self):
+        with self._lock:
+            if self._table is None:
+                table = {}
+                for name, aliases in self.routes.items():
+                    if name in self.handlers:
+                        for alias in aliases:
+                            table[normalize(alias)] = name
+                self._phrases = [alias for alias in table if not alias.startswith('/')]
+                self._fuzzy_cache = {}
+                self._table = table
+            return self._table
+
+    def resolve(self, text):
+        """
+        Найти действие для текста
+
+        Returns:
+            tuple: (действие или None, совпадение нечёткое?)
+        """
+        table = self._table or self._compile()
+        key = normalize(text)
+
+        name = table.get(key)
+        if name is not None or key.startswith('/') or not key:
+            return name, False
+
+        # Длинные сообщения — не опечатка в кнопке, не тратим на них difflib
+        if len(key) > 40:
+            return None, False
+
+        with self._lock:
+            cached = self._fuzzy_cache.get(key, False)
+        if cached is not False:
+            return cached, cached is not None
+
+        matches = difflib.get_close_matches(key, self._phrases, n=1, cutoff=self.fuzzy_cutoff)
+        name = table.get(matches[0]) if matches else None
+
+        with self._lock:
+            if len(self._fuzzy_cache) > 1000:
+                self._fuzzy_cache.clear()
+            self._fuzzy_cache[key] = name
+        return name, name is not None
+
+    def dispatch(self, message):
+        """Вызвать обработчик действия для сообщения"""
+        started = time.perf_counter()
+        name, fuzzy = self.resolve(message.text)
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self.route_times.append(elapsed)
+            if name is None:
+                self.unmatched += 1
+            elif fuzzy:
+                self.fuzzy += 1
+            else:
+                self.exact += 1
+
+        logger.debug(f"Маршрут {message.text[:40]!r} -> {name} ({elapsed * 1e6:.0f} мкс)")
+
+        handler = self.handlers.get(name) if name else self.fallback_handler
+        if handler:
+            handler(message)
+
+    def install(self, bot):
+        """Зарегистрировать роутер единственным обработчиком текста бота"""
+        bot.message_handler(func=lambda message: True)(self.dispatch)
+        return self
+
+    def stats(self):
+        """Метрики: совпадения и время маршрутизации"""
+        with self._lock:
+            times = list(self.route_times)
+            return {
+                'exact': self.exact,
+                'fuzzy': self.fuzzy,
+                'unmatched': self.unmatched,
+                'route_p50': percentile(times, 50),
+                'route_p95': percentile(times, 95),
+            }
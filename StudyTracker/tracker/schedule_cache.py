@@ -0,0 +1,127 @@
+# tracker/schedule_cache.py
+import logging
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduleCache:
+    """
+    Кэш расписания по (пользователь, месяц) в памяти процесса
+
+    Свежие данные (моложе ttl) отдаются сразу. Устаревшие, но не старше
+    ttl + stale_ttl, тоже отдаются сразу, а обновление идёт в фоне.
+    На промахе одновременные запросы одного ключа ждут один общий запрос к API.
+    """
+
+    LOCK_STRIPES = 64
+
+    def __init__(self, ttl=None, stale_ttl=None, max_size=None):
+        self.ttl = ttl or getattr(settings, 'SCHEDULE_CACHE_TTL', 300)
+        self.stale_ttl = stale_ttl or getattr(settings, 'SCHEDULE_CACHE_STALE_TTL', 1800)
+        self.max_size = max_size or getattr(settings, 'SCHEDULE_CACHE_SIZE', 1000)
+        self._entries = OrderedDict()  # key -> (fetched_at, data)
+        # Фиксированный набор lock'ов по хэшу ключа: словарь lock'ов на каждый
+        # (пользователь, месяц) рос бы без предела в долго живущем боте
+        self._key_locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(user_id, month_date):
+        return user_id, month_date.strftime('%Y-%m')
+
+    def _store(self, key, data):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _fetch(self, key, fetch):
+        """Запросить данные и положить в кэш (None не кэшируем)"""
+        data = fetch()
+        if data is not None:
+            self._store(key, data)
+        return data
+
+    def _refresh_in_background(self, key, fetch, key_lock):
+        def run():
+            try:
+                with key_lock:
+                    self._fetch(key, fetch)
+            except Exception as e:
+                logger.error(f"Фоновое обновление расписания {key}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def get(self, user_id, month_date, fetch):
+        """
+        Получить расписание месяца
+
+        Args:
+            user_id: Ключ пользователя
+            month_date (datetime.date): Любая дата месяца
+            fetch (callable): Загрузка данных с API, возвращает list или None
+
+        Returns:
+            list: Уроки месяца или None при ошибке
+        """
+        key = self.make_key(user_id, month_date)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            key_lock = self._key_locks[hash(key) % self.LOCK_STRIPES]
+
+            if entry:
+                age = time.monotonic() - entry[0]
+                if age < self.ttl:
+                    self.hits += 1
+                    return entry[1]
+                if age < self.ttl + self.stale_ttl:
+                    self.stale_hits += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        self._refresh_in_background(key, fetch, key_lock)
+                    return entry[1]
+
+            self.misses += 1
+
+        # Промах: только один поток идёт в API, остальные ждут его результат
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry and time.monotonic() - entry[0] < self.ttl:
+                return entry[1]
+            return self._fetch(key, fetch)
+
+    def invalidate(self, user_id, month_date=None):
+        """Сбросить кэш пользователя (за месяц или целиком)"""
+        with self._lock:
+            if month_date is not None:
+                self._entries.pop(self.make_key(user_id, month_date), None)
+                return
+            for key in [key for key in self._entries if key[0] == user_id]:
+                del self._entries[key]
+
+    def stats(self):
+        """Статистика кэша"""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+            }
+
+
+schedule_cache = ScheduleCache()
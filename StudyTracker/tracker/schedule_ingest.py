@@ -0,0 +1,259 @@
+# tracker/schedule_ingest.py
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import ParsedLesson, ScheduleSyncState
+from .dimension_cache import teacher_cache, subject_cache, room_cache, invalidate_dimension_caches
+from .signals import schedule_changed
+
+logger = logging.getLogger(__name__)
+
+# Поля урока, которые перезаписываются при повторной синхронизации
+LESSON_UPDATE_FIELDS = [
+    'started_at', 'finished_at', 'teacher', 'room', 'is_remote', 'is_cancelled', 'last_sync', 'updated_at',
+]
+
+# Поля, по которым сравниваем урок из API с записью в БД
+LESSON_DIFF_FIELDS = ['started_at', 'finished_at', 'teacher_id', 'room_id', 'is_remote', 'is_cancelled']
+
+
+def parse_lesson(lesson_data):
+    """Разобрать урок из JSON API в словарь с python-типами"""
+    return {
+        'date': datetime.strptime(lesson_data['date'], '%Y-%m-%d').date(),
+        'lesson_number': lesson_data['lesson'],
+        'started_at': datetime.strptime(lesson_data['started_at'], '%H:%M').time(),
+        'finished_at': datetime.strptime(lesson_data['finished_at'], '%H:%M').time(),
+        'teacher_name': lesson_data['teacher_name'],
+        'subject_name': lesson_data['subject_name'],
+        'room_name': lesson_data['room_name'],
+        'is_remote': 'дистант' in lesson_data['room_name'].lower(),
+    }
+
+
+def merge_payloads(payloads):
+    """Склеить ответы API за несколько месяцев, убрав повторы уроков"""
+    merged = {}
+    for payload in payloads:
+        for lesson_data in payload or []:
+            key = (lesson_data.get('date'), lesson_data.get('lesson'), lesson_data.get('subject_name'))
+            merged[key] = lesson_data
+    return list(merged.values())
+
+
+def fingerprint(payload):
+    """Канонический хэш ответа API за месяц (не зависит от порядка уроков)"""
+    lines = sorted(json.dumps(lesson, sort_keys=True, ensure_ascii=False) for lesson in payload)
+    return hashlib.sha256('\n'.join(lines).encode()).hexdigest()
+
+
+def _month_filter(months):
+    """Q-фильтр уроков по списку месяцев"""
+    condition = Q()
+    for month in months:
+        next_month = (month + timedelta(days=32)).replace(day=1)
+        condition |= Q(date__gte=month, date__lt=next_month)
+    return condition
+
+
+def save_lessons_bulk(user, schedule_data, months=None, empty_is_authoritative=False):
+    """
+    Сохранить уроки пачкой (см. _save_lessons_bulk)
+
+    Если запись справочника удалили в другом процессе, кэш имён этого
+    процесса ещё хранит её id и upsert падает на внешнем ключе —
+    тогда сбрасываем кэши и повторяем один раз.
+    """
+    try:
+        return _save_lessons_bulk(user, schedule_data, months, empty_is_authoritative)
+    except IntegrityError as e:
+        logger.warning(f"Устаревший кэш справочников ({e}), повторяем сохранение")
+        invalidate_dimension_caches()
+        return _save_lessons_bulk(user, schedule_data, months, empty_is_authoritative)
+
+
+def _save_lessons_bulk(user, schedule_data, months=None, empty_is_authoritative=False):
+    """
+    Сохранить уроки пачкой: справочники через кэш имён, в БД пишем только разницу
+
+    Уроки из API сравниваются с записями в БД; новые и изменённые
+    записываются одним upsert по (user, date, lesson_number, subject),
+    неизменённые не трогаются. Уроки месяцев months, пропавшие из API,
+    помечаются отменёнными одним UPDATE; вернувшиеся — снова активны.
+    Месяц с ошибками разбора и месяц без единого урока в ответе
+    не отменяются: пропажа урока там может быть ошибкой, а не отменой.
+    Если что-то изменилось, после коммита отправляется schedule_changed.
+
+    Args:
+        user (TelegramUser): Владелец расписания
+        schedule_data (list): Список уроков из API
+        months (list): Месяцы, которые schedule_data покрывает целиком.
+            Если заданы, уроки этих месяцев, пропавшие из API, отменяются.
+        empty_is_authoritative (bool): Пустой месяц в ответе — действительно
+            без занятий (тогда все его уроки отменяются)
+
+    Returns:
+        dict: created, updated, unchanged, cancelled (id уроков), errors
+    """
+    lessons = {}
+    errors = []
+    cancel_months = set(months or [])
+
+    # 1. Разбираем JSON, повторы одного урока схлопываем (побеждает последний)
+    for lesson_data in schedule_data:
+        try:
+            lesson = parse_lesson(lesson_data)
+        except Exception as e:
+            errors.append(f"Ошибка при обработке урока {lesson_data.get('date')}: {str(e)}")
+            # Урок не разобран — его месяц не отменяем (месяц неизвестен — никакой)
+            try:
+                failed_date = datetime.strptime(lesson_data['date'], '%Y-%m-%d').date()
+                cancel_months.discard(ScheduleSyncState.month_start(failed_date))
+            except Exception:
+                cancel_months.clear()
+            continue
+
+        lessons[(lesson['date'], lesson['lesson_number'], lesson['subject_name'])] = lesson
+
+    if not empty_is_authoritative:
+        cancel_months &= {ScheduleSyncState.month_start(l['date']) for l in lessons.values()}
+
+    result = {'created': 0, 'updated': 0, 'unchanged': 0, 'cancelled': [], 'errors': errors}
+    if not lessons and not months:
+        return result
+
+    now = timezone.now()
+
+    with transaction.atomic():
+        # 2. Справочники (в БД только за новыми именами)
+        teachers = teacher_cache.resolve(l['teacher_name'] for l in lessons.values())
+        subjects = subject_cache.resolve(l['subject_name'] for l in lessons.values())
+        rooms = room_cache.resolve(l['room_name'] for l in lessons.values())
+
+        # 3. Что уже лежит в БД
+        if months:
+            scope = _month_filter(months)
+        else:
+            scope = Q(date__in={l['date'] for l in lessons.values()})
+
+        existing = {
+            (row['date'], row['lesson_number'], row['subject_id']): row
+            for row in ParsedLesson.objects.filter(scope, user=user).values(
+                'id', 'date', 'lesson_number', 'subject_id', *LESSON_DIFF_FIELDS
+            )
+        }
+
+        # 4. Разница: новые и изменённые уроки
+        objects = []
+        created, updated = [], []
+        seen = set()
+        for lesson in lessons.values():
+            key = (lesson['date'], lesson['lesson_number'], subjects[lesson['subject_name']])
+            seen.add(key)
+
+            values = {
+                'started_at': lesson['started_at'],
+                'finished_at': lesson['finished_at'],
+                'teacher_id': teachers[lesson['teacher_name']],
+                'room_id': rooms[lesson['room_name']],
+                'is_remote': lesson['is_remote'],
+                'is_cancelled': False,
+            }
+
+            row = existing.get(key)
+            if row is None:
+                created.append(lesson)
+            elif any(row[field] != values[field] for field in LESSON_DIFF_FIELDS):
+                updated.append(lesson)
+            else:
+                result['unchanged'] += 1
+                continue
+
+            objects.append(ParsedLesson(
+                user=user,
+                date=lesson['date'],
+                lesson_number=lesson['lesson_number'],
+                subject_id=key[2],
+                last_sync=now,
+                **values
+            ))
+
+        # 5. Пропавшие из API уроки (уже отменённые повторно не трогаем)
+        result['cancelled'] = [
+            row['id'] for key, row in existing.items()
+            if key not in seen and not row['is_cancelled']
+            and ScheduleSyncState.month_start(row['date']) in cancel_months
+        ]
+
+        # 6. Один upsert на изменившиеся уроки и один UPDATE на отменённые
+        if objects:
+            ParsedLesson.objects.bulk_create(
+                objects,
+                update_conflicts=True,
+                unique_fields=['user', 'date', 'lesson_number', 'subject'],
+                update_fields=LESSON_UPDATE_FIELDS,
+            )
+
+        if result['cancelled']:
+            ParsedLesson.objects.filter(pk__in=result['cancelled']).update(
+                is_cancelled=True, last_sync=now, updated_at=now
+            )
+
+        result['created'] = len(created)
+        result['updated'] = len(updated)
+
+        if created or updated or result['cancelled']:
+            event = {
+                'user': user,
+                'months': list(months or []),
+                'created': created,
+                'updated': updated,
+                'cancelled': result['cancelled'],
+            }
+            transaction.on_commit(lambda: schedule_changed.send(sender=ParsedLesson, **event))
+
+    return result
+
+
+def sync_months(user, results):
+    """
+    Сохранить расписание по месяцам, пропуская месяцы без изменений
+
+    Для каждого месяца считается отпечаток ответа API. Если он совпал
+    с сохранённым, месяц в БД не пишется вовсе (обновляется только время
+    синхронизации); остальные месяцы записываются одной пачкой по разнице.
+
+    Args:
+        user (TelegramUser): Владелец расписания
+        results (dict): {первое число месяца: уроки из API или None}
+
+    Returns:
+        dict: created, updated, unchanged, cancelled, skipped_months, errors
+    """
+    fetched = {month: payload for month, payload in results.items() if payload is not None}
+    stored_hashes = dict(
+        ScheduleSyncState.objects.filter(user=user, month__in=list(fetched))
+        .values_list('month', 'payload_hash')
+    )
+
+    hashes = {month: fingerprint(payload) for month, payload in fetched.items()}
+    changed = [month for month in fetched if stored_hashes.get(month) != hashes[month]]
+    skipped = [month for month in fetched if month not in changed]
+
+    result = save_lessons_bulk(
+        user,
+        merge_payloads(fetched[month] for month in changed),
+        months=changed,
+    ) if changed else {'created': 0, 'updated': 0, 'unchanged': 0, 'cancelled': [], 'errors': []}
+
+    for month in fetched:
+        # С ошибками разбора отпечаток не запоминаем — месяц перечитаем в следующий раз
+        keep_hash = month in skipped or not result['errors']
+        ScheduleSyncState.mark_synced(user, month, payload_hash=hashes[month] if keep_hash else '')
+
+    result['skipped_months'] = [month.strftime('%Y-%m') for month in skipped]
+    return result
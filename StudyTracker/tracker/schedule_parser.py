@@ -1,54 +1,47 @@
-import requests
 import json
 from datetime import datetime, timedelta
 import logging
+from .api_client import get_client
 
 logger = logging.getLogger(__name__)
 
 class ScheduleParserBot:
     """Парсер расписания"""
     
-    def __init__(self, auth_token):
+    def __init__(self, auth_token, user_id=None, token_manager=None):
         self.auth_token = auth_token
-        self.base_url = "https://magni.top-academy.ru/api/v2/schedule/operations/get-month"
-        self.session = requests.Session()
+        self.user_id = user_id
+        self.token_manager = token_manager  # UserTokenManager: обновить токен при 401
     
-    def fetch_schedule(self, month_date=None):
-        """Получить расписание с API"""
+    def fetch_schedule(self, month_date=None, use_cache=True):
+        """Получить расписание (через общий кэш, если известен пользователь)"""
         if not self.auth_token:
             return None
         
         if month_date is None:
             month_date = datetime.now().date()
         
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Accept': 'application/json, text/plain, */*',
-            'Accept-Language': 'ru,en;q=0.9',
-            'Authorization': f'Bearer {self.auth_token}',
-            'Origin': 'https://journal.tipp-academy.ru',
-            'Referer': 'https://journal.tipp-academy.ru/',
-        }
-        
-        params = {'date_filter': month_date.strftime('%Y-%m-%d')}
-        
-        try:
-            response = self.session.get(
-                self.base_url,
-                params=params,
-                headers=headers,
-                timeout=10
+        if use_cache and self.user_id is not None:
+            from .schedule_cache import schedule_cache
+            return schedule_cache.get(
+                self.user_id, month_date, lambda: self._fetch_from_api(month_date)
             )
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.error(f"API ошибка {response.status_code}")
-                return None
-                
-        except Exception as e:
-            logger.error(f"Ошибка: {e}")
-            return None
+        
+        return self._fetch_from_api(month_date)
+    
+    def _refresh_token(self):
+        """Получить новый токен через менеджер (при 401 от API)"""
+        token, error = self.token_manager.get_token(force_refresh=True)
+        if token:
+            self.auth_token = token
+        else:
+            logger.error(f"Не удалось обновить токен: {error}")
+        return token
+    
+    def _fetch_from_api(self, month_date):
+        """Получить расписание с API (с повтором после обновления токена)"""
+        refresh = self._refresh_token if self.token_manager else None
+        return get_client().fetch_month(self.auth_token, month_date, refresh_token=refresh)
     
     def format_schedule_for_today(self, schedule_data):
         """Форматировать расписание на сегодня"""
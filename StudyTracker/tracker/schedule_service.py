@@ -1,104 +1,94 @@
 # tracker/schedule_service.py
 import requests
 import json
+import time
 from datetime import datetime, timedelta
 from django.utils import timezone
-from .models import TelegramUser, ParsedLesson, ParsedTeacher, ParsedSubject, ParsedRoom, UserCredentials
+from django.conf import settings
+from .models import TelegramUser, ParsedLesson, ParsedTeacher, ParsedSubject, ParsedRoom, UserCredentials, ScheduleSyncState
+from .schedule_ingest import save_lessons_bulk, sync_months
+from .api_client import ApiError, get_client, months_to_fetch, fetch_concurrently, single_refresh
 
 class ScheduleService:
     """Сервис для работы с расписанием в Django"""
     
     def __init__(self, user):
         self.user = user
+        self.fetch_times = []  # длительность запросов к API, секунд
+        self.last_error_class = None
     
-    def fetch_schedule_from_api(self, auth_token, month_date=None):
-        """Получить расписание с API Top Academy"""
+    def fetch_schedule_from_api(self, auth_token, month_date=None, refresh_token=None):
+        """Получить расписание с API Top Academy (повторы и обновление токена при 401)"""
         if not auth_token:
             return None
         
         if month_date is None:
             month_date = timezone.now().date()
         
-        url = "https://magni.top-academy.ru/api/v2/schedule/operations/get-month"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Accept': 'application/json, text/plain, */*',
-            'Accept-Language': 'ru,en;q=0.9',
-            'Authorization': f'Bearer {auth_token}',
-            'Origin': 'https://journal.tipp-academy.ru',
-            'Referer': 'https://journal.tipp-academy.ru/',
-        }
+        started = time.monotonic()
+        try:
+            return get_client().fetch_month_retrying(auth_token, month_date, refresh_token)
         
-        params = {'date_filter': month_date.strftime('%Y-%m-%d')}
+        except ApiError as e:
+            print(f"API Error: {e}")
+            self.last_error_class = f"HTTP {e.status_code}" if e.status_code else type(e).__name__
+            return None
         
-        try:
-            response = requests.get(url, params=params, headers=headers, timeout=10)
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                print(f"API Error {response.status_code}")
-                return None
-                
         except Exception as e:
             print(f"Request failed: {e}")
+            self.last_error_class = type(e).__name__
             return None
+        
+        finally:
+            self.fetch_times.append(time.monotonic() - started)
+    
+    def fetch_schedule_range(self, auth_token, months, refresh_token=None):
+        """Получить несколько месяцев параллельно: {месяц: уроки или None}"""
+        return fetch_concurrently(
+            lambda month: self.fetch_schedule_from_api(auth_token, month, refresh_token), months
+        )
+    
+    def _token_refresher(self):
+        """Обновление токена при 401 — одно на всю синхронизацию"""
+        from tracker.token_manager import UserTokenManager
+        
+        def refresh():
+            token, error = UserTokenManager(self.user).get_token(force_refresh=True)
+            if not token:
+                print(f"Token refresh failed: {error}")
+            return token
+        
+        return single_refresh(refresh)
+    
+    def save_months_to_db(self, results):
+        """Сохранить месяцы {месяц: уроки}, записывая только изменения"""
+        sync_result = sync_months(self.user, results)
+        
+        for error in sync_result['errors']:
+            print(f"Ошибка обработки урока: {error}")
+        
+        return {
+            'success': True,
+            'created': sync_result['created'],
+            'updated': sync_result['updated'],
+            'unchanged': sync_result['unchanged'],
+            'cancelled': len(sync_result['cancelled']),
+            'skipped_months': sync_result['skipped_months'],
+            'total': sum(len(data) for data in results.values() if data),
+        }
     
     def save_schedule_to_db(self, schedule_data):
         """Сохранить расписание в базу данных"""
         if not schedule_data:
             return {'success': False, 'error': 'Нет данных'}
         
-        created_count = 0
-        updated_count = 0
-        
-        for lesson_data in schedule_data:
-            try:
-                # Получаем или создаем связанные объекты
-                teacher, _ = ParsedTeacher.objects.get_or_create(
-                    name=lesson_data['teacher_name']
-                )
-                
-                subject, _ = ParsedSubject.objects.get_or_create(
-                    name=lesson_data['subject_name']
-                )
-                
-                room, _ = ParsedRoom.objects.get_or_create(
-                    name=lesson_data['room_name']
-                )
-                
-                # Парсим даты
-                lesson_date = datetime.strptime(lesson_data['date'], '%Y-%m-%d').date()
-                started_at = datetime.strptime(lesson_data['started_at'], '%H:%M').time()
-                finished_at = datetime.strptime(lesson_data['finished_at'], '%H:%M').time()
-                
-                # Определяем дистант
-                is_remote = 'дистант' in lesson_data['room_name'].lower()
-                
-                # Создаем или обновляем урок
-                lesson, created = ParsedLesson.objects.update_or_create(
-                    user=self.user,
-                    date=lesson_date,
-                    lesson_number=lesson_data['lesson'],
-                    subject=subject,
-                    defaults={
-                        'started_at': started_at,
-                        'finished_at': finished_at,
-                        'teacher': teacher,
-                        'room': room,
-                        'is_remote': is_remote,
-                        'last_sync': timezone.now(),
-                    }
-                )
-                
-                if created:
-                    created_count += 1
-                else:
-                    updated_count += 1
-                    
-            except Exception as e:
-                print(f"Ошибка обработки урока: {e}")
-                continue
+        # Пакетная запись: справочники и уроки — несколько запросов на весь месяц
+        result = save_lessons_bulk(self.user, schedule_data)
+        created_count = result['created']
+        updated_count = result['updated']
+        
+        for error in result['errors']:
+            print(f"Ошибка обработки урока: {error}")
         
         return {
             'success': True,
@@ -107,39 +97,62 @@ class ScheduleService:
             'total': len(schedule_data)
         }
     
-    def sync_schedule(self, force=False):
-        """Синхронизировать расписание для пользователя"""
+    def sync_schedule(self, force=False, start_date=None, end_date=None):
+        """
+        Синхронизировать расписание для пользователя
+        
+        Без периода синхронизируется текущий месяц (и следующий после 20-го).
+        """
+        result = self._sync(force, start_date, end_date)
+        result['fetch_times'] = self.fetch_times
+        self._record_sync_status(result)
+        return result
+    
+    def _record_sync_status(self, result):
+        """Сохранить итог синхронизации (для планировщика и /status)"""
+        UserCredentials.objects.filter(user=self.user).update(
+            last_sync_at=timezone.now(),
+            last_sync_success=result['success'],
+            last_sync_error=result.get('error', ''),
+        )
+    
+    def _sync(self, force, start_date=None, end_date=None):
+        """Получить расписание с API и сохранить в БД"""
         try:
             # Получаем токен пользователя
             credentials = UserCredentials.objects.get(user=self.user)
+            refresh_token = self._token_refresher() if credentials.has_credentials() else None
+            auth_token = credentials.auth_token
+            
+            # force: истёкший токен обновляем заранее, не дожидаясь 401
+            if refresh_token and (not auth_token or (force and not credentials.is_token_valid())):
+                auth_token = refresh_token()
             
-            if not credentials.auth_token:
-                return {'success': False, 'error': 'Токен не найден'}
+            if not auth_token:
+                return {'success': False, 'error': 'Токен не найден', 'error_class': 'NoToken'}
             
-            # Получаем расписание с API
-            schedule_data = self.fetch_schedule_from_api(credentials.auth_token)
+            # Получаем расписание с API (все нужные месяцы параллельно);
+            # на 401 токен обновится один раз и запрос повторится
+            months = months_to_fetch(start_date, end_date)
+            results = self.fetch_schedule_range(auth_token, months, refresh_token)
             
-            if not schedule_data:
-                # Если токен устарел, пытаемся обновить
-                if force:
-                    from tracker.token_manager import UserTokenManager
-                    manager = UserTokenManager(self.user)
-                    new_token, error = manager.get_token(force_refresh=True)
-                    
-                    if new_token:
-                        schedule_data = self.fetch_schedule_from_api(new_token)
-                
-                if not schedule_data:
-                    return {'success': False, 'error': 'Не удалось получить расписание'}
+            if not results[months[0]]:
+                return {
+                    'success': False,
+                    'error': 'Не удалось получить расписание',
+                    'error_class': self.last_error_class or 'EmptySchedule',
+                }
             
-            # Сохраняем в базу
-            result = self.save_schedule_to_db(schedule_data)
+            # Сохраняем в базу: неизменённые месяцы пропускаем, остальные — по разнице
+            result = self.save_months_to_db(results)
+            
+            result['months'] = [month.strftime('%Y-%m') for month in months]
             return result
             
         except UserCredentials.DoesNotExist:
-            return {'success': False, 'error': 'Пользователь не настроил доступ'}
+            return {'success': False, 'error': 'Пользователь не настроил доступ', 'error_class': 'NoCredentials'}
         except Exception as e:
-            return {'success': False, 'error': str(e)}
+            return {'success': False, 'error': str(e), 'error_class': type(e).__name__}
     
     def get_user_schedule(self, start_date=None, end_date=None):
         """Получить расписание пользователя из БД"""
@@ -159,4 +172,43 @@ class ScheduleService:
     def get_today_schedule(self):
         """Получить расписание на сегодня"""
         today = timezone.now().date()
-        return self.get_user_schedule(today, today)
\ No newline at end of file
+        return self.get_user_schedule(today, today)
+    
+    def is_month_fresh(self, month_date=None):
+        """Синхронизирован ли месяц в пределах окна свежести?"""
+        if month_date is None:
+            month_date = timezone.now().date()
+        
+        max_age = timedelta(seconds=getattr(settings, 'SCHEDULE_DB_FRESHNESS', 3600))
+        return ScheduleSyncState.is_fresh(self.user, month_date, max_age)
+    
+    def has_synced_months(self, months):
+        """Синхронизировался ли хоть один из месяцев (есть ли что отдать из БД)"""
+        return ScheduleSyncState.objects.filter(
+            user=self.user, month__in=[ScheduleSyncState.month_start(month) for month in months]
+        ).exists()
+    
+    def store_month(self, schedule_data, month_date=None):
+        """Сохранить расписание месяца, полученное с API, и отметить синхронизацию"""
+        if month_date is None:
+            month_date = timezone.now().date()
+        
+        return self.save_months_to_db({ScheduleSyncState.month_start(month_date): schedule_data})
+    
+    @staticmethod
+    def lesson_to_api_format(lesson):
+        """Урок из БД в формате JSON API (для форматтеров бота)"""
+        return {
+            'date': lesson.date.strftime('%Y-%m-%d'),
+            'lesson': lesson.lesson_number,
+            'started_at': lesson.started_at.strftime('%H:%M'),
+            'finished_at': lesson.finished_at.strftime('%H:%M'),
+            'subject_name': lesson.subject.name,
+            'teacher_name': lesson.teacher.name,
+            'room_name': lesson.room.name,
+        }
+    
+    def get_schedule_data(self, start_date=None, end_date=None):
+        """Расписание из БД в формате JSON API"""
+        lessons = self.get_user_schedule(start_date, end_date).order_by('date', 'lesson_number')
+        return [self.lesson_to_api_format(lesson) for lesson in lessons]
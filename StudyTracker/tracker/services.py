@@ -1,41 +1,25 @@
-import requests
 import json
 from datetime import datetime, timedelta
 from django.utils import timezone
-from .models import TelegramUser, ParsedLesson, ParsedTeacher, ParsedSubject, ParsedRoom, UserAuthToken
+from .models import TelegramUser, ParsedLesson, ParsedTeacher, ParsedSubject, ParsedRoom, UserCredentials
 from collections import defaultdict
+from .schedule_ingest import save_lessons_bulk, merge_payloads
+from .api_client import get_client, months_to_fetch, fetch_concurrently
 
 class ScheduleParser:
     """Парсер расписания Top Academy"""
     
     def __init__(self, user):
         self.user = user
-        self.base_url = "https://magni.top-academy.ru/api/v2/schedule/operations/get-month"
-        self.session = requests.Session()
     
     def _get_auth_token(self):
         """Получить токен авторизации для пользователя"""
         try:
-            token_obj = UserAuthToken.objects.get(user=self.user)
-            return token_obj.auth_token
-        except UserAuthToken.DoesNotExist:
+            credentials = UserCredentials.objects.get(user=self.user)
+            return credentials.auth_token
+        except UserCredentials.DoesNotExist:
             return None
     
-    def _get_headers(self):
-        """Получить заголовки для запроса"""
-        token = self._get_auth_token()
-        if not token:
-            raise ValueError("Токен авторизации не найден. Добавьте токен в настройках.")
-        
-        return {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Accept': 'application/json, text/plain, */*',
-            'Accept-Language': 'ru,en;q=0.9',
-            'Authorization': f'Bearer {token}',
-            'Origin': 'https://journal.tipp-academy.ru',
-            'Referer': 'https://journal.tipp-academy.ru/',
-        }
-    
     def fetch_schedule(self, month_date=None):
         """
         Получить расписание с API Top Academy
@@ -49,26 +33,36 @@ class ScheduleParser:
         if month_date is None:
             month_date = timezone.now().date()
         
-        params = {'date_filter': month_date.strftime('%Y-%m-%d')}
+        token = self._get_auth_token()
+        if not token:
+            raise ValueError("Токен авторизации не найден. Добавьте токен в настройках.")
         
-        try:
-            response = self.session.get(
-                self.base_url,
-                params=params,
-                headers=self._get_headers(),
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                # Логируем ошибку
-                print(f"API Error {response.status_code}: {response.text[:200]}")
-                return None
-                
-        except requests.RequestException as e:
-            print(f"Request failed: {e}")
+        return get_client().fetch_month(token, month_date)
+    
+    def fetch_schedule_range(self, start_date=None, end_date=None):
+        """
+        Получить расписание за период одним списком
+        
+        Нужные месяцы запрашиваются параллельно, повторы уроков убираются.
+        Без периода — текущий месяц (и следующий после 20-го числа).
+        
+        Returns:
+            list: Список уроков или None, если не удалось получить ни одного месяца
+        """
+        token = self._get_auth_token()
+        if not token:
+            raise ValueError("Токен авторизации не найден. Добавьте токен в настройках.")
+        
+        client = get_client()
+        results = fetch_concurrently(
+            lambda month: client.fetch_month(token, month),
+            months_to_fetch(start_date, end_date)
+        )
+        
+        if all(data is None for data in results.values()):
             return None
+        
+        return merge_payloads(results.values())
     
     def parse_and_save_schedule(self, schedule_data):
         """
@@ -83,65 +77,18 @@ class ScheduleParser:
         if not schedule_data:
             return {'success': False, 'error': 'Нет данных для обработки'}
         
-        created_count = 0
-        updated_count = 0
-        errors = []
-        
-        for lesson_data in schedule_data:
-            try:
-                # 1. Получаем или создаем связанные объекты
-                teacher, _ = ParsedTeacher.objects.get_or_create(
-                    name=lesson_data['teacher_name']
-                )
-                
-                subject, _ = ParsedSubject.objects.get_or_create(
-                    name=lesson_data['subject_name']
-                )
-                
-                room, _ = ParsedRoom.objects.get_or_create(
-                    name=lesson_data['room_name']
-                )
-                
-                # 2. Парсим даты и время
-                lesson_date = datetime.strptime(lesson_data['date'], '%Y-%m-%d').date()
-                started_at = datetime.strptime(lesson_data['started_at'], '%H:%M').time()
-                finished_at = datetime.strptime(lesson_data['finished_at'], '%H:%M').time()
-                
-                # 3. Определяем, дистант ли урок
-                is_remote = 'дистант' in lesson_data['room_name'].lower()
-                
-                # 4. Создаем или обновляем урок
-                lesson, created = ParsedLesson.objects.update_or_create(
-                    user=self.user,
-                    date=lesson_date,
-                    lesson_number=lesson_data['lesson'],
-                    subject=subject,
-                    defaults={
-                        'started_at': started_at,
-                        'finished_at': finished_at,
-                        'teacher': teacher,
-                        'room': room,
-                        'is_remote': is_remote,
-                        'last_sync': timezone.now(),
-                    }
-                )
-                
-                if created:
-                    created_count += 1
-                else:
-                    updated_count += 1
-                    
-            except Exception as e:
-                errors.append(f"Ошибка при обработке урока {lesson_data.get('date')}: {str(e)}")
+        # Пакетная запись: справочники и уроки — несколько запросов на весь месяц
+        result = save_lessons_bulk(self.user, schedule_data)
+        created_count = result['created']
+        updated_count = result['updated']
+        errors = result['errors']
         
         # Обновляем статус токена
-        try:
-            token_obj = UserAuthToken.objects.get(user=self.user)
-            token_obj.last_sync_success = len(errors) == 0
-            token_obj.last_sync_error = '; '.join(errors) if errors else ''
-            token_obj.save()
-        except:
-            pass
+        UserCredentials.objects.filter(user=self.user).update(
+            last_sync_at=timezone.now(),
+            last_sync_success=len(errors) == 0,
+            last_sync_error='; '.join(errors) if errors else '',
+        )
         
         return {
             'success': True,
@@ -212,10 +159,10 @@ class ScheduleParser:
         
         return tomorrow_lessons
     
-    def sync_schedule(self):
+    def sync_schedule(self, start_date=None, end_date=None):
         """Полная синхронизация расписания"""
         # Получаем данные с API
-        schedule_data = self.fetch_schedule()
+        schedule_data = self.fetch_schedule_range(start_date, end_date)
         
         if schedule_data:
             # Сохраняем в БД
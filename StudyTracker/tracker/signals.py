@@ -0,0 +1,20 @@
+# tracker/signals.py
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal, receiver
+from .models import ParsedTeacher, ParsedSubject, ParsedRoom
+from .dimension_cache import CACHES_BY_MODEL
+
+# Расписание пользователя изменилось после синхронизации (отправляется после коммита).
+# Аргументы: user, months, created и updated (разобранные уроки), cancelled (id уроков)
+schedule_changed = Signal()
+
+
+@receiver(post_save, sender=ParsedTeacher)
+@receiver(post_save, sender=ParsedSubject)
+@receiver(post_save, sender=ParsedRoom)
+@receiver(post_delete, sender=ParsedTeacher)
+@receiver(post_delete, sender=ParsedSubject)
+@receiver(post_delete, sender=ParsedRoom)
+def invalidate_dimension_cache(sender, instance, **kwargs):
+    """Сбросить кэш справочника при изменении записи (например, из админки)"""
+    CACHES_BY_MODEL[sender].invalidate(instance.pk)
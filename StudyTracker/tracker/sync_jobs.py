@@ -0,0 +1,25 @@
+# tracker/sync_jobs.py
+from django.db import close_old_connections
+from .schedule_service import ScheduleService
+from .token_manager import UserTokenManager
+
+
+def sync_user(user):
+    """Синхронизировать одного пользователя в рабочем потоке (ошибки не выходят наружу)"""
+    try:
+        return ScheduleService(user).sync_schedule(force=True)
+    except Exception as e:
+        return {'success': False, 'error': str(e), 'error_class': type(e).__name__}
+    finally:
+        close_old_connections()
+
+
+def refresh_user_token(user):
+    """Заранее обновить токен пользователя в рабочем потоке"""
+    try:
+        token, error = UserTokenManager(user).get_token(force_refresh=True)
+        return {'success': bool(token), 'error': error}
+    except Exception as e:
+        return {'success': False, 'error': str(e)}
+    finally:
+        close_old_connections()
@@ -1,3 +1,580 @@
-from django.test import TestCase
+import base64
+import json
+import threading
+from datetime import date, timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+from cryptography.fernet import Fernet
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from telebot import Handler
+from . import keyring
+from .api_client import AuthError, TopAcademyClient, TransientError
+from .auth.strategies import AuthStrategyChain, HttpStrategy, PlaywrightStrategy
+from .auth.webdriver_waits import login_settled
+from .chat_dispatcher import ChatDispatcher
+from .forms import TokenForm
+from .management.commands.refresh_tokens import Command as RefreshTokensCommand
+from .dimension_cache import invalidate_dimension_caches, teacher_cache
+from .models import (
+    NextStepHandler, ParsedLesson, ParsedTeacher, TelegramUpdate, TelegramUser, UserCredentials,
+)
+from .next_step import DatabaseHandlerBackend
+from .rate_limit import DatabaseTokenBucket
+from .router import CommandRouter
+from .schedule_ingest import save_lessons_bulk, sync_months
+from .token_manager import ManagerCache, UserTokenManager
+from .update_queue import claim_updates, enqueue_update, finish_update, heartbeat, release_stale
 
-# Create your tests here.
+
+TEST_KEY = Fernet.generate_key().decode()
+
+
+@override_settings(ENCRYPTION_KEY=TEST_KEY, ENCRYPTION_KEYS=[])
+class TokenManagerTests(TestCase):
+
+    def setUp(self):
+        keyring.reset_keyring()
+        self.addCleanup(keyring.reset_keyring)
+        self.user = TelegramUser.objects.create(telegram_id=1, username='student')
+        self.manager = UserTokenManager(self.user)
+        self.manager.set_credentials('login', 'password')
+
+    def test_playwright_login_saves_browser_state(self):
+        state = {'cookies': [{'name': 'session', 'value': 'abc'}], 'origins': []}
+        auth = mock.Mock(session_reused=False, storage_state=state)
+        auth.get_auth_token.return_value = ('token', None)
+        chain = AuthStrategyChain(names=['playwright'])
+
+        with mock.patch.object(PlaywrightStrategy, 'build', return_value=auth), \
+                mock.patch('tracker.token_manager.get_auth_chain', return_value=chain):
+            token, error = self.manager.get_token(force_refresh=True)
+
+        self.assertEqual(token, 'token')
+        credentials = UserCredentials.objects.get(user=self.user)
+        self.assertEqual(credentials.auth_token, 'token')
+        self.assertEqual(credentials.browser_state, state)
+
+    def test_login_runs_under_lease(self):
+        seen = {}
+
+        def login():
+            seen['lease'] = UserCredentials.objects.get(user=self.user).refresh_started_at
+            # Второй процесс не может взять аренду, пока идёт вход
+            other = UserTokenManager(self.user)
+            with mock.patch('tracker.token_manager.time') as fake_time, \
+                    mock.patch('tracker.token_manager._user_lock', return_value=mock.MagicMock()):
+                fake_time.monotonic.side_effect = [0, 0, 1000]
+                seen['other'] = other.get_token(force_refresh=True)
+            return None, 'Неверный пароль'
+
+        with mock.patch.object(UserTokenManager, '_login', side_effect=login):
+            token, error = self.manager.get_token(force_refresh=True)
+
+        self.assertIsNone(token)
+        self.assertEqual(error, 'Неверный пароль')
+        self.assertIsNotNone(seen['lease'])
+        self.assertIsNone(seen['other'][0])
+        credentials = UserCredentials.objects.get(user=self.user)
+        self.assertIsNone(credentials.refresh_started_at)
+        self.assertEqual(credentials.login_attempts, 1)
+
+
+@override_settings(ENCRYPTION_KEY=TEST_KEY, ENCRYPTION_KEYS=[],
+                   TOKEN_REFRESH_BACKOFF=60, TOKEN_REFRESH_MAX_ATTEMPTS=3)
+class RefreshTokensTests(TestCase):
+
+    def setUp(self):
+        keyring.reset_keyring()
+        self.addCleanup(keyring.reset_keyring)
+        self.user = TelegramUser.objects.create(telegram_id=1, username='student')
+        self.manager = UserTokenManager(self.user)
+        self.manager.set_credentials('login', 'password')
+        UserCredentials.objects.filter(user=self.user).update(token_expires=timezone.now())
+
+        self.command = RefreshTokensCommand()
+        self.command.lead = timedelta(minutes=30)
+        self.command.max_attempts = 3
+        self.command.in_flight = set()
+        self.command.lock = threading.Lock()
+
+    def fail_login(self):
+        with mock.patch.object(UserTokenManager, '_login', return_value=(None, 'Неверный пароль')):
+            self.manager.get_token(force_refresh=True)
+        return UserCredentials.objects.get(user=self.user)
+
+    def test_failed_logins_back_off_and_stop(self):
+        self.assertEqual(len(self.command.due_credentials()), 1)
+
+        first = self.fail_login()
+        second = self.fail_login()
+        self.assertEqual(self.command.due_credentials(), [])
+        self.assertGreater(second.next_refresh_at - timezone.now(), timedelta(seconds=110))
+        self.assertLess(first.next_refresh_at - timezone.now(), timedelta(seconds=61))
+
+        UserCredentials.objects.filter(user=self.user).update(next_refresh_at=None, login_attempts=3)
+        self.assertEqual(self.command.due_credentials(), [])
+
+        # Новый /login снимает ограничение
+        self.manager.set_credentials('login', 'new-password')
+        self.assertEqual(len(self.command.due_credentials()), 1)
+
+
+def jwt(**claims):
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).decode().rstrip('=')
+    return f'header.{payload}.signature'
+
+
+class SetTokenTests(TestCase):
+
+    def setUp(self):
+        self.credentials = UserCredentials(token_lifetime=3600)
+        self.now = timezone.now().replace(microsecond=0)
+
+    def test_expired_exp_is_kept(self):
+        expired = self.now - timedelta(hours=1)
+        self.credentials.set_token(jwt(exp=int(expired.timestamp())), now=self.now)
+
+        self.assertEqual(self.credentials.token_expires, expired)
+        self.assertEqual(self.credentials.token_lifetime, 3600)
+
+    def test_lifetime_needs_exp_and_iat(self):
+        issued = self.now - timedelta(minutes=10)
+        expires = issued + timedelta(hours=2)
+        self.credentials.set_token(
+            jwt(exp=int(expires.timestamp()), iat=int(issued.timestamp())), now=self.now,
+        )
+
+        self.assertEqual(self.credentials.token_expires, expires)
+        self.assertEqual(self.credentials.token_lifetime, 7200)
+
+    def test_without_exp_uses_known_lifetime(self):
+        self.credentials.set_token('opaque-token', now=self.now)
+        self.assertEqual(self.credentials.token_expires, self.now + timedelta(hours=1))
+
+
+class ManagerCacheTests(TestCase):
+
+    def setUp(self):
+        self.user = TelegramUser.objects.create(telegram_id=1, username='student')
+        self.cache = ManagerCache(max_size=1, ttl=60)
+
+    def test_cached_manager_reloads_row_changed_elsewhere(self):
+        manager = self.cache.get(self.user)
+        self.assertIs(self.cache.get(self.user), manager)
+        self.assertEqual(self.cache.stats()['reloads'], 0)
+
+        # Другой процесс обновил токен
+        UserCredentials.objects.filter(user=self.user).update(
+            auth_token='new-token', updated_at=timezone.now() + timedelta(seconds=1),
+        )
+        self.assertIs(self.cache.get(self.user), manager)
+        self.assertEqual(manager.credentials.auth_token, 'new-token')
+        self.assertEqual(self.cache.stats()['reloads'], 1)
+
+    def test_least_recently_used_manager_is_evicted(self):
+        manager = self.cache.get(self.user)
+        other = TelegramUser.objects.create(telegram_id=2, username='other')
+        self.cache.get(other)
+
+        self.assertIsNot(self.cache.get(self.user), manager)
+        self.assertEqual(self.cache.stats()['size'], 1)
+
+
+def message_update(update_id, chat_id):
+    return {'update_id': update_id, 'message': {'message_id': update_id, 'chat': {'id': chat_id}, 'text': 'x'}}
+
+
+class UpdateQueueTests(TestCase):
+
+    def test_chat_has_single_owner(self):
+        for update_id, chat_id in [(1, 10), (2, 20), (3, 10)]:
+            enqueue_update(message_update(update_id, chat_id))
+
+        first = claim_updates(limit=1)
+        self.assertEqual([u.update_id for u in first], [1, 3])
+
+        # Пока чат 10 в обработке, его новые updates никто не забирает
+        enqueue_update(message_update(4, 10))
+        second = claim_updates(limit=10)
+        self.assertEqual([u.update_id for u in second], [2])
+
+        for update in first:
+            finish_update(update)
+        self.assertEqual([u.update_id for u in claim_updates(limit=10)], [4])
+
+    def test_failed_update_is_not_retried(self):
+        enqueue_update(message_update(1, 10))
+        update, = claim_updates()
+        finish_update(update, error=RuntimeError('boom'))
+
+        self.assertEqual(TelegramUpdate.objects.get(update_id=1).status, TelegramUpdate.STATUS_FAILED)
+        self.assertEqual(claim_updates(), [])
+
+    def test_release_stale_keeps_live_claims(self):
+        for update_id, chat_id in [(1, 10), (2, 20)]:
+            enqueue_update(message_update(update_id, chat_id))
+        live, = claim_updates(limit=1)
+        dead, = claim_updates(limit=1)
+        TelegramUpdate.objects.update(claimed_at=timezone.now() - timedelta(minutes=10))
+
+        heartbeat([live.claimed_by])
+        self.assertEqual(release_stale(300), 1)
+        self.assertEqual(TelegramUpdate.objects.get(update_id=live.update_id).status,
+                         TelegramUpdate.STATUS_PROCESSING)
+        self.assertEqual(TelegramUpdate.objects.get(update_id=dead.update_id).status,
+                         TelegramUpdate.STATUS_PENDING)
+
+    @override_settings(TELEGRAM_WEBHOOK_SECRET='secret')
+    def test_webhook_rejects_bad_requests(self):
+        url = reverse('telegram_webhook')
+        response = self.client.post(url, '{}', content_type='application/json',
+                                    HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN='секрет')
+        self.assertEqual(response.status_code, 403)
+
+        malformed = json.dumps({'update_id': 1, 'message': {'text': 'без чата'}})
+        response = self.client.post(url, malformed, content_type='application/json',
+                                    HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN='secret')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(TelegramUpdate.objects.exists())
+
+    def test_next_step_handlers_are_shared(self):
+        backend, other = DatabaseHandlerBackend(), DatabaseHandlerBackend()
+        for instance in (backend, other):
+            instance.step(message_update)
+        backend.register_handler(10, Handler(message_update, 'encrypted'))
+
+        # Другой экземпляр (процесс) видит шаг, и забрать его можно один раз
+        handlers = other.get_handlers(10)
+        self.assertEqual(handlers[0]['callback'], message_update)
+        self.assertEqual(handlers[0]['args'], ('encrypted',))
+        self.assertIsNone(other.get_handlers(10))
+
+    def test_next_step_requires_declared_step(self):
+        with self.assertRaises(ValueError):
+            DatabaseHandlerBackend().register_handler(10, Handler(message_update))
+
+    def test_abandoned_next_step_expires(self):
+        backend = DatabaseHandlerBackend(ttl=60)
+        backend.step(message_update)
+        backend.register_handler(10, Handler(message_update))
+        NextStepHandler.objects.update(updated_at=timezone.now() - timedelta(minutes=5))
+
+        self.assertIsNone(backend.get_handlers(10))
+        backend.register_handler(11, Handler(message_update))
+        self.assertEqual(NextStepHandler.objects.count(), 1)
+
+
+def api_lesson(day, number, subject='Математика'):
+    return {
+        'date': f'2026-10-{day:02d}', 'lesson': number,
+        'started_at': '09:00', 'finished_at': '10:30',
+        'teacher_name': 'Иванов', 'subject_name': subject, 'room_name': '101',
+    }
+
+
+class ScheduleIngestTests(TestCase):
+
+    def setUp(self):
+        invalidate_dimension_caches()
+        self.user = TelegramUser.objects.create(telegram_id=1, username='student')
+        self.month = date(2026, 10, 1)
+        save_lessons_bulk(self.user, [api_lesson(1, 1), api_lesson(2, 1)], months=[self.month])
+
+    def cancelled(self):
+        return ParsedLesson.objects.filter(user=self.user, is_cancelled=True).count()
+
+    def test_missing_lesson_is_cancelled(self):
+        result = save_lessons_bulk(self.user, [api_lesson(1, 1)], months=[self.month])
+        self.assertEqual(len(result['cancelled']), 1)
+        self.assertEqual(self.cancelled(), 1)
+
+    def test_parse_error_does_not_cancel_month(self):
+        broken = dict(api_lesson(2, 1), started_at='9 утра')
+        result = save_lessons_bulk(self.user, [api_lesson(1, 1), broken], months=[self.month])
+        self.assertEqual(len(result['errors']), 1)
+        self.assertEqual(self.cancelled(), 0)
+
+    def test_empty_payload_does_not_cancel_month(self):
+        save_lessons_bulk(self.user, [], months=[self.month])
+        self.assertEqual(self.cancelled(), 0)
+
+        save_lessons_bulk(self.user, [], months=[self.month], empty_is_authoritative=True)
+        self.assertEqual(self.cancelled(), 2)
+
+    def test_unchanged_month_skips_db_write(self):
+        payload = [api_lesson(1, 1), api_lesson(2, 1)]
+        self.assertEqual(sync_months(self.user, {self.month: payload})['skipped_months'], [])
+
+        # Тот же ответ в другом порядке — месяц не пишется
+        with mock.patch('tracker.schedule_ingest.save_lessons_bulk') as save:
+            result = sync_months(self.user, {self.month: list(reversed(payload))})
+        save.assert_not_called()
+        self.assertEqual(result['skipped_months'], ['2026-10'])
+
+        result = sync_months(self.user, {self.month: [api_lesson(1, 1)]})
+        self.assertEqual(len(result['cancelled']), 1)
+
+
+class StaleDimensionCacheTests(TransactionTestCase):
+
+    def setUp(self):
+        invalidate_dimension_caches()
+        self.user = TelegramUser.objects.create(telegram_id=1, username='student')
+
+    def test_lessons_saved_after_teacher_deleted_elsewhere(self):
+        teacher_cache.resolve(['Иванов'])
+        # Удаление в другом процессе: без сигналов, кэш этого процесса не знает
+        ParsedTeacher.objects.filter(name='Иванов')._raw_delete(using='default')
+
+        result = save_lessons_bulk(self.user, [api_lesson(1, 1)], months=[date(2026, 10, 1)])
+
+        self.assertEqual(result['created'], 1)
+        lesson = ParsedLesson.objects.get(user=self.user)
+        self.assertEqual(lesson.teacher.name, 'Иванов')
+
+
+class LoginSettledTests(TestCase):
+
+    def driver(self, *elements):
+        driver = mock.Mock(current_url='https://journal.example/auth/login')
+        driver.find_elements.side_effect = lambda by, selector: (
+            list(elements) if 'help-block-error' in selector else []
+        )
+        return driver
+
+    def test_empty_error_blocks_are_ignored(self):
+        hidden = mock.Mock(text='')
+        hidden.is_displayed.return_value = True
+        self.assertFalse(login_settled()(self.driver(hidden)))
+
+    def test_visible_error_settles_login(self):
+        error = mock.Mock(text='Неверный логин или пароль')
+        error.is_displayed.return_value = True
+        self.assertTrue(login_settled()(self.driver(error)))
+
+
+def api_response(status, data=None):
+    return mock.Mock(status_code=status, text='', json=mock.Mock(return_value=data))
+
+
+@override_settings(API_RETRIES=2, API_BACKOFF_BASE=0.5)
+class ApiClientRetryTests(TestCase):
+
+    def setUp(self):
+        self.api = TopAcademyClient()
+        self.addCleanup(self.api.close)
+        self.month = date(2026, 10, 1)
+
+    def test_rejected_token_is_refreshed_once(self):
+        refresh = mock.Mock(return_value='new-token')
+        responses = [api_response(401), api_response(200, [{'lesson': 1}])]
+
+        with mock.patch.object(self.api, 'get_month', side_effect=responses) as get_month:
+            lessons = self.api.fetch_month_retrying('old-token', self.month, refresh)
+
+        self.assertEqual(lessons, [{'lesson': 1}])
+        refresh.assert_called_once_with()
+        self.assertEqual(get_month.call_args_list[1][0][0], 'new-token')
+
+        # Новый токен тоже отклонён — второй раз не обновляем
+        with mock.patch.object(self.api, 'get_month', return_value=api_response(403)):
+            with self.assertRaises(AuthError):
+                self.api.fetch_month_retrying('old-token', self.month, refresh)
+        self.assertEqual(refresh.call_count, 2)
+
+    def test_transient_errors_retry_with_jitter(self):
+        responses = [api_response(503), api_response(429), api_response(200, [])]
+
+        with mock.patch.object(self.api, 'get_month', side_effect=responses), \
+                mock.patch('tracker.api_client.random.uniform', return_value=0.1) as uniform, \
+                mock.patch('tracker.api_client.time.sleep') as sleep:
+            self.assertEqual(self.api.fetch_month_retrying('token', self.month), [])
+
+        # Full jitter: пауза случайна в [0, base * 2^attempt]
+        self.assertEqual(uniform.call_args_list, [mock.call(0, 0.5), mock.call(0, 1.0)])
+        self.assertEqual(sleep.call_args_list, [mock.call(0.1), mock.call(0.1)])
+
+        with mock.patch.object(self.api, 'get_month', return_value=api_response(502)), \
+                mock.patch('tracker.api_client.time.sleep') as sleep:
+            with self.assertRaises(TransientError):
+                self.api.fetch_month_retrying('token', self.month)
+        self.assertEqual(sleep.call_count, 2)
+
+
+def chat_update(update_id, chat_id):
+    return SimpleNamespace(update_id=update_id, message=SimpleNamespace(chat=SimpleNamespace(id=chat_id)))
+
+
+class ChatDispatcherTests(TestCase):
+
+    def test_chat_order_is_kept_while_chats_run_in_parallel(self):
+        release = threading.Event()
+        seen = []
+
+        def handler(updates):
+            update, = updates
+            if update.update_id == 1:
+                # Чат 10 занят, пока не обработан update чата 20
+                self.assertTrue(release.wait(timeout=5))
+            if update.update_id == 2:
+                release.set()
+            seen.append(update.update_id)
+
+        dispatcher = ChatDispatcher(handler, workers=2)
+        self.addCleanup(dispatcher._executor.shutdown)
+        futures = dispatcher.dispatch([chat_update(1, 10), chat_update(2, 20), chat_update(3, 10)])
+        for future in futures:
+            future.result(timeout=5)
+
+        self.assertLess(seen.index(2), seen.index(1))
+        self.assertLess(seen.index(1), seen.index(3))
+        self.assertEqual(dispatcher.stats()['processed'], 3)
+
+
+class CommandRouterTests(TestCase):
+
+    def setUp(self):
+        self.router = CommandRouter(fuzzy_cutoff=0.8)
+        for name in ('today', 'help'):
+            self.router.action(name)(mock.Mock())
+
+    def test_exact_and_fuzzy_matches(self):
+        self.assertEqual(self.router.resolve('/Today@study_bot 2'), ('today', False))
+        self.assertEqual(self.router.resolve('  Пары   сегодня '), ('today', False))
+        self.assertEqual(self.router.resolve('сегодян'), ('today', True))
+        self.assertEqual(self.router.resolve('сегодян'), ('today', True))  # из кэша
+
+    def test_no_fuzzy_for_commands_unbound_or_long_text(self):
+        self.assertEqual(self.router.resolve('/todya'), (None, False))
+        self.assertEqual(self.router.resolve('завтра'), (None, False))  # действие не привязано
+        self.assertEqual(self.router.resolve('сегодня ' * 6), (None, False))
+        self.assertEqual(self.router.resolve('абракадабра'), (None, False))
+
+
+class AuthStrategyChainTests(TestCase):
+
+    def test_rejected_credentials_stop_chain_without_demotion(self):
+        chain = AuthStrategyChain(names=['http', 'playwright'], failure_threshold=1, max_attempts=2)
+        auth = mock.Mock(credentials_rejected=True)
+        auth.get_auth_token.return_value = (None, 'Неверный логин или пароль')
+        credentials = mock.Mock()
+
+        with mock.patch.object(HttpStrategy, 'build', return_value=auth), \
+                mock.patch.object(PlaywrightStrategy, 'build') as playwright:
+            token, error = chain.get_auth_token(credentials)
+
+        self.assertIsNone(token)
+        self.assertIn('Неверный логин или пароль', error)
+        playwright.assert_not_called()
+        stats = chain.stats()['http']
+        self.assertEqual(stats['attempts'], 0)
+        self.assertEqual(stats['cooldown_left'], 0)
+        self.assertEqual(stats['rejected_credentials'], 1)
+
+    def names(self, chain):
+        return [strategy.name for strategy in chain.ordered()]
+
+    def test_failed_strategy_falls_back_and_is_demoted(self):
+        chain = AuthStrategyChain(names=['playwright', 'http'], failure_threshold=2, max_attempts=2)
+        self.assertEqual(self.names(chain), ['http', 'playwright'])  # по priority
+
+        broken = mock.Mock(credentials_rejected=False)
+        broken.get_auth_token.return_value = (None, 'Timeout')
+        working = mock.Mock(session_reused=False, storage_state={})
+        working.get_auth_token.return_value = ('token', None)
+
+        with mock.patch.object(HttpStrategy, 'build', return_value=broken), \
+                mock.patch.object(PlaywrightStrategy, 'build', return_value=working):
+            self.assertEqual(chain.get_auth_token(mock.Mock()), ('token', None))
+            # Доля успехов playwright выше — теперь он первый
+            self.assertEqual(self.names(chain), ['playwright', 'http'])
+
+            chain.record('playwright', False, 1.0, 'Timeout')
+            chain.record('playwright', False, 1.0, 'Timeout')
+        # Две неудачи подряд у playwright — на cooldown, в конец очереди
+        self.assertEqual(self.names(chain), ['http', 'playwright'])
+
+
+class RotateEncryptionKeysTests(TestCase):
+
+    def setUp(self):
+        self.old_key, self.new_key = Fernet.generate_key().decode(), Fernet.generate_key().decode()
+        keyring.reset_keyring()
+        self.addCleanup(keyring.reset_keyring)
+
+        with override_settings(ENCRYPTION_KEY=self.old_key, ENCRYPTION_KEYS=[]):
+            keyring.reset_keyring()
+            self.credentials = UserCredentials.objects.create(
+                user=TelegramUser.objects.create(telegram_id=1, username='student'),
+                encrypted_login=keyring.encrypt('login'),
+                encrypted_password=keyring.encrypt('password'),
+            )
+        self.broken = UserCredentials.objects.create(
+            user=TelegramUser.objects.create(telegram_id=2, username='broken'),
+            encrypted_login=Fernet(Fernet.generate_key()).encrypt(b'login').decode(),
+        )
+
+    def rotate(self, *args):
+        out, err = StringIO(), StringIO()
+        with override_settings(ENCRYPTION_KEY=None, ENCRYPTION_KEYS=[self.new_key, self.old_key]):
+            call_command('rotate_encryption_keys', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_dry_run_writes_nothing(self):
+        out, _ = self.rotate('--dry-run')
+        self.assertIn('Будет перешифровано: 1, ошибок: 1', out)
+        stored = UserCredentials.objects.get(pk=self.credentials.pk)
+        self.assertEqual(stored.encrypted_login, self.credentials.encrypted_login)
+
+    def test_credentials_are_reencrypted_with_primary_key(self):
+        out, err = self.rotate('--batch-size', '1')
+        self.assertIn('Перешифровано: 1, ошибок: 1', out)
+        self.assertIn(f'Запись {self.broken.pk}', err)
+
+        # Старый ключ больше не нужен
+        stored = UserCredentials.objects.get(pk=self.credentials.pk)
+        new = Fernet(self.new_key)
+        self.assertEqual(new.decrypt(stored.encrypted_login.encode()), b'login')
+        self.assertEqual(new.decrypt(stored.encrypted_password.encode()), b'password')
+
+
+class TokenFormTests(TestCase):
+
+    def test_sync_frequency_must_be_positive(self):
+        form = TokenForm(data={'auth_token': '', 'auto_sync': 'on', 'sync_frequency': 0})
+        self.assertFalse(form.is_valid())
+        self.assertIn('sync_frequency', form.errors)
+
+
+class DatabaseTokenBucketTests(TestCase):
+
+    def test_budget_is_shared_between_buckets(self):
+        # Два экземпляра — как два процесса с общей БД
+        first = DatabaseTokenBucket('api.example', rate=0.001, capacity=2)
+        second = DatabaseTokenBucket('api.example', rate=0.001, capacity=2)
+
+        self.assertTrue(first.acquire(timeout=0))
+        self.assertTrue(second.acquire(timeout=0))
+        self.assertFalse(first.acquire(timeout=0))
+        self.assertFalse(second.acquire(timeout=0))
+
+    def test_locked_database_is_retried_then_falls_back(self):
+        bucket = DatabaseTokenBucket('api.example', rate=100, capacity=1)
+        locked = OperationalError('database is locked')
+
+        with mock.patch.object(bucket, '_try_take', side_effect=[locked, 0]), \
+                mock.patch('tracker.rate_limit.time.sleep'):
+            self.assertTrue(bucket.acquire(timeout=0))
+        self.assertFalse(bucket._fallback)
+
+        with mock.patch.object(bucket, '_try_take', side_effect=locked), \
+                mock.patch('tracker.rate_limit.time.sleep'), \
+                mock.patch('tracker.rate_limit.logger') as logger:
+            self.assertTrue(bucket.acquire(timeout=0))
+            bucket.acquire(timeout=0)
+        self.assertEqual(logger.warning.call_count, 1)
@@ -1,11 +1,29 @@
 import logging
+import threading
+import time
+from collections import OrderedDict
 from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
-from .auth.playwright_auth import PlaywrightAuth
+from .auth.strategies import get_auth_chain
 from .models import UserCredentials, TelegramUser
 
 logger = logging.getLogger(__name__)
 
+# Блокировки обновления токена (внутри процесса): фиксированный набор по
+# хэшу пользователя, как в ScheduleCache, — словарь lock'ов на каждого
+# пользователя рос бы без предела в долго живущем боте
+LOCK_STRIPES = 64
+_refresh_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+
+def _user_lock(user_id):
+    """Lock обновления токена пользователя"""
+    return _refresh_locks[hash(user_id) % LOCK_STRIPES]
+
+
 class UserTokenManager:
     """Менеджер токенов для пользователя"""
     
@@ -23,6 +41,26 @@ class UserTokenManager:
             logger.error(f"Ошибка загрузки данных: {e}")
             return False
     
+    def reload_if_changed(self):
+        """
+        Перечитать данные, если строку изменил другой процесс
+        
+        Returns:
+            bool: True, если данные перечитаны
+        """
+        if not self.credentials:
+            return self.load_credentials()
+        
+        updated_at = (
+            UserCredentials.objects.filter(pk=self.credentials.pk)
+            .values_list('updated_at', flat=True).first()
+        )
+        if updated_at == self.credentials.updated_at:
+            return False
+        
+        self.load_credentials()
+        return True
+    
     def set_credentials(self, login, password):
         """Установить логин и пароль"""
         if not self.credentials:
@@ -31,13 +69,25 @@ class UserTokenManager:
         try:
             self.credentials.login = login
             self.credentials.password = password
-            self.credentials.save()
+            # Новые данные — фоновое обновление снова может пробовать вход
+            self.credentials.login_attempts = 0
+            self.credentials.next_refresh_at = None
+            self.credentials.save(update_fields=[
+                'encrypted_login', 'encrypted_password', 'login_attempts', 'next_refresh_at', 'updated_at',
+            ])
             return True, "Данные сохранены"
         except Exception as e:
             return False, f"Ошибка: {e}"
     
     def get_token(self, force_refresh=False):
-        """Получить токен для пользователя"""
+        """
+        Получить токен для пользователя
+        
+        Обновление токена выполняется одним вызовом на пользователя:
+        в процессе — под общим lock, между процессами — по аренде
+        refresh_started_at (условный UPDATE). Вход идёт вне транзакции,
+        остальные вызовы ждут и получают уже обновлённый токен.
+        """
         if not self.credentials or not self.credentials.has_credentials():
             return None, "Данные для входа не установлены. Используйте /login"
         
@@ -45,48 +95,111 @@ class UserTokenManager:
         if not force_refresh and self.credentials.is_token_valid():
             return self.credentials.auth_token, None
         
-        # Нужен новый токен
-        logger.info(f"Получение токена для {self.user.username}")
+        stale_token = self.credentials.auth_token
+        pk = self.credentials.pk
         
         try:
-            # Используем Selenium
-            auth = PlaywrightAuth(
-                login=self.credentials.login,
-                password=self.credentials.password,
-                headless=True
-            )
-            
-            token, error = auth.get_auth_token()
+            with _user_lock(self.user.pk):
+                # 1. Перечитываем строку: токен мог обновить другой вызов
+                self.credentials = UserCredentials.objects.get(pk=pk)
+                if self._refreshed(force_refresh, stale_token):
+                    logger.info(f"Токен для {self.user.username} уже обновлён другим запросом")
+                    return self.credentials.auth_token, None
+                
+                # 2. Берём аренду; если её держит другой процесс — ждём его результат
+                lease = getattr(settings, 'TOKEN_REFRESH_LEASE', 600)
+                started = timezone.now()
+                claimed = UserCredentials.objects.filter(pk=pk).filter(
+                    Q(refresh_started_at__isnull=True)
+                    | Q(refresh_started_at__lt=started - timedelta(seconds=lease))
+                ).update(refresh_started_at=started)
+                
+                if not claimed:
+                    return self._wait_for_refresh(force_refresh, stale_token, lease)
+                
+                try:
+                    # 3. Вход — без транзакции: он может идти минуты
+                    logger.info(f"Получение токена для {self.user.username}")
+                    token, error = self._login()
+                    
+                    # 4. Сохраняем результат в короткой транзакции
+                    self._save_login_result(token)
+                finally:
+                    UserCredentials.objects.filter(
+                        pk=pk, refresh_started_at=started
+                    ).update(refresh_started_at=None)
             
             if token:
-                # Сохраняем токен
-                self.credentials.auth_token = token
-                self.credentials.token_expires = timezone.now() + timedelta(hours=4)
-                self.credentials.last_login = timezone.now()
-                self.credentials.login_attempts = 0
-                self.credentials.save()
-                
                 logger.info(f"✅ Токен получен")
                 return token, None
-            else:
-                self.credentials.login_attempts += 1
-                self.credentials.save()
-                
-                error_msg = error or "Неизвестная ошибка"
-                logger.error(f"❌ Ошибка: {error_msg}")
-                return None, error_msg
+            
+            error_msg = error or "Неизвестная ошибка"
+            logger.error(f"❌ Ошибка: {error_msg}")
+            return None, error_msg
                 
         except Exception as e:
             logger.error(f"Ошибка: {e}")
             return None, str(e)
     
+    def _refreshed(self, force_refresh, stale_token):
+        """Есть ли в self.credentials подходящий токен (новый, если force_refresh)"""
+        return self.credentials.is_token_valid() and (
+            not force_refresh or self.credentials.auth_token != stale_token
+        )
+    
+    def _save_login_result(self, token):
+        """Записать итог входа в свежую копию строки"""
+        with transaction.atomic():
+            fresh = UserCredentials.objects.select_for_update().get(pk=self.credentials.pk)
+            
+            if token:
+                fresh.set_token(token)
+                # Сессию браузера стратегия записала в копию, с которой входили
+                fresh.encrypted_browser_state = self.credentials.encrypted_browser_state
+                fresh.last_login = timezone.now()
+                fresh.login_attempts = 0
+                fresh.next_refresh_at = None
+                fresh.save(update_fields=[
+                    'auth_token', 'token_issued_at', 'token_expires', 'token_lifetime',
+                    'encrypted_browser_state', 'last_login', 'login_attempts', 'next_refresh_at',
+                    'updated_at',
+                ])
+            else:
+                fresh.record_failed_login()
+                fresh.save(update_fields=['login_attempts', 'next_refresh_at', 'updated_at'])
+        
+        self.credentials = fresh
+    
+    def _wait_for_refresh(self, force_refresh, stale_token, timeout):
+        """Дождаться входа, который выполняет другой процесс"""
+        logger.info(f"Вход для {self.user.username} уже выполняется, ждём")
+        deadline = time.monotonic() + timeout
+        
+        while time.monotonic() < deadline:
+            time.sleep(1)
+            self.credentials = UserCredentials.objects.get(pk=self.credentials.pk)
+            if self._refreshed(force_refresh, stale_token):
+                return self.credentials.auth_token, None
+            if self.credentials.refresh_started_at is None:
+                break
+        
+        return None, "Не удалось получить токен: вход не завершился, попробуйте позже"
+    
+    def _login(self):
+        """Войти через цепочку стратегий (HTTP, Playwright, Selenium — по статистике)"""
+        return get_auth_chain().get_auth_token(self.credentials)
+    
     def clear_credentials(self):
         """Очистить данные пользователя"""
         if self.credentials:
             self.credentials.encrypted_login = ""
             self.credentials.encrypted_password = ""
             self.credentials.auth_token = ""
-            self.credentials.save()
+            self.credentials.encrypted_browser_state = ""
+            self.credentials.save(update_fields=[
+                'encrypted_login', 'encrypted_password', 'auth_token',
+                'encrypted_browser_state', 'updated_at',
+            ])
             return True
         return False
     
@@ -104,4 +217,74 @@ class UserTokenManager:
             minutes = int((expires_in.total_seconds() % 3600) // 60)
             return f"✅ Токен активен ({hours}ч {minutes}м)"
         else:
-            return "❌ Токен недействителен"
\ No newline at end of file
+            return "❌ Токен недействителен"
+
+
+class ManagerCache:
+    """
+    Кэш UserTokenManager по пользователю (LRU + TTL)
+
+    Размер ограничен max_size (вытесняются давно не использованные),
+    менеджер старше ttl создаётся заново. При выдаче из кэша данные
+    перечитываются, если строку UserCredentials изменил другой процесс.
+    """
+
+    def __init__(self, max_size=None, ttl=None):
+        self.max_size = max_size or getattr(settings, 'MANAGER_CACHE_SIZE', 1000)
+        self.ttl = ttl or getattr(settings, 'MANAGER_CACHE_TTL', 3600)
+        self._entries = OrderedDict()  # user_id -> (created_at, manager)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def get(self, telegram_user):
+        """Получить менеджер пользователя"""
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(telegram_user.pk)
+            if entry and now - entry[0] < self.ttl:
+                self._entries.move_to_end(telegram_user.pk)
+                self.hits += 1
+                manager = entry[1]
+            else:
+                self._entries.pop(telegram_user.pk, None)
+                self.misses += 1
+                manager = None
+
+        if manager is not None:
+            if manager.reload_if_changed():
+                with self._lock:
+                    self.reloads += 1
+            return manager
+
+        # Создаём вне lock: загрузка данных — запрос к БД
+        manager = UserTokenManager(telegram_user)
+
+        with self._lock:
+            # Параллельный вызов мог успеть положить свой менеджер
+            entry = self._entries.setdefault(telegram_user.pk, (now, manager))
+            self._entries.move_to_end(telegram_user.pk)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            return entry[1]
+
+    def invalidate(self, user_id):
+        """Удалить менеджер пользователя из кэша"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def stats(self):
+        """Статистика кэша"""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'reloads': self.reloads,
+            }
+
+
+manager_cache = ManagerCache()
@@ -0,0 +1,128 @@
+# tracker/update_queue.py
+import uuid
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import TelegramUpdate
+
+
+def payload_chat_id(data):
+    """Чат update (как chat_dispatcher.chat_key, но по JSON) или None"""
+    for field in ('message', 'edited_message', 'channel_post', 'edited_channel_post'):
+        message = data.get(field)
+        if message:
+            return message['chat']['id']
+
+    callback = data.get('callback_query')
+    if callback:
+        message = callback.get('message')
+        return message['chat']['id'] if message else callback['from']['id']
+
+    for field in ('inline_query', 'chosen_inline_result', 'shipping_query', 'pre_checkout_query'):
+        event = data.get(field)
+        if event:
+            return event['from']['id']
+
+    return None
+
+
+def enqueue_update(data):
+    """
+    Положить update в очередь
+
+    Повтор того же update_id (Telegram повторяет доставку при таймауте) игнорируется.
+
+    Returns:
+        bool: False, если update уже был в очереди
+    """
+    _, created = TelegramUpdate.objects.get_or_create(
+        update_id=data['update_id'],
+        defaults={'payload': data, 'chat_id': payload_chat_id(data)},
+    )
+    return created
+
+
+def claim_updates(limit=10):
+    """
+    Забрать в работу ожидающие updates
+
+    У чата один владелец: забираются все ожидающие updates выбранных
+    чатов, и только тех чатов, у которых нет updates в обработке у другого
+    воркера (проверка — в том же UPDATE). Поэтому updates одного чата идут
+    по порядку при любом числе потоков и процессов. На PostgreSQL/MySQL
+    строки дополнительно блокируются select_for_update(skip_locked=True).
+
+    Args:
+        limit (int): Сколько ожидающих updates просмотреть для выбора чатов
+
+    Returns:
+        list: TelegramUpdate по возрастанию update_id
+    """
+    token = uuid.uuid4().hex
+    busy_chats = TelegramUpdate.objects.filter(
+        status=TelegramUpdate.STATUS_PROCESSING, chat_id__isnull=False
+    ).values('chat_id')
+
+    with transaction.atomic():
+        rows = list(
+            TelegramUpdate.objects.select_for_update(skip_locked=True)
+            .filter(status=TelegramUpdate.STATUS_PENDING)
+            .exclude(chat_id__in=busy_chats)
+            .order_by('update_id')
+            .values_list('id', 'chat_id')[:limit]
+        )
+        if not rows:
+            return []
+
+        chats = {chat_id for _, chat_id in rows if chat_id is not None}
+        solo_ids = [row_id for row_id, chat_id in rows if chat_id is None]
+
+        TelegramUpdate.objects.filter(
+            Q(chat_id__in=chats) | Q(id__in=solo_ids),
+            status=TelegramUpdate.STATUS_PENDING,
+        ).exclude(chat_id__in=busy_chats).update(
+            status=TelegramUpdate.STATUS_PROCESSING,
+            claimed_by=token,
+            claimed_at=timezone.now(),
+        )
+
+    return list(TelegramUpdate.objects.filter(claimed_by=token).order_by('update_id'))
+
+
+def finish_update(update, error=None):
+    """
+    Отметить update обработанным
+
+    После ошибки update не повторяется: обработчик мог уже ответить
+    пользователю, и повтор отправил бы сообщения ещё раз.
+    """
+    update.attempts += 1
+    update.claimed_by = ''
+    update.status = TelegramUpdate.STATUS_DONE if error is None else TelegramUpdate.STATUS_FAILED
+    update.error = '' if error is None else str(error)[:2000]
+    update.processed_at = timezone.now()
+    update.save(update_fields=['status', 'claimed_by', 'attempts', 'error', 'processed_at'])
+
+
+def heartbeat(tokens):
+    """
+    Продлить захват updates живого воркера
+
+    Воркер периодически обновляет claimed_at всех своих захватов, поэтому
+    старый claimed_at означает, что владелец умер, а не что пачка долго
+    обрабатывается.
+    """
+    if not tokens:
+        return 0
+    return TelegramUpdate.objects.filter(
+        status=TelegramUpdate.STATUS_PROCESSING, claimed_by__in=tokens,
+    ).update(claimed_at=timezone.now())
+
+
+def release_stale(max_age):
+    """Вернуть в очередь updates воркера, не подававшего heartbeat дольше max_age секунд"""
+    return TelegramUpdate.objects.filter(
+        status=TelegramUpdate.STATUS_PROCESSING,
+        claimed_at__lt=timezone.now() - timedelta(seconds=max_age),
+    ).update(status=TelegramUpdate.STATUS_PENDING, claimed_by='')
@@ -8,4 +8,13 @@ def get_todays_schedule():
     for p in projects:
         tech = f" | {p.tech_stack}" if p.tech_stack else ""
         lines.append(f"• {p.title}{tech}")
-    return "\n".join(lines)
\ No newline at end of file
+    return "\n".join(lines)
+
+
+def percentile(values, p):
+    """Перцентиль p (0-100) по списку значений"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[index]
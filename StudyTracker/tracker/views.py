@@ -1,21 +1,18 @@
+import hmac
+import json
 from django.shortcuts import render, get_object_or_404, redirect
 from django.http import HttpResponse, JsonResponse
+from django.conf import settings
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
 from datetime import datetime, timedelta
 from .models import Project, TelegramUser, UserCredentials, ParsedLesson
 from .schedule_service import ScheduleService
-
-# forms.py не существует, создаю простую форму тут
-from django import forms
-
-class TokenForm(forms.Form):
-    auth_token = forms.CharField(
-        label="Токен авторизации",
-        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Введите токен'}),
-        required=False
-    )
+from .update_queue import enqueue_update, payload_chat_id
+from .forms import TokenForm
 
 
 def index(request):
@@ -138,14 +135,25 @@ def schedule_settings_view(request):
     credentials, created = UserCredentials.objects.get_or_create(user=user)
 
     if request.method == 'POST':
-        form = TokenForm(request.POST)
+        old_token = credentials.auth_token
+        form = TokenForm(request.POST, instance=credentials)
         if form.is_valid():
-            credentials.auth_token = form.cleaned_data['auth_token']
-            credentials.save()
+            credentials = form.save(commit=False)
+            # Новый токен — со сроком из JWT; пустой — сбрасываем срок
+            token = form.cleaned_data['auth_token'].strip()
+            if not token:
+                credentials.auth_token = ''
+                credentials.token_expires = None
+            elif token != old_token:
+                credentials.set_token(token)
+            credentials.save(update_fields=[
+                'auth_token', 'token_issued_at', 'token_expires', 'token_lifetime',
+                'auto_sync', 'sync_frequency', 'updated_at',
+            ])
             messages.success(request, "Настройки сохранены")
             return redirect('schedule_settings')
     else:
-        form = TokenForm(initial={'auth_token': credentials.auth_token})
+        form = TokenForm(instance=credentials)
 
     context = {
         'form': form,
@@ -184,4 +192,26 @@ def api_schedule_today(request):
         'date': today.strftime('%Y-%m-%d'),
         'lessons': lessons_data,
         'count': len(lessons_data),
-    })
\ No newline at end of file
+    })
+
+
+@csrf_exempt
+@require_POST
+def telegram_webhook(request):
+    """Webhook Telegram: проверить секрет и положить update в очередь воркеров"""
+    secret = getattr(settings, 'TELEGRAM_WEBHOOK_SECRET', '')
+    received = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+    if not secret or not hmac.compare_digest(received.encode(), secret.encode()):
+        return HttpResponse(status=403)
+
+    try:
+        data = json.loads(request.body)
+        data['update_id'] = int(data['update_id'])
+        payload_chat_id(data)
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return HttpResponse(status=400)
+
+    enqueue_update(data)
+
+    # Отвечаем сразу: обработка идёт в process_updates
+    return HttpResponse(status=200)